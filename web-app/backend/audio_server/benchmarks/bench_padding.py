@@ -0,0 +1,77 @@
+"""
+Per-utterance latency of ChunkedWhisperTranscriber.transcribe_array with and without the 30 s zero
+padding process_samples used to apply to every short clip.
+
+Short clips are cut from (or looped out of) --audio and transcribed twice per repeat: once padded to
+30 s as before, once at their true length as now. Whisper pads its feature window either way, so the
+difference is resampling and alignment (CTC model + Viterbi) over the silence. Alignment is also timed
+on its own.
+
+Needs the models, so run it inside the audio server image, from the audio_server directory:
+    python -m benchmarks.bench_padding --audio mono_output.wav --durations 2 4 6 --repeats 5
+"""
+import argparse
+import time
+
+import numpy as np
+import soundfile as sf
+
+from inference.models.chunked_whisper_transcriber import TARGET_SAMPLE_RATE, ChunkedWhisperTranscriber
+
+PADDED_SECONDS = 30
+
+
+def load_clip(path, duration_sec):
+    audio, sample_rate = sf.read(path, dtype='float32')
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if sample_rate != TARGET_SAMPLE_RATE:
+        raise SystemExit(f"{path} is {sample_rate} Hz, use a {TARGET_SAMPLE_RATE} Hz file")
+    n_samples = int(duration_sec * TARGET_SAMPLE_RATE)
+    return np.resize(audio, n_samples)
+
+
+def pad_to(audio, seconds):
+    return np.pad(audio, (0, max(0, int(seconds * TARGET_SAMPLE_RATE) - len(audio))), 'constant')
+
+
+def time_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio", default="mono_output.wav", help="16 kHz speech recording to cut clips from")
+    parser.add_argument("--durations", type=float, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--model", default="jlvdoorn/whisper-medium.en-atco2-asr")
+    args = parser.parse_args()
+
+    model = ChunkedWhisperTranscriber(model_name=args.model)
+    # warm-up, so neither variant pays for lazy initialisation
+    model.transcribe_array(load_clip(args.audio, 2), TARGET_SAMPLE_RATE)
+
+    print(f"{'clip':>6} | {'padded total':>12} {'true total':>10} | {'padded align':>12} {'true align':>10}")
+    for duration in args.durations:
+        clip = load_clip(args.audio, duration)
+        padded = pad_to(clip, PADDED_SECONDS)
+        text = model.transcriber.transcribe_array(clip, TARGET_SAMPLE_RATE)
+
+        padded_total = time_ms(lambda: model.transcribe_array(padded, TARGET_SAMPLE_RATE), args.repeats)
+        true_total = time_ms(lambda: model.transcribe_array(clip, TARGET_SAMPLE_RATE), args.repeats)
+        padded_align = time_ms(lambda: model.aligner.align_many([(padded, text)]), args.repeats)
+        true_align = time_ms(lambda: model.aligner.align_many([(clip, text)]), args.repeats)
+
+        print(
+            f"{duration:5.1f}s | {padded_total:9.1f} ms {true_total:7.1f} ms | "
+            f"{padded_align:9.1f} ms {true_align:7.1f} ms  ({padded_align / true_align:.1f}x less alignment)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Micro-benchmark for the Viterbi step of forced alignment on long utterances.
+
+Times the batched forward pass of viterbi_decoding, the vectorised backpointer trace it now uses,
+and the previous per-timestep trace (list.insert(0, ...) plus int() on a device tensor element),
+and checks both traces give the same alignments. With --band-width, also times banded decoding
+against the full trellis on log-probs that favour a roughly linear alignment (as real speech does).
+
+Run from the audio_server directory:
+    python -m benchmarks.bench_viterbi --batch 4 --frames 3000 --tokens 300
+    python -m benchmarks.bench_viterbi --batch 2 --frames 12000 --tokens 3000 --band-width 40
+"""
+import argparse
+import time
+
+import torch
+
+import inference.utils.viterbi_decoding as viterbi_module
+from inference.utils.viterbi_decoding import viterbi_decoding
+
+
+def make_batch(B, T, n_tokens, V, seed=0, diagonal_bias=0.0):
+    """
+    Random log-probs plus reference token sequences (with blanks in every other position)
+    of slightly different lengths, padded the same way get_batch_variables pads them.
+    If diagonal_bias is set, the token a linear alignment would be on at each timestep is boosted by it.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    blank_id = V - 1
+    T_list = [T - 7 * b for b in range(B)]
+    y_list = []
+    for b in range(B):
+        tokens = torch.randint(0, V - 1, (n_tokens - 3 * b,), generator=generator).tolist()
+        y_utt = [blank_id]
+        for token in tokens:
+            y_utt.extend([token, blank_id])
+        y_list.append(y_utt)
+    U_list = [len(y_utt) for y_utt in y_list]
+
+    logits = torch.randn(B, T, V, generator=generator)
+    if diagonal_bias:
+        for b, (T_b, y_utt) in enumerate(zip(T_list, y_list)):
+            expected_u = torch.arange(T_b) * len(y_utt) // T_b
+            logits[b, torch.arange(T_b), torch.tensor(y_utt)[expected_u]] += diagonal_bias
+    log_probs_batch = torch.log_softmax(logits, dim=2)
+    for b, T_b in enumerate(T_list):
+        log_probs_batch[b, T_b:, :] = -3.4e38
+    y_batch = V * torch.ones((B, max(U_list)), dtype=torch.int64)
+    for b, y_utt in enumerate(y_list):
+        y_batch[b, : len(y_utt)] = torch.tensor(y_utt)
+    return log_probs_batch, y_batch, torch.tensor(T_list), torch.tensor(U_list)
+
+
+def legacy_trace(backpointers_rel, v_prev, T_batch, U_batch):
+    """
+    The backtrace viterbi_decoding used before: O(T^2) list building and one
+    device-tensor int() per timestep.
+    """
+    B, T_max, _ = backpointers_rel.shape
+    alignments_batch = []
+    for b in range(B):
+        T_b = int(T_batch[b])
+        U_b = int(U_batch[b])
+
+        if U_b == 1:
+            current_u = 0
+        else:
+            current_u = int(torch.argmax(v_prev[b, U_b - 2 : U_b])) + U_b - 2
+        alignment_b = [current_u]
+        for t in range(T_max - 1, 0, -1):
+            current_u = current_u - int(backpointers_rel[b, t, current_u])
+            alignment_b.insert(0, current_u)
+        alignment_b = alignment_b[:T_b]
+        alignments_batch.append(alignment_b)
+    return alignments_batch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=3000, help="T, number of output timesteps (80 ms each)")
+    parser.add_argument("--tokens", type=int, default=300, help="non-blank tokens per utterance")
+    parser.add_argument("--vocab", type=int, default=1025)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--band-width", type=int, default=None, help="also time banded decoding with this band")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    log_probs_batch, y_batch, T_batch, U_batch = make_batch(
+        args.batch, args.frames, args.tokens, args.vocab, diagonal_bias=6.0 if args.band_width else 0.0
+    )
+
+    # keep the trace inputs so both trace implementations can be timed on the same data
+    captured = {}
+    new_trace = viterbi_module._trace_backpointers
+
+    def capturing_trace(backpointers_rel, v_final, T, U, band_starts=None):
+        captured["args"] = (backpointers_rel, v_final, T, U)
+        start = time.perf_counter()
+        result = new_trace(backpointers_rel, v_final, T, U, band_starts)
+        captured["trace_sec"] = time.perf_counter() - start
+        return result
+
+    viterbi_module._trace_backpointers = capturing_trace
+    try:
+        start = time.perf_counter()
+        alignments = viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, device)
+        total_sec = time.perf_counter() - start
+    finally:
+        viterbi_module._trace_backpointers = new_trace
+
+    backpointers_rel, v_final, T, U = captured["args"]
+    backpointers_device = torch.from_numpy(backpointers_rel).to(device)
+    v_final_device = torch.from_numpy(v_final).to(device)
+    start = time.perf_counter()
+    legacy_alignments = legacy_trace(backpointers_device, v_final_device, T, U)
+    legacy_sec = time.perf_counter() - start
+
+    assert legacy_alignments == alignments, "vectorised trace disagrees with the previous implementation"
+
+    print(f"B={args.batch} T_max={args.frames} U_max={int(U_batch.max())} device={device}")
+    print(f"viterbi_decoding total   : {total_sec * 1000:9.1f} ms")
+    print(f"  forward pass           : {(total_sec - captured['trace_sec']) * 1000:9.1f} ms")
+    print(f"  backtrace (vectorised) : {captured['trace_sec'] * 1000:9.1f} ms")
+    print(f"previous backtrace       : {legacy_sec * 1000:9.1f} ms  ({legacy_sec / captured['trace_sec']:.0f}x slower)")
+
+    if args.band_width:
+        start = time.perf_counter()
+        banded_alignments = viterbi_decoding(
+            log_probs_batch, y_batch, T_batch, U_batch, device, band_width=args.band_width
+        )
+        banded_sec = time.perf_counter() - start
+        assert banded_alignments == alignments, "banded decoding disagrees with the full trellis"
+        print(f"banded viterbi_decoding  : {banded_sec * 1000:9.1f} ms  (band_width={args.band_width})")
+
+
+if __name__ == "__main__":
+    main()
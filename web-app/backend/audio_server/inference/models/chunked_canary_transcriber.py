@@ -63,8 +63,8 @@ class ChunkedCanaryTranscriber:
 			final_transcript_parts.append(chunk_text)
 
 			# 2. Force align chunk
-			alignment_result = self.aligner.align(chunk_file, chunk_text)
-			chunk_alignment_data = self.__parse_alignment(alignment_result)
+			utt_arrays = self.aligner.align(chunk_file, chunk_text)
+			chunk_alignment_data = self.aligner.to_ctm_items(utt_arrays)
 
 			# IMPORTANT: shift by the *absolute* start of the chunk
 			self.__shift_alignment(chunk_alignment_data, chunk_start_sec)
@@ -89,48 +89,6 @@ class ChunkedCanaryTranscriber:
 		return merged_alignment
 
 
-	def __parse_ctm(self, ctm_file):
-		items = []
-		with open(ctm_file, "r", encoding="utf-8") as f:
-			for line in f:
-				parts = line.strip().split()
-				if len(parts) < 5:
-					continue
-				start = float(parts[2])
-				dur = float(parts[3])
-				txt = parts[4]
-				items.append({
-					"start": round(start, 3),
-					"duration": round(dur, 3),
-					"end": round(start + dur, 3),
-					"text": txt
-				})
-		return items
-
-
-	def __parse_alignment(self, alignment_result):
-		"""
-		Reuses your standard CTM parsing logic, returning a dict with
-		text, words, tokens, segments.
-		"""
-		alignment_data = {
-			"text": alignment_result.get("text", ""),
-			"words": [],
-			"tokens": [],
-			"segments": []
-		}
-		w_ctm = alignment_result.get("words_level_ctm_filepath")
-		t_ctm = alignment_result.get("tokens_level_ctm_filepath")
-		s_ctm = alignment_result.get("segments_level_ctm_filepath")
-
-		if w_ctm and os.path.exists(w_ctm):
-			alignment_data["words"] = self.__parse_ctm(w_ctm)
-		if t_ctm and os.path.exists(t_ctm):
-			alignment_data["tokens"] = self.__parse_ctm(t_ctm)
-		if s_ctm and os.path.exists(s_ctm):
-			alignment_data["segments"] = self.__parse_ctm(s_ctm)
-		return alignment_data
-
 	def __shift_alignment(self, alignment_data, offset_sec):
 		"""
 		Shifts the start/end times in alignment_data by offset_sec, in place.
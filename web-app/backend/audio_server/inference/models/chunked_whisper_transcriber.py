@@ -1,4 +1,8 @@
-import os
+import asyncio
+from math import gcd
+
+import numpy as np
+from scipy.signal import resample_poly
 from tqdm import tqdm
 
 from inference.models.whisper_transcriber import WhisperTranscriber
@@ -6,79 +10,135 @@ from inference.models.force_aligner import ForceAligner
 
 from pydub import AudioSegment
 
+# Both Whisper and the NeMo alignment model work on 16 kHz audio
+TARGET_SAMPLE_RATE = 16000
+
 class ChunkedWhisperTranscriber:
     def __init__(self, model_name: str = 'jlvdoorn/whisper-medium.en-atco2-asr'):
         self.transcriber = WhisperTranscriber(model_name=model_name)
         self.aligner = ForceAligner()
         print(f"ChunkedWhisperTranscriber initialized with model: {model_name}")
 
-    def __split_audio(self, audio_filepath, chunk_duration_sec=600):
+    def __load_audio(self, audio_filepath):
         """
-        Splits the audio into chunks of up to `chunk_duration_sec`.
-        Returns a list of tuples (chunk_file_path, chunk_start_sec, chunk_duration_sec).
+        Reads an audio file into a mono float32 array in [-1, 1].
+        Returns a tuple (samples, sample_rate).
         """
         audio_seg = AudioSegment.from_file(audio_filepath)
-
         audio_seg = audio_seg.set_channels(1)
+        samples = np.array(audio_seg.get_array_of_samples(), dtype=np.float32)
+        samples /= float(1 << (8 * audio_seg.sample_width - 1))
+        return samples, audio_seg.frame_rate
 
-        total_ms = len(audio_seg)
-        chunk_ms = chunk_duration_sec * 1000
+    def __split_audio(self, audio, sample_rate, chunk_duration_sec=600):
+        """
+        Splits the audio into chunks of up to `chunk_duration_sec`.
+        Returns a list of tuples (chunk_samples, chunk_start_sec, chunk_duration_sec).
+        The chunks are views into `audio`, nothing is copied or written to disk.
+        """
+        total_samples = len(audio)
+        chunk_samples = int(chunk_duration_sec * sample_rate)
 
         chunks = []
-        start_ms = 0
-        idx = 0
+        start = 0
 
-        while start_ms < total_ms:
-            end_ms = min(start_ms + chunk_ms, total_ms)
-            chunk = audio_seg[start_ms:end_ms]
+        while start < total_samples:
+            end = min(start + chunk_samples, total_samples)
 
             # The absolute start time of this chunk in the original audio
-            chunk_start_sec = start_ms / 1000.0
+            chunk_start_sec = start / sample_rate
             # The duration of *this* chunk
-            chunk_length_sec = (end_ms - start_ms) / 1000.0
+            chunk_length_sec = (end - start) / sample_rate
 
-            # Write chunk to disk
-            chunk_path = f"{audio_filepath}_chunk_{idx}.wav"
-            chunk.export(chunk_path, format="wav")
+            chunks.append((audio[start:end], chunk_start_sec, chunk_length_sec))
 
-            # Store all three: path, absolute start, and chunk duration
-            chunks.append((chunk_path, chunk_start_sec, chunk_length_sec))
-
-            start_ms += chunk_ms
-            idx += 1
+            start += chunk_samples
 
         return chunks
 
     def transcribe(self, audio_filepath, chunk_duration_sec=30):
+        audio, sample_rate = self.__load_audio(audio_filepath)
+        return self.transcribe_array(audio, sample_rate, chunk_duration_sec)
+
+    def transcribe_array(self, audio, sample_rate, chunk_duration_sec=30):
+        """
+        Transcribes and aligns a mono audio signal held in memory.
+        `audio` is converted to float32 and resampled to 16 kHz if needed.
+        """
+        audio, sample_rate = self.__prepare_audio(audio, sample_rate)
+
         # Split into chunks
-        chunk_infos = self.__split_audio(audio_filepath, chunk_duration_sec)
+        chunk_infos = self.__split_audio(audio, sample_rate, chunk_duration_sec)
+
+        # Transcribe each chunk with Whisper
+        chunk_texts = [
+            self.transcriber.transcribe_array(chunk_audio, sample_rate)
+            for chunk_audio, _, _ in tqdm(chunk_infos)
+        ]
 
+        return self.__align_chunks(chunk_infos, chunk_texts)
+
+    async def transcribe_array_async(self, audio, sample_rate, scheduler, chunk_duration_sec=30, align_scheduler=None):
+        """
+        Same as transcribe_array, but the Whisper windows are submitted to `scheduler`
+        (a DynamicBatchScheduler around WhisperTranscriber.generate_batch), so chunks from
+        concurrent requests share batched generate calls.
+        If `align_scheduler` (a DynamicBatchScheduler around ForceAligner.align_many) is given, the
+        chunks are aligned together with those of other requests; otherwise all chunks of this
+        recording are aligned in one align_many call in a worker thread.
+        """
+        audio, sample_rate = self.__prepare_audio(audio, sample_rate)
+        chunk_infos = self.__split_audio(audio, sample_rate, chunk_duration_sec)
+
+        features = await asyncio.to_thread(
+            lambda: [self.transcriber.extract_features(chunk_audio, sample_rate) for chunk_audio, _, _ in chunk_infos]
+        )
+        chunk_texts = await scheduler.submit_many(features)
+
+        if align_scheduler is not None:
+            alignment_results = await align_scheduler.submit_many(
+                [(chunk_audio, chunk_text) for (chunk_audio, _, _), chunk_text in zip(chunk_infos, chunk_texts)]
+            )
+            return self.__merge_chunks(chunk_infos, chunk_texts, alignment_results)
+
+        return await asyncio.to_thread(self.__align_chunks, chunk_infos, chunk_texts)
+
+    def __prepare_audio(self, audio, sample_rate):
+        audio = np.asarray(audio, dtype=np.float32)
+        if sample_rate != TARGET_SAMPLE_RATE:
+            divisor = gcd(int(sample_rate), TARGET_SAMPLE_RATE)
+            audio = resample_poly(audio, up=TARGET_SAMPLE_RATE // divisor, down=int(sample_rate) // divisor)
+            audio = audio.astype(np.float32)
+            sample_rate = TARGET_SAMPLE_RATE
+        return audio, sample_rate
+
+    def __align_chunks(self, chunk_infos, chunk_texts):
+        """
+        Force aligns every chunk against its transcript in one batched align_many call
+        and merges the results onto one timeline.
+        """
+        alignment_results = self.aligner.align_many(
+            [(chunk_audio, chunk_text) for (chunk_audio, _, _), chunk_text in zip(chunk_infos, chunk_texts)]
+        )
+        return self.__merge_chunks(chunk_infos, chunk_texts, alignment_results)
+
+    def __merge_chunks(self, chunk_infos, chunk_texts, alignment_results):
         all_words = []
         all_tokens = []
         all_segments = []
-        final_transcript_parts = []
-
-        for chunk_file, chunk_start_sec, chunk_dur in tqdm(chunk_infos):
-            # 1. Transcribe chunk with Whisper
-            chunk_text = self.transcriber.transcribe(chunk_file)
-            final_transcript_parts.append(chunk_text)
 
-            # 2. Force align chunk
-            alignment_result = self.aligner.align(chunk_file, chunk_text)
-            chunk_alignment_data = self.__parse_alignment(alignment_result)
+        for (chunk_audio, chunk_start_sec, chunk_dur), utt_arrays in zip(chunk_infos, alignment_results):
+            chunk_alignment_data = self.aligner.to_ctm_items(utt_arrays)
 
             # IMPORTANT: shift by the *absolute* start of the chunk
             self.__shift_alignment(chunk_alignment_data, chunk_start_sec)
 
-            # 3. Merge into global arrays
+            # Merge into global arrays
             all_words.extend(chunk_alignment_data["words"])
             all_tokens.extend(chunk_alignment_data["tokens"])
             all_segments.extend(chunk_alignment_data["segments"])
 
-            # optionally remove chunk file
-            os.remove(chunk_file)
-
-        final_transcript = " ".join(final_transcript_parts).strip()
+        final_transcript = " ".join(chunk_texts).strip()
 
         merged_alignment = {
             "text": final_transcript,
@@ -89,49 +149,6 @@ class ChunkedWhisperTranscriber:
 
         return merged_alignment
 
-
-    def __parse_ctm(self, ctm_file):
-        items = []
-        with open(ctm_file, "r", encoding="utf-8") as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) < 5:
-                    continue
-                start = float(parts[2])
-                dur = float(parts[3])
-                txt = parts[4]
-                items.append({
-                    "start": round(start, 3),
-                    "duration": round(dur, 3),
-                    "end": round(start + dur, 3),
-                    "text": txt
-                })
-        return items
-
-
-    def __parse_alignment(self, alignment_result):
-        """
-        Reuses your standard CTM parsing logic, returning a dict with
-        text, words, tokens, segments.
-        """
-        alignment_data = {
-            "text": alignment_result.get("text", ""),
-            "words": [],
-            "tokens": [],
-            "segments": []
-        }
-        w_ctm = alignment_result.get("words_level_ctm_filepath")
-        t_ctm = alignment_result.get("tokens_level_ctm_filepath")
-        s_ctm = alignment_result.get("segments_level_ctm_filepath")
-
-        if w_ctm and os.path.exists(w_ctm):
-            alignment_data["words"] = self.__parse_ctm(w_ctm)
-        if t_ctm and os.path.exists(t_ctm):
-            alignment_data["tokens"] = self.__parse_ctm(t_ctm)
-        if s_ctm and os.path.exists(s_ctm):
-            alignment_data["segments"] = self.__parse_ctm(s_ctm)
-        return alignment_data
-
     def __shift_alignment(self, alignment_data, offset_sec):
         """
         Shifts the start/end times in alignment_data by offset_sec, in place.
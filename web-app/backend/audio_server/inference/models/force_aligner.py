@@ -1,16 +1,21 @@
 # force_aligner.py
-import os
-import tempfile
-import json
+import threading
 import uuid
-from pathlib import Path
-from nemo.utils import logging
-from ..utils.align import AlignmentConfig, ASSFileConfig, load_alignment_model, run_alignment
+from typing import List, Tuple
+import numpy as np
+from ..utils.align import AlignmentConfig, ASSFileConfig, CTMFileConfig, align_manifest_lines, load_alignment_model
+from ..utils.data_prep import TokenizationCache, UtteranceArrays
+from ..utils.make_ctm_files import make_ctm_items_from_arrays
+from ..utils.streaming_alignment import StreamingAlignmentSession
 
 class ForceAligner:
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, max_batch_size: int = 16, viterbi_band_width: int = None):
         # model_name can override the default ASR model used for forced alignment.
         self.model_name = model_name
+        # upper bound on how many utterances align_many puts through the model at once
+        self.max_batch_size = max_batch_size
+        # band used by Viterbi decoding for long utterances (None decodes the full trellis)
+        self.viterbi_band_width = viterbi_band_width
         # Create a base configuration for model loading.
         # Dummy manifest_filepath and output_dir values are used here because they are not needed for model instantiation.
         base_cfg = AlignmentConfig(
@@ -25,44 +30,86 @@ class ForceAligner:
         )
         # Load and cache the model once.
         self.model = load_alignment_model(base_cfg)
+        # Used to turn aligned utterances into CTM-style entries (see to_ctm_items)
+        self.ctm_file_config = CTMFileConfig()
+        # word -> tokens cache shared by every alignment on this model; stats() is reported by /health
+        self.tokenization_cache = TokenizationCache()
+        # model.transcribe swaps dataloaders and decoding state on the shared model,
+        # so requests aligned from worker threads must take turns
+        self._lock = threading.Lock()
 
-    def align(self, audio_filepath: str, text: str) -> dict:
+    def align(self, audio_filepath: str, text: str) -> UtteranceArrays:
         """
         Runs Nemo Forced Alignment on the audio file using the given text.
-        Internally, it writes a manifest JSON line, builds an AlignmentConfig,
-        runs the alignment using the preloaded model, and then reads back the output manifest.
-        Returns a dict with alignment details (e.g. word/token timings).
+        The result is kept in memory: no manifest, CTM or output directory is written.
+        Returns the aligned utterance in columnar form (UtteranceArrays), with t_start / t_end set on
+        all of its segments, words and tokens.
         """
-        tmpdir = tempfile.mkdtemp(prefix="nfa_")
-        utt_id = str(uuid.uuid4())
-        manifest_data = {
-            "audio_filepath": audio_filepath,
-            "text": text
-        }
-        manifest_path = os.path.join(tmpdir, f"{utt_id}_manifest.json")
-        with open(manifest_path, 'w') as f:
-            f.write(json.dumps(manifest_data) + "\n")
-        output_dir = os.path.join(tmpdir, "nfa_output")
-        os.makedirs(output_dir, exist_ok=True)
+        return self._align_lines([{"audio_filepath": audio_filepath, "text": text, "utt_id": str(uuid.uuid4())}])[0]
+
+    def align_array(self, audio: np.ndarray, text: str) -> UtteranceArrays:
+        """
+        Same as align, but for audio that is already in memory: `audio` is a mono float32 array at
+        the alignment model's sample rate (16 kHz). The samples are handed straight to the model.
+        """
+        return self.align_many([(audio, text)])[0]
+
+    def align_many(self, items: List[Tuple[np.ndarray, str]]) -> List[UtteranceArrays]:
+        """
+        Aligns several in-memory utterances together - all chunks of one recording, or chunks
+        gathered from concurrent requests. Up to max_batch_size utterances share one batched
+        CTC forward pass and one batched viterbi_decoding call, instead of each paying for its
+        own pipeline run.
+        Returns one aligned UtteranceArrays per item, in the order of items.
+        """
+        if not items:
+            return []
+        return self._align_lines(
+            [
+                {"audio": np.asarray(audio, dtype=np.float32), "text": text, "utt_id": str(uuid.uuid4())}
+                for audio, text in items
+            ]
+        )
+
+    def stream(self, chunk_len_in_secs: float = 1.6, total_buffer_in_secs: float = 4.0) -> StreamingAlignmentSession:
+        """
+        Starts a streaming alignment session for one utterance of a live stream: push() it mono float32
+        samples at 16 kHz as they arrive, and align(text) returns the word timings of the transcript so far
+        without putting the earlier audio through the model again.
+        Sessions share the loaded model, its lock and its tokenization cache with align / align_many.
+        """
+        return StreamingAlignmentSession(
+            self.model,
+            chunk_len_in_secs,
+            total_buffer_in_secs,
+            lock=self._lock,
+            tokenization_cache=self.tokenization_cache,
+        )
+
+    def to_ctm_items(self, utt_arrays: UtteranceArrays) -> dict:
+        """
+        Returns the text and the tokens / words / segments of an aligned utterance as lists of
+        {"start", "duration", "end", "text"} dicts - the same entries NFA would write to CTM files.
+        """
+        ctm_items = make_ctm_items_from_arrays(utt_arrays, self.ctm_file_config)
+        ctm_items["text"] = utt_arrays.text
+        return ctm_items
+
+    def _align_lines(self, manifest_lines: List[dict]) -> List[UtteranceArrays]:
         alignment_config = AlignmentConfig(
             pretrained_name=self.model_name if self.model_name else "stt_en_fastconformer_hybrid_large_pc",
-            manifest_filepath=manifest_path,
-            output_dir=output_dir,
-            audio_filepath_parts_in_utt_id=1,
-            batch_size=1,
+            batch_size=min(len(manifest_lines), self.max_batch_size),
             use_local_attention=True,
             additional_segment_grouping_separator="|",
-            save_output_file_formats=["ctm"],
+            save_output_file_formats=[],
             ass_file_config=ASSFileConfig(),
+            viterbi_band_width=self.viterbi_band_width,
         )
-        # Run the alignment using the cached model.
-        run_alignment(alignment_config, model=self.model)
-        manifest_stem = Path(manifest_path).stem
-        output_manifest = os.path.join(output_dir, manifest_stem + "_with_output_file_paths.json")
-        alignment_result = {}
-        if os.path.exists(output_manifest):
-            with open(output_manifest, 'r') as f:
-                alignment_result = json.loads(f.readline())
-        else:
-            logging.error("Alignment output manifest not found.")
-        return alignment_result
+        with self._lock:
+            return align_manifest_lines(
+                alignment_config,
+                manifest_lines,
+                model=self.model,
+                tokenization_cache=self.tokenization_cache,
+                columnar=True,
+            )
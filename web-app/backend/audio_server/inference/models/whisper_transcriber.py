@@ -3,6 +3,7 @@ import os
 import torch
 import soundfile as sf
 import numpy as np
+from typing import List
 from ..utils.model_loader import load_whisper_model
 
 class WhisperTranscriber:
@@ -28,39 +29,78 @@ class WhisperTranscriber:
         Returns:
             str: Transcription text
         """
-        try:
-            # Read the audio file
-            audio_data, sample_rate = sf.read(audio_filepath)
-            
-            # Convert to mono if stereo
-            if len(audio_data.shape) > 1:
-                audio_data = audio_data.mean(axis=1)
-            
-            # Normalize the audio
-            audio_data = audio_data / np.max(np.abs(audio_data))
+        # Read the audio file
+        audio_data, sample_rate = sf.read(audio_filepath)
+        return self.transcribe_array(audio_data, sample_rate)
+
+    def transcribe_array(self, audio_data: np.ndarray, sample_rate: int) -> str:
+        """
+        Transcribes an in-memory audio signal using Whisper model.
+        
+        Args:
+            audio_data: Audio samples, mono or (samples, channels)
+            sample_rate: Sample rate of audio_data in Hz
             
-            # Convert to float32
-            audio_data = audio_data.astype(np.float32)
+        Returns:
+            str: Transcription text
+        """
+        try:
+            input_features = self.extract_features(audio_data, sample_rate)
+            return self.generate_batch([input_features])[0]
             
-            # Convert to tensor and move to device
-            input_features = self.processor(
-                audio_data, 
-                sampling_rate=sample_rate, 
-                return_tensors="pt"
-            ).input_features.to(self.device)
+        except Exception as e:
+            print(f"Error transcribing audio: {str(e)}")
+            raise
+
+    def extract_features(self, audio_data: np.ndarray, sample_rate: int) -> torch.Tensor:
+        """
+        Turns audio into the log-mel input features of one 30 s Whisper window.
+        This is the CPU-side half of transcribe_array; the features are kept on the CPU
+        so several of them can be stacked into one batch for generate_batch.
+        
+        Args:
+            audio_data: Audio samples, mono or (samples, channels)
+            sample_rate: Sample rate of audio_data in Hz
             
-            # Generate token ids
-            with torch.no_grad():
-                predicted_ids = self.model.generate(input_features)
-                
-            # Decode token ids to text
-            transcription = self.processor.batch_decode(
-                predicted_ids, 
-                skip_special_tokens=True
-            )[0]
+        Returns:
+            torch.Tensor: Input features of shape (1, n_mels, n_frames)
+        """
+        # Convert to mono if stereo
+        if len(audio_data.shape) > 1:
+            audio_data = audio_data.mean(axis=1)
+        
+        # Normalize the audio
+        max_val = np.max(np.abs(audio_data)) if audio_data.size else 0
+        if max_val > 0:
+            audio_data = audio_data / max_val
+        
+        # Convert to float32
+        audio_data = audio_data.astype(np.float32)
+        
+        return self.processor(
+            audio_data, 
+            sampling_rate=sample_rate, 
+            return_tensors="pt"
+        ).input_features
+
+    def generate_batch(self, input_features_batch: List[torch.Tensor]) -> List[str]:
+        """
+        Runs one batched generate over feature windows from extract_features.
+        
+        Args:
+            input_features_batch: List of (1, n_mels, n_frames) feature tensors
             
-            return transcription
+        Returns:
+            List[str]: One transcription per feature window, in the same order
+        """
+        input_features = torch.cat(input_features_batch, dim=0).to(self.device)
+        
+        # Generate token ids
+        with torch.no_grad():
+            predicted_ids = self.model.generate(input_features)
             
-        except Exception as e:
-            print(f"Error transcribing audio: {str(e)}")
-            raise
\ No newline at end of file
+        # Decode token ids to text
+        return self.processor.batch_decode(
+            predicted_ids, 
+            skip_special_tokens=True
+        )
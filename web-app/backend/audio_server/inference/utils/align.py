@@ -1,6 +1,4 @@
 # align.py
-import copy
-import math
 import os
 from dataclasses import dataclass, field, is_dataclass
 from pathlib import Path
@@ -10,12 +8,12 @@ import torch
 from omegaconf import OmegaConf
 
 from .data_prep import (
+    TokenizationCache,
+    add_t_start_end_to_utt_arrays,
     add_t_start_end_to_utt_obj,
-    get_batch_starts_ends,
+    clean_manifest_text,
     get_batch_variables,
-    get_manifest_lines_batch,
-    is_entry_in_all_lines,
-    is_entry_in_any_lines,
+    iter_manifest_batches,
 )
 from .make_ass_files import make_ass_files
 from .make_ctm_files import make_ctm_files
@@ -24,7 +22,6 @@ from .viterbi_decoding import viterbi_decoding
 
 from nemo.collections.asr.models.ctc_models import EncDecCTCModel
 from nemo.collections.asr.models.hybrid_rnnt_ctc_models import EncDecHybridRNNTCTCModel
-from nemo.collections.asr.parts.utils.streaming_utils import FrameBatchASR
 from nemo.collections.asr.parts.utils.transcribe_utils import setup_model
 from nemo.core.config import hydra_runner
 from nemo.utils import logging
@@ -62,6 +59,9 @@ class AlignmentConfig:
     total_buffer_in_secs: float = 4.0
     chunk_batch_size: int = 32
     simulate_cache_aware_streaming: Optional[bool] = False
+    # if set, Viterbi only considers token positions within this many tokens of the diagonal
+    # (O(T * band) instead of O(T * U)); an approximation, see _banded_viterbi_decoding
+    viterbi_band_width: Optional[int] = None
     save_output_file_formats: List[str] = field(default_factory=lambda: ["ctm", "ass"])
     ctm_file_config: CTMFileConfig = CTMFileConfig()
     ass_file_config: ASSFileConfig = ASSFileConfig()
@@ -87,23 +87,15 @@ def load_alignment_model(cfg: AlignmentConfig) -> torch.nn.Module:
         raise NotImplementedError("Model must be an instance of EncDecCTCModel or EncDecHybridRNNTCTCModel.")
     return model
 
-def _alignment_pipeline(cfg: AlignmentConfig, model: Optional[torch.nn.Module] = None) -> None:
+def _validate_config(cfg) -> None:
     """
-    Core alignment logic. If a model is provided, it is used;
-    otherwise, a new model is loaded.
+    Checks the parts of the config that do not depend on where the utterances come from.
     """
-    logging.info(f'Hydra config: {OmegaConf.to_yaml(cfg)}')
-    if is_dataclass(cfg):
-        cfg = OmegaConf.structured(cfg)
-
-    # --- Validation code (unchanged semantics) ---
     if cfg.model_path is None and cfg.pretrained_name is None:
         raise ValueError("Both cfg.model_path and cfg.pretrained_name cannot be None")
     if cfg.model_path is not None and cfg.pretrained_name is not None:
         raise ValueError("One of cfg.model_path and cfg.pretrained_name must be None")
-    if cfg.manifest_filepath is None:
-        raise ValueError("cfg.manifest_filepath must be specified")
-    if cfg.output_dir is None:
+    if cfg.output_dir is None and cfg.save_output_file_formats:
         raise ValueError("cfg.output_dir must be specified")
     if cfg.batch_size < 1:
         raise ValueError("cfg.batch_size cannot be zero or a negative number")
@@ -111,6 +103,10 @@ def _alignment_pipeline(cfg: AlignmentConfig, model: Optional[torch.nn.Module] =
         raise ValueError("cfg.additional_grouping_separator cannot be empty string or space character")
     if cfg.ctm_file_config.minimum_timestamp_duration < 0:
         raise ValueError("cfg.minimum_timestamp_duration cannot be a negative number")
+    if cfg.use_buffered_chunked_streaming and cfg.simulate_cache_aware_streaming:
+        raise ValueError("cfg.use_buffered_chunked_streaming and cfg.simulate_cache_aware_streaming cannot both be True")
+    if cfg.use_buffered_chunked_streaming and cfg.chunk_len_in_secs > cfg.total_buffer_in_secs:
+        raise ValueError("cfg.chunk_len_in_secs cannot be longer than cfg.total_buffer_in_secs")
     if cfg.ass_file_config.vertical_alignment not in ["top", "center", "bottom"]:
         raise ValueError("cfg.ass_file_config.vertical_alignment must be one of 'top', 'center' or 'bottom'")
     for rgb_list in [
@@ -121,16 +117,8 @@ def _alignment_pipeline(cfg: AlignmentConfig, model: Optional[torch.nn.Module] =
         if len(rgb_list) != 3:
             raise ValueError("RGB lists must contain exactly 3 elements.")
 
-    if not is_entry_in_all_lines(cfg.manifest_filepath, "audio_filepath"):
-        raise RuntimeError("Manifest missing 'audio_filepath' entry.")
-    if cfg.align_using_pred_text:
-        if is_entry_in_any_lines(cfg.manifest_filepath, "pred_text"):
-            raise RuntimeError("Cannot use pred_text when align_using_pred_text is True.")
-    else:
-        if not is_entry_in_all_lines(cfg.manifest_filepath, "text"):
-            raise RuntimeError("Manifest missing 'text' entry.")
 
-    # --- Device initialization ---
+def _get_devices(cfg):
     transcribe_device = (
         torch.device(cfg.transcribe_device)
         if cfg.transcribe_device
@@ -145,41 +133,175 @@ def _alignment_pipeline(cfg: AlignmentConfig, model: Optional[torch.nn.Module] =
     logging.info(f"Viterbi device: {viterbi_device}")
     if transcribe_device.type == 'cuda' or viterbi_device.type == 'cuda':
         logging.warning("Using GPU(s); consider CPU if OOM errors occur.")
+    return transcribe_device, viterbi_device
+
+
+def _get_buffered_chunk_params(cfg, model) -> dict:
+    """
+    Returns the buffered_chunk_params get_batch_variables expects, or {} if cfg.use_buffered_chunked_streaming is off.
+    """
+    if not cfg.use_buffered_chunked_streaming:
+        return {}
+    if model.cfg.preprocessor.normalize != "per_feature":
+        logging.error("Only models trained with per_feature normalization are supported currently")
+    logging.info(
+        f"Buffered chunked streaming: chunk_len_in_secs={cfg.chunk_len_in_secs},"
+        f" total_buffer_in_secs={cfg.total_buffer_in_secs}"
+    )
+    return {"chunk_len_in_secs": cfg.chunk_len_in_secs, "total_buffer_in_secs": cfg.total_buffer_in_secs}
+
+
+def _align_lines_batch(
+    cfg,
+    model,
+    manifest_lines_batch,
+    output_timestep_duration,
+    viterbi_device,
+    buffered_chunk_params,
+    tokenization_cache=None,
+    columnar=False,
+):
+    """
+    Aligns one batch of manifest lines and writes the requested output files.
+    Returns the Utterance objects (with t_start / t_end filled in) and the output timestep duration.
+    With columnar=True UtteranceArrays are returned instead (no output files can be written then).
+    """
+    (log_probs_batch, y_batch, T_batch, U_batch, utt_obj_batch, output_timestep_duration) = get_batch_variables(
+        manifest_lines_batch,
+        model,
+        cfg.additional_segment_grouping_separator,
+        cfg.align_using_pred_text,
+        cfg.audio_filepath_parts_in_utt_id,
+        output_timestep_duration,
+        cfg.simulate_cache_aware_streaming,
+        cfg.use_buffered_chunked_streaming,
+        buffered_chunk_params,
+        tokenization_cache,
+        columnar,
+    )
+    alignments_batch = viterbi_decoding(
+        log_probs_batch, y_batch, T_batch, U_batch, viterbi_device, band_width=cfg.viterbi_band_width
+    )
+    aligned_utt_objs = []
+    for utt_obj, alignment_utt in zip(utt_obj_batch, alignments_batch):
+        if columnar:
+            aligned_utt_objs.append(add_t_start_end_to_utt_arrays(utt_obj, alignment_utt, output_timestep_duration))
+            continue
+        utt_obj = add_t_start_end_to_utt_obj(utt_obj, alignment_utt, output_timestep_duration)
+        if "ctm" in cfg.save_output_file_formats:
+            utt_obj = make_ctm_files(utt_obj, cfg.output_dir, cfg.ctm_file_config)
+        if "ass" in cfg.save_output_file_formats:
+            utt_obj = make_ass_files(utt_obj, cfg.output_dir, cfg.ass_file_config)
+        aligned_utt_objs.append(utt_obj)
+    return aligned_utt_objs, output_timestep_duration
+
+
+def _alignment_pipeline(cfg: AlignmentConfig, model: Optional[torch.nn.Module] = None) -> None:
+    """
+    Core alignment logic. If a model is provided, it is used;
+    otherwise, a new model is loaded.
+    """
+    logging.info(f'Hydra config: {OmegaConf.to_yaml(cfg)}')
+    if is_dataclass(cfg):
+        cfg = OmegaConf.structured(cfg)
+
+    # --- Validation code (unchanged semantics) ---
+    if cfg.manifest_filepath is None:
+        raise ValueError("cfg.manifest_filepath must be specified")
+    if cfg.output_dir is None:
+        raise ValueError("cfg.output_dir must be specified")
+    _validate_config(cfg)
+
+    # the manifest itself is checked line by line while it is read, see iter_manifest_batches
+    required_entries = ["audio_filepath"]
+    forbidden_entries = []
+    if cfg.align_using_pred_text:
+        forbidden_entries.append("pred_text")
+    else:
+        required_entries.append("text")
+
+    # --- Device initialization ---
+    _, viterbi_device = _get_devices(cfg)
 
     # --- Load model only if not provided ---
     if model is None:
         model = load_alignment_model(cfg)
 
-    # --- (Optionally, include buffered streaming logic here) ---
-    buffered_chunk_params = {}
-    starts, ends = get_batch_starts_ends(cfg.manifest_filepath, cfg.batch_size)
+    buffered_chunk_params = _get_buffered_chunk_params(cfg, model)
+    tokenization_cache = TokenizationCache()
     output_timestep_duration = None
     os.makedirs(cfg.output_dir, exist_ok=True)
     tgt_manifest_name = str(Path(cfg.manifest_filepath).stem) + "_with_output_file_paths.json"
     tgt_manifest_filepath = str(Path(cfg.output_dir) / tgt_manifest_name)
-    f_manifest_out = open(tgt_manifest_filepath, 'w')
-    for start, end in zip(starts, ends):
-        manifest_lines_batch = get_manifest_lines_batch(cfg.manifest_filepath, start, end)
-        (log_probs_batch, y_batch, T_batch, U_batch, utt_obj_batch, output_timestep_duration) = get_batch_variables(
-            manifest_lines_batch,
+    manifest_batches = iter_manifest_batches(
+        cfg.manifest_filepath, cfg.batch_size, required_entries=required_entries, forbidden_entries=forbidden_entries
+    )
+    # a bad line further down stops the run there, so close the output manifest on errors too
+    with open(tgt_manifest_filepath, 'w') as f_manifest_out:
+        for manifest_lines_batch in manifest_batches:
+            utt_obj_batch, output_timestep_duration = _align_lines_batch(
+                cfg,
+                model,
+                manifest_lines_batch,
+                output_timestep_duration,
+                viterbi_device,
+                buffered_chunk_params,
+                tokenization_cache,
+            )
+            for utt_obj in utt_obj_batch:
+                write_manifest_out_line(f_manifest_out, utt_obj)
+
+
+def align_manifest_lines(
+    cfg: AlignmentConfig,
+    manifest_lines: List[dict],
+    model: torch.nn.Module,
+    tokenization_cache: Optional[TokenizationCache] = None,
+    columnar: bool = False,
+) -> List:
+    """
+    Aligns manifest lines that are already in memory instead of reading them from cfg.manifest_filepath.
+    Each line needs "text" plus either "audio_filepath" or "audio" (a mono float32 numpy array at the
+    model's sample rate) and "utt_id". No output manifest is written - the Utterance objects, with the
+    t_start / t_end of all their segments, words and tokens filled in, are returned instead, in the order
+    of manifest_lines. With an empty cfg.save_output_file_formats nothing at all is written to disk and
+    cfg.output_dir may be None; otherwise the CTM / ASS files go to cfg.output_dir as in run_alignment.
+    Pass the same tokenization_cache on every call to avoid re-tokenizing words seen before.
+    With columnar=True, UtteranceArrays are returned instead of Utterance objects; this needs an empty
+    cfg.save_output_file_formats, as the CTM / ASS writers work on Utterance objects.
+    """
+    if is_dataclass(cfg):
+        cfg = OmegaConf.structured(cfg)
+    _validate_config(cfg)
+    if columnar and cfg.save_output_file_formats:
+        raise ValueError("cfg.save_output_file_formats must be empty when columnar is True")
+    _, viterbi_device = _get_devices(cfg)
+
+    if cfg.save_output_file_formats:
+        os.makedirs(cfg.output_dir, exist_ok=True)
+    buffered_chunk_params = _get_buffered_chunk_params(cfg, model)
+    output_timestep_duration = None
+    utt_objs = []
+    for start in range(0, len(manifest_lines), cfg.batch_size):
+        manifest_lines_batch = []
+        for line in manifest_lines[start : start + cfg.batch_size]:
+            line = dict(line)
+            if "text" in line:
+                # same clean-up as iter_manifest_batches does for lines read from disk
+                line["text"] = clean_manifest_text(line["text"])
+            manifest_lines_batch.append(line)
+        utt_obj_batch, output_timestep_duration = _align_lines_batch(
+            cfg,
             model,
-            cfg.additional_segment_grouping_separator,
-            cfg.align_using_pred_text,
-            cfg.audio_filepath_parts_in_utt_id,
+            manifest_lines_batch,
             output_timestep_duration,
-            cfg.simulate_cache_aware_streaming,
-            cfg.use_buffered_chunked_streaming,
+            viterbi_device,
             buffered_chunk_params,
+            tokenization_cache,
+            columnar,
         )
-        alignments_batch = viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, viterbi_device)
-        for utt_obj, alignment_utt in zip(utt_obj_batch, alignments_batch):
-            utt_obj = add_t_start_end_to_utt_obj(utt_obj, alignment_utt, output_timestep_duration)
-            if "ctm" in cfg.save_output_file_formats:
-                utt_obj = make_ctm_files(utt_obj, cfg.output_dir, cfg.ctm_file_config)
-            if "ass" in cfg.save_output_file_formats:
-                utt_obj = make_ass_files(utt_obj, cfg.output_dir, cfg.ass_file_config)
-            write_manifest_out_line(f_manifest_out, utt_obj)
-    f_manifest_out.close()
+        utt_objs.extend(utt_obj_batch)
+    return utt_objs
 
 @hydra_runner(config_name="AlignmentConfig", schema=AlignmentConfig)
 def main(cfg: AlignmentConfig) -> None:
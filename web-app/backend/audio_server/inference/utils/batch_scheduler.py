@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DynamicBatchScheduler:
+    """
+    Collects work items submitted by concurrent requests and runs them through one batched call.
+
+    A batch is dispatched as soon as `max_batch_size` items are pending or the oldest pending item
+    has waited `max_wait_ms`, whichever comes first. `batch_fn` receives the list of items and must
+    return a list of results in the same order; it runs in a worker thread so the event loop keeps
+    serving other requests while the model is busy. Only one batch runs at a time. If a batch raises,
+    its items are rerun one at a time so a single bad item only fails its own caller.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 25.0,
+        name: str = "batch",
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_sec = max_wait_ms / 1000.0
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # counters reported by stats()
+        self.batches_run = 0
+        self.items_run = 0
+        self.max_batch_seen = 0
+
+    async def start(self):
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"{self.name} scheduler started (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait_sec * 1000:.0f})"
+        )
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        # fail anything that was still waiting so callers do not hang
+        while not self._queue.empty():
+            self._fail_stopped([self._queue.get_nowait()])
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queues a single item and waits for its result.
+        """
+        if self._worker is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        """
+        Queues several items (e.g. all chunks of one recording) and waits for all of their results.
+        """
+        return list(await asyncio.gather(*(self.submit(item) for item in items)))
+
+    def stats(self) -> dict:
+        return {
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "mean_batch_size": self.items_run / self.batches_run if self.batches_run else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def _collect_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_sec
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+            except asyncio.CancelledError:
+                self._fail_stopped(batch)
+                raise
+        # requests that went away while waiting do not need to be run
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                results = await asyncio.to_thread(self.batch_fn, items)
+            except asyncio.CancelledError:
+                # stopped while this batch was running; its results will never be delivered
+                self._fail_stopped(batch)
+                raise
+            except Exception as e:
+                if len(batch) == 1:
+                    logger.error(f"{self.name} item failed: {str(e)}")
+                    batch[0][1].set_exception(e)
+                    continue
+                # items come from different requests; rerun them one by one so only the bad one fails
+                logger.error(f"{self.name} batch of {len(items)} failed, retrying items singly: {str(e)}")
+                await self._run_singly(batch)
+                continue
+
+            self._record(len(items))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _run_singly(self, batch):
+        for index, (item, future) in enumerate(batch):
+            if future.done():
+                continue
+            try:
+                result = (await asyncio.to_thread(self.batch_fn, [item]))[0]
+            except asyncio.CancelledError:
+                self._fail_stopped(batch[index:])
+                raise
+            except Exception as e:
+                logger.error(f"{self.name} item failed: {str(e)}")
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self._record(1)
+            if not future.done():
+                future.set_result(result)
+
+    def _record(self, batch_size: int):
+        self.batches_run += 1
+        self.items_run += batch_size
+        self.max_batch_seen = max(self.max_batch_seen, batch_size)
+
+    def _fail_stopped(self, batch):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} scheduler stopped"))
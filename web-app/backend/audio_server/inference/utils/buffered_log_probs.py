@@ -0,0 +1,156 @@
+# buffered_log_probs.py
+import contextlib
+from typing import List
+
+import numpy as np
+import torch
+
+from nemo.collections.asr.models.hybrid_rnnt_ctc_models import EncDecHybridRNNTCTCModel
+
+
+def get_model_stride_in_secs(model) -> float:
+    """
+    Duration of one output frame of the model: feature window stride times the encoder subsampling factor
+    (0.01 s * 8 = 80 ms for FastConformer).
+    """
+    return model.cfg.preprocessor.window_stride * model.cfg.encoder.subsampling_factor
+
+
+def get_n_classes(model) -> int:
+    """
+    Width of the model's CTC log-probs: the vocabulary plus the blank.
+    """
+    if hasattr(model, 'tokenizer'):
+        return len(model.tokenizer.vocab) + 1
+    return len(model.decoder.vocabulary) + 1
+
+
+def get_ctc_log_probs(model, audio: torch.Tensor) -> torch.Tensor:
+    """
+    Returns the CTC log-probs of one mono float32 signal (1-D tensor on the model's device), shape (T, V + 1).
+    Calls the preprocessor, encoder and CTC head directly rather than model.forward, which on hybrid
+    RNNT/CTC models returns encoder states instead of log-probs.
+    """
+    signal = audio.unsqueeze(0)
+    length = torch.tensor([signal.shape[1]], device=signal.device)
+    processed_signal, processed_signal_length = model.preprocessor(input_signal=signal, length=length)
+    encoded, encoded_len = model.encoder(audio_signal=processed_signal, length=processed_signal_length)
+    ctc_decoder = model.ctc_decoder if isinstance(model, EncDecHybridRNNTCTCModel) else model.decoder
+    log_probs = ctc_decoder(encoder_output=encoded)
+    return log_probs[0, : int(encoded_len[0])]
+
+
+class BufferedLogProbs:
+    """
+    Turns audio that arrives piece by piece into CTC log-probs, one chunk of chunk_len_in_secs at a time.
+
+    Every chunk goes through the model inside a window of total_buffer_in_secs: left context carried over
+    from earlier calls, the chunk, and right look-ahead. Only the output frames that belong to the chunk are
+    kept, so the encoder sees (nearly) the same context it would offline while each chunk is committed only
+    once. This is the buffering FrameBatchASR does, kept incremental.
+    """
+
+    def __init__(self, model, chunk_len_in_secs: float = 1.6, total_buffer_in_secs: float = 4.0, lock=None):
+        self.model = model
+        self.sample_rate = model.cfg.preprocessor.sample_rate
+        self.model_stride_in_secs = get_model_stride_in_secs(model)
+        self.n_classes = get_n_classes(model)
+        # chunk and context are whole numbers of output frames so that frame boundaries line up
+        self.frame_samples = int(round(self.model_stride_in_secs * self.sample_rate))
+        frames_per_chunk = max(1, int(round(chunk_len_in_secs / self.model_stride_in_secs)))
+        context_frames = max(0, int(round(total_buffer_in_secs / self.model_stride_in_secs)) - frames_per_chunk)
+        self.chunk_samples = frames_per_chunk * self.frame_samples
+        self.left_context_samples = (context_frames // 2) * self.frame_samples
+        self.right_context_samples = (context_frames - context_frames // 2) * self.frame_samples
+        self._lock = lock if lock is not None else contextlib.nullcontext()
+
+        # _buffer[0] is absolute sample _buffer_start; everything before _chunk_start is committed
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0
+        self._chunk_start = 0
+
+    @property
+    def samples_received(self) -> int:
+        return self._buffer_start + len(self._buffer)
+
+    @property
+    def frames_committed(self) -> int:
+        return self._chunk_start // self.frame_samples
+
+    def push(self, audio: np.ndarray) -> torch.Tensor:
+        """
+        Adds mono float32 samples at the model's sample rate. Returns the log-probs, shape (n, V + 1),
+        of every chunk that now has its full right look-ahead (n may be 0).
+        """
+        self._buffer = np.concatenate([self._buffer, np.asarray(audio, dtype=np.float32)])
+        new_frames = []
+        while self.samples_received - self._chunk_start >= self.chunk_samples + self.right_context_samples:
+            new_frames.append(self._run_chunk(self._chunk_start + self.chunk_samples))
+        return self._cat(new_frames)
+
+    def flush(self) -> torch.Tensor:
+        """
+        Commits the rest of the audio, with whatever look-ahead is left. Returns its log-probs.
+        """
+        new_frames = []
+        while self._chunk_start < self.samples_received:
+            new_frames.append(self._run_chunk(min(self._chunk_start + self.chunk_samples, self.samples_received)))
+        return self._cat(new_frames)
+
+    def peek(self) -> torch.Tensor:
+        """
+        Log-probs of the audio not committed yet, with whatever look-ahead there is, without committing
+        it: the same frames flush() would return now, while later push() calls still see this audio with
+        its full look-ahead.
+        """
+        new_frames = []
+        chunk_start = self._chunk_start
+        while chunk_start < self.samples_received:
+            chunk_end = min(chunk_start + self.chunk_samples, self.samples_received)
+            new_frames.append(self._chunk_log_probs(chunk_start, chunk_end))
+            chunk_start = chunk_end
+        return self._cat(new_frames)
+
+    def _chunk_log_probs(self, chunk_start: int, chunk_end: int) -> torch.Tensor:
+        window_start = max(self._buffer_start, chunk_start - self.left_context_samples)
+        window_end = min(self.samples_received, chunk_end + self.right_context_samples)
+        window = self._buffer[window_start - self._buffer_start : window_end - self._buffer_start]
+
+        with self._lock, torch.no_grad():
+            audio = torch.from_numpy(window).to(self.model.device)
+            log_probs = get_ctc_log_probs(self.model, audio).cpu()
+
+        first_frame = (chunk_start - window_start) // self.frame_samples
+        n_frames = -(-(chunk_end - chunk_start) // self.frame_samples)
+        return log_probs[first_frame : first_frame + n_frames]
+
+    def _run_chunk(self, chunk_end: int) -> torch.Tensor:
+        chunk_log_probs = self._chunk_log_probs(self._chunk_start, chunk_end)
+
+        # keep only the left context the next chunk needs
+        self._chunk_start = chunk_end
+        keep_from = max(self._buffer_start, self._chunk_start - self.left_context_samples)
+        self._buffer = self._buffer[keep_from - self._buffer_start :]
+        self._buffer_start = keep_from
+        return chunk_log_probs
+
+    def _cat(self, frames: List[torch.Tensor]) -> torch.Tensor:
+        if frames:
+            return torch.cat(frames)
+        return torch.zeros((0, self.n_classes))
+
+
+def ctc_greedy_text(model, log_probs: torch.Tensor) -> str:
+    """
+    Collapses the best CTC path of log_probs (T, V + 1) into text.
+    """
+    blank_id = log_probs.shape[-1] - 1
+    best_path = torch.argmax(log_probs, dim=-1).tolist()
+    token_ids = [
+        token_id
+        for t, token_id in enumerate(best_path)
+        if token_id != blank_id and (t == 0 or best_path[t - 1] != token_id)
+    ]
+    if hasattr(model, 'tokenizer'):
+        return model.tokenizer.ids_to_text(token_ids)
+    return "".join(model.decoder.vocabulary[token_id] for token_id in token_ids)
@@ -13,15 +13,19 @@
 # limitations under the License.
 
 import json
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Union
+from typing import List, Optional, Union
 
+import numpy as np
 import soundfile as sf
 import torch
 from tqdm.auto import tqdm
 from .constants import BLANK_TOKEN, SPACE_TOKEN, V_NEGATIVE_NUM
+from .buffered_log_probs import BufferedLogProbs, ctc_greedy_text
 
+from nemo.collections.asr.parts.utils.streaming_utils import get_samples
 from nemo.utils import logging
 
 
@@ -32,69 +36,52 @@ def _get_utt_id(audio_filepath, audio_filepath_parts_in_utt_id):
     return utt_id
 
 
-def get_batch_starts_ends(manifest_filepath, batch_size):
-    """
-    Get the start and end ids of the lines we will use for each 'batch'.
-    """
-
-    with open(manifest_filepath, 'r') as f:
-        num_lines_in_manifest = sum(1 for _ in f)
-
-    starts = [x for x in range(0, num_lines_in_manifest, batch_size)]
-    ends = [x - 1 for x in starts]
-    ends.pop(0)
-    ends.append(num_lines_in_manifest)
+def _get_line_utt_id(line, audio_filepath_parts_in_utt_id):
+    # in-memory lines have no file path to derive an utt_id from, so they carry their own
+    if "utt_id" in line:
+        return line["utt_id"]
+    return _get_utt_id(line["audio_filepath"], audio_filepath_parts_in_utt_id)
 
-    return starts, ends
 
-
-def is_entry_in_any_lines(manifest_filepath, entry):
+def clean_manifest_text(text):
     """
-    Returns True if entry is a key in any of the JSON lines in manifest_filepath
+    Removes any BOM and duplicated spaces, and converts any newline chars to spaces.
     """
+    return " ".join(text.replace("\ufeff", "").split())
 
-    entry_in_manifest = False
-
-    with open(manifest_filepath, 'r') as f:
-        for line in f:
-            data = json.loads(line)
-
-            if entry in data:
-                entry_in_manifest = True
 
-    return entry_in_manifest
-
-
-def is_entry_in_all_lines(manifest_filepath, entry):
+def iter_manifest_batches(manifest_filepath, batch_size, required_entries=(), forbidden_entries=()):
     """
-    Returns True is entry is a key in all of the JSON lines in manifest_filepath.
-    """
-    with open(manifest_filepath, 'r') as f:
-        for line in f:
-            data = json.loads(line)
+    Reads manifest_filepath once, from start to end, and yields lists of up to batch_size parsed lines.
+    Only the current batch is held in memory, so the cost is linear in the number of lines however
+    big the manifest is.
 
-            if entry not in data:
-                return False
-
-    return True
-
-
-def get_manifest_lines_batch(manifest_filepath, start, end):
+    Every line is checked as it is parsed: a RuntimeError naming the line is raised if it is missing one
+    of required_entries or contains one of forbidden_entries. Batches before that line have already been
+    yielded by then. Blank lines are skipped.
+    """
     manifest_lines_batch = []
     with open(manifest_filepath, "r", encoding="utf-8-sig") as f:
         for line_i, line in enumerate(f):
-            if line_i >= start and line_i <= end:
-                data = json.loads(line)
-                if "text" in data:
-                    # remove any BOM, any duplicated spaces, convert any
-                    # newline chars to spaces
-                    data["text"] = data["text"].replace("\ufeff", "")
-                    data["text"] = " ".join(data["text"].split())
-                manifest_lines_batch.append(data)
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            for entry in required_entries:
+                if entry not in data:
+                    raise RuntimeError(f"Line {line_i + 1} of {manifest_filepath} has no '{entry}' entry.")
+            for entry in forbidden_entries:
+                if entry in data:
+                    raise RuntimeError(f"Line {line_i + 1} of {manifest_filepath} must not have a '{entry}' entry.")
+            if "text" in data:
+                data["text"] = clean_manifest_text(data["text"])
+            manifest_lines_batch.append(data)
+
+            if len(manifest_lines_batch) == batch_size:
+                yield manifest_lines_batch
+                manifest_lines_batch = []
 
-            if line_i == end:
-                break
-    return manifest_lines_batch
+    if manifest_lines_batch:
+        yield manifest_lines_batch
 
 
 def get_char_tokens(text, model):
@@ -224,8 +211,193 @@ class Utterance:
     saved_output_files: dict = field(default_factory=dict)
 
 
+# values of UtteranceArrays.level, indexing ALIGNMENT_LEVELS
+LEVEL_TOKEN = 0
+LEVEL_WORD = 1
+LEVEL_SEGMENT = 2
+ALIGNMENT_LEVELS = ("tokens", "words", "segments")
+
+
+@dataclass
+class UtteranceArrays:
+    """
+    Columnar form of an Utterance: one row per segment, word and token (blanks included) instead of a tree
+    of objects. Rows are in the order of a depth-first walk of segments_and_tokens, so the rows of any one
+    level are in the same order get_boundary_info returns them.
+    """
+
+    level: np.ndarray  # int8, LEVEL_TOKEN / LEVEL_WORD / LEVEL_SEGMENT
+    parent: np.ndarray  # int32, row of the enclosing word or segment, -1 for top-level rows
+    s_start: np.ndarray  # int32
+    s_end: np.ndarray  # int32
+    t_start: np.ndarray  # float64, -1 for tokens the alignment skips, NaN before alignment
+    t_end: np.ndarray  # float64
+    texts: List[str] = field(default_factory=list)
+    texts_cased: List[Optional[str]] = field(default_factory=list)
+    token_ids_with_blanks: List[int] = field(default_factory=list)
+    text: str = None
+    pred_text: str = None
+    audio_filepath: str = None
+    utt_id: str = None
+
+    def __len__(self):
+        return len(self.level)
+
+
+def utt_obj_to_arrays(utt_obj):
+    """
+    Flattens utt_obj (timings included, if it has any) into an UtteranceArrays in a single walk.
+    """
+    level, parent, s_start, s_end, t_start, t_end, texts, texts_cased = [], [], [], [], [], [], [], []
+
+    def add_row(item, item_level, parent_row):
+        level.append(item_level)
+        parent.append(parent_row)
+        s_start.append(item.s_start)
+        s_end.append(item.s_end)
+        t_start.append(np.nan if item.t_start is None else item.t_start)
+        t_end.append(np.nan if item.t_end is None else item.t_end)
+        texts.append(item.text)
+        texts_cased.append(getattr(item, "text_cased", None))
+        return len(level) - 1
+
+    for segment_or_token in utt_obj.segments_and_tokens:
+        if type(segment_or_token) is Segment:
+            segment_row = add_row(segment_or_token, LEVEL_SEGMENT, -1)
+            for word_or_token in segment_or_token.words_and_tokens:
+                if type(word_or_token) is Word:
+                    word_row = add_row(word_or_token, LEVEL_WORD, segment_row)
+                    for token in word_or_token.tokens:
+                        add_row(token, LEVEL_TOKEN, word_row)
+                else:
+                    add_row(word_or_token, LEVEL_TOKEN, segment_row)
+        else:
+            add_row(segment_or_token, LEVEL_TOKEN, -1)
+
+    return UtteranceArrays(
+        level=np.array(level, dtype=np.int8),
+        parent=np.array(parent, dtype=np.int32),
+        s_start=np.array(s_start, dtype=np.int32),
+        s_end=np.array(s_end, dtype=np.int32),
+        t_start=np.array(t_start, dtype=np.float64),
+        t_end=np.array(t_end, dtype=np.float64),
+        texts=texts,
+        texts_cased=texts_cased,
+        token_ids_with_blanks=utt_obj.token_ids_with_blanks,
+        text=utt_obj.text,
+        pred_text=utt_obj.pred_text,
+        audio_filepath=utt_obj.audio_filepath,
+        utt_id=utt_obj.utt_id,
+    )
+
+
+class TokenizationCache:
+    """
+    LRU cache of word -> (tokens, token ids, cased tokens) for one tokenizer.
+
+    ATC speech uses a small, very repetitive vocabulary (callsigns, NATO words, "flight level"...), so
+    almost every word of an utterance has been tokenized before. Keep one cache per loaded model; it is
+    not thread-safe, which is fine as long as alignments on that model take turns (see ForceAligner).
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, word, tokenizer):
+        entry = self._entries.get(word)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(word)
+            return entry
+
+        self.misses += 1
+        word_tokens = tokenizer.text_to_tokens(word)
+        entry = (word_tokens, tokenizer.text_to_ids(word), restore_token_case(word, word_tokens))
+        self._entries[word] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _build_utt_arrays(utt, segments, segments_word_tokens, BLANK_ID):
+    """
+    Builds the UtteranceArrays get_utt_obj would produce for a tokenizer-based model, row by row in the
+    same order and with the same s_start / s_end, but as flat lists instead of nested objects.
+    """
+    level, parent, s_start, s_end, texts, texts_cased = [], [], [], [], [], []
+
+    def add_row(row_level, parent_row, row_s_start, row_s_end, text, text_cased):
+        level.append(row_level)
+        parent.append(parent_row)
+        s_start.append(row_s_start)
+        s_end.append(row_s_end)
+        texts.append(text)
+        texts_cased.append(text_cased)
+        return len(level) - 1
+
+    token_ids_with_blanks = [BLANK_ID]
+    add_row(LEVEL_TOKEN, -1, 0, 0, BLANK_TOKEN, BLANK_TOKEN)
+    s_pointer = 1  # first segment / word starts at s=1 because s=0 is a blank
+
+    for segment, segment_word_tokens in zip(segments, segments_word_tokens):
+        n_segment_tokens = sum(len(word_tokens) for _, word_tokens, _, _ in segment_word_tokens)
+        segment_row = add_row(LEVEL_SEGMENT, -1, s_pointer, s_pointer + n_segment_tokens * 2 - 2, segment, None)
+
+        for word_i, (word, word_tokens, word_token_ids, word_tokens_cased) in enumerate(segment_word_tokens):
+            word_row = add_row(LEVEL_WORD, segment_row, s_pointer, s_pointer + len(word_tokens) * 2 - 2, word, None)
+            s_pointer += len(word_tokens) * 2
+
+            for token_i, (token, token_id, token_cased) in enumerate(
+                zip(word_tokens, word_token_ids, word_tokens_cased)
+            ):
+                token_ids_with_blanks.extend([token_id, BLANK_ID])
+                token_s = len(token_ids_with_blanks) - 2
+                add_row(LEVEL_TOKEN, word_row, token_s, token_s, token, token_cased)
+                # blank in between the tokens of the word
+                if token_i < len(word_tokens) - 1:
+                    add_row(LEVEL_TOKEN, word_row, token_s + 1, token_s + 1, BLANK_TOKEN, BLANK_TOKEN)
+
+            # blank in between words of this segment
+            if word_i < len(segment_word_tokens) - 1:
+                blank_s = len(token_ids_with_blanks) - 1
+                add_row(LEVEL_TOKEN, segment_row, blank_s, blank_s, BLANK_TOKEN, BLANK_TOKEN)
+
+        # blank in between segments / after the final segment
+        blank_s = len(token_ids_with_blanks) - 1
+        add_row(LEVEL_TOKEN, -1, blank_s, blank_s, BLANK_TOKEN, BLANK_TOKEN)
+
+    n_rows = len(level)
+    return UtteranceArrays(
+        level=np.array(level, dtype=np.int8),
+        parent=np.array(parent, dtype=np.int32),
+        s_start=np.array(s_start, dtype=np.int32),
+        s_end=np.array(s_end, dtype=np.int32),
+        t_start=np.full(n_rows, np.nan),
+        t_end=np.full(n_rows, np.nan),
+        texts=texts,
+        texts_cased=texts_cased,
+        token_ids_with_blanks=token_ids_with_blanks,
+        text=utt.text,
+        audio_filepath=utt.audio_filepath,
+        utt_id=utt.utt_id,
+    )
+
+
 def get_utt_obj(
-    text, model, separator, T, audio_filepath, utt_id,
+    text, model, separator, T, audio_filepath, utt_id, tokenization_cache=None, columnar=False,
 ):
     """
     Function to create an Utterance object and add all necessary information to it except
@@ -240,6 +412,12 @@ def get_utt_obj(
         blank and non-blank tokens.
         We will be building up these lists in this function. This data structure will then be useful for
         generating the various output files that we wish to save.
+
+        For tokenizer-based models every word is tokenized once (through tokenization_cache if one is
+        given); the token counts of the whole text and of each segment are derived from the word tokens.
+        With columnar=True they return an UtteranceArrays built straight from those tokens, without
+        creating any Segment / Word / Token objects (see _build_utt_arrays); other models and utterances
+        that are not aligned still return an Utterance.
     """
 
     if not separator:  # if separator is not defined - treat the whole text as one segment
@@ -268,8 +446,22 @@ def get_utt_obj(
         if len(text) == 0:
             return utt
 
+        if tokenization_cache is None:
+            tokenization_cache = TokenizationCache()
+
+        # tokenize every word once: (word, word_tokens, word_token_ids, word_tokens_cased) per segment
+        segments_word_tokens = [
+            [(word, *tokenization_cache.get(word, model.tokenizer)) for word in segment.split(" ")]
+            for segment in segments  # we define words to be space-separated sub-strings
+        ]
+
         # check for # tokens + token repetitions being > T
-        all_tokens = model.tokenizer.text_to_ids(text)
+        all_tokens = [
+            token_id
+            for segment_word_tokens in segments_word_tokens
+            for _, _, word_token_ids, _ in segment_word_tokens
+            for token_id in word_token_ids
+        ]
         n_token_repetitions = 0
         for i_tok in range(1, len(all_tokens)):
             if all_tokens[i_tok] == all_tokens[i_tok - 1]:
@@ -282,36 +474,35 @@ def get_utt_obj(
             )
             return utt
 
+        if columnar:
+            return _build_utt_arrays(utt, segments, segments_word_tokens, BLANK_ID)
+
         # build up data structures containing segments/words/tokens
         utt.segments_and_tokens.append(Token(text=BLANK_TOKEN, text_cased=BLANK_TOKEN, s_start=0, s_end=0,))
 
         segment_s_pointer = 1  # first segment will start at s=1 because s=0 is a blank
         word_s_pointer = 1  # first word will start at s=1 because s=0 is a blank
 
-        for segment in segments:
+        for segment, segment_word_tokens in zip(segments, segments_word_tokens):
             # add the segment to segment_info and increment the segment_s_pointer
-            segment_tokens = model.tokenizer.text_to_tokens(segment)
+            n_segment_tokens = sum(len(word_tokens) for _, word_tokens, _, _ in segment_word_tokens)
             utt.segments_and_tokens.append(
                 Segment(
                     text=segment,
                     s_start=segment_s_pointer,
-                    # segment_tokens do not contain blanks => need to muliply by 2
+                    # segment tokens do not contain blanks => need to muliply by 2
                     # s_end needs to be the index of the final token (including blanks) of the current segment:
-                    # segment_s_pointer + len(segment_tokens) * 2 is the index of the first token of the next segment =>
+                    # segment_s_pointer + n_segment_tokens * 2 is the index of the first token of the next segment =>
                     # => need to subtract 2
-                    s_end=segment_s_pointer + len(segment_tokens) * 2 - 2,
+                    s_end=segment_s_pointer + n_segment_tokens * 2 - 2,
                 )
             )
             segment_s_pointer += (
-                len(segment_tokens) * 2
-            )  # multiply by 2 to account for blanks (which are not present in segment_tokens)
-
-            words = segment.split(" ")  # we define words to be space-separated sub-strings
-            for word_i, word in enumerate(words):
+                n_segment_tokens * 2
+            )  # multiply by 2 to account for blanks (which are not present in the segment tokens)
 
-                word_tokens = model.tokenizer.text_to_tokens(word)
-                word_token_ids = model.tokenizer.text_to_ids(word)
-                word_tokens_cased = restore_token_case(word, word_tokens)
+            words = segment_word_tokens
+            for word_i, (word, word_tokens, word_token_ids, word_tokens_cased) in enumerate(words):
 
                 # add the word to word_info and increment the word_s_pointer
                 utt.segments_and_tokens[-1].words_and_tokens.append(
@@ -668,6 +859,26 @@ def add_t_start_end_to_utt_obj(utt_obj, alignment_utt, output_timestep_duration)
     return utt_obj
 
 
+def add_t_start_end_to_utt_arrays(utt_arrays, alignment_utt, output_timestep_duration):
+    """
+    Same as add_t_start_end_to_utt_obj, for an UtteranceArrays: the t_start / t_end of every segment, word
+    and token are set in one vectorized gather. alignment_utt never moves backwards through the tokens, so
+    the first / last timestep of every s is a binary search; rows whose s the alignment skips get -1.
+    """
+    alignment = np.asarray(alignment_utt, dtype=np.int64)
+    if len(utt_arrays) == 0 or len(alignment) == 0:
+        return utt_arrays
+
+    first_appearance = np.searchsorted(alignment, utt_arrays.s_start, side="left")
+    last_appearance = np.searchsorted(alignment, utt_arrays.s_end, side="right") - 1
+    has_first = alignment[np.minimum(first_appearance, len(alignment) - 1)] == utt_arrays.s_start
+    has_last = alignment[np.maximum(last_appearance, 0)] == utt_arrays.s_end
+
+    utt_arrays.t_start = np.where(has_first, first_appearance * output_timestep_duration, -1.0)
+    utt_arrays.t_end = np.where(has_last, (last_appearance + 1) * output_timestep_duration, -1.0)
+    return utt_arrays
+
+
 def get_batch_variables(
     manifest_lines_batch,
     model,
@@ -678,8 +889,13 @@ def get_batch_variables(
     simulate_cache_aware_streaming=False,
     use_buffered_chunked_streaming=False,
     buffered_chunk_params={},
+    tokenization_cache=None,
+    columnar=False,
 ):
     """
+    tokenization_cache: optional TokenizationCache reused across batches (see get_utt_obj).
+    columnar: if True, utt_obj_batch holds UtteranceArrays instead of Utterance objects.
+
     Returns:
         log_probs, y, T, U (y and U are s.t. every other token is a blank) - these are the tensors we will need
             during Viterbi decoding.
@@ -691,8 +907,11 @@ def get_batch_variables(
     # get hypotheses by calling 'transcribe'
     # we will use the output log_probs, the duration of the log_probs,
     # and (optionally) the predicted ASR text from the hypotheses
-    audio_filepaths_batch = [line["audio_filepath"] for line in manifest_lines_batch]
-    B = len(audio_filepaths_batch)
+    # a line either points at a file ("audio_filepath") or carries the samples themselves ("audio":
+    # a mono float32 numpy array at the model's sample rate), in which case nothing is read from disk
+    audio_filepaths_batch = [line.get("audio_filepath") for line in manifest_lines_batch]
+    audio_batch = [line["audio"] if "audio" in line else line["audio_filepath"] for line in manifest_lines_batch]
+    B = len(audio_batch)
     log_probs_list_batch = []
     T_list_batch = []
     pred_text_batch = []
@@ -700,11 +919,11 @@ def get_batch_variables(
     if not use_buffered_chunked_streaming:
         if not simulate_cache_aware_streaming:
             with torch.no_grad():
-                hypotheses = model.transcribe(audio_filepaths_batch, return_hypotheses=True, batch_size=B)
+                hypotheses = model.transcribe(audio_batch, return_hypotheses=True, batch_size=B)
         else:
             with torch.no_grad():
                 hypotheses = model.transcribe_simulate_cache_aware_streaming(
-                    audio_filepaths_batch, return_hypotheses=True, batch_size=B
+                    audio_batch, return_hypotheses=True, batch_size=B
                 )
 
         # if hypotheses form a tuple (from Hybrid model), extract just "best" hypothesis
@@ -716,16 +935,16 @@ def get_batch_variables(
             T_list_batch.append(hypothesis.y_sequence.shape[0])
             pred_text_batch.append(hypothesis.text)
     else:
-        delay = buffered_chunk_params["delay"]
-        model_stride_in_secs = buffered_chunk_params["model_stride_in_secs"]
-        tokens_per_chunk = buffered_chunk_params["tokens_per_chunk"]
-        for l in tqdm(audio_filepaths_batch, desc="Sample:"):
-            model.reset()
-            model.read_audio_file(l, delay, model_stride_in_secs)
-            hyp, logits = model.transcribe(tokens_per_chunk, delay, keep_logits=True)
+        # buffered_chunk_params: {"chunk_len_in_secs", "total_buffer_in_secs"} - see _get_buffered_chunk_params
+        for audio in tqdm(audio_batch, desc="Sample:"):
+            if isinstance(audio, str):
+                audio = get_samples(audio, target_sr=model.cfg.preprocessor.sample_rate)
+            buffered_log_probs = BufferedLogProbs(model, **buffered_chunk_params)
+            # either part may have no frames (empty audio has none at all); both are (n, V) all the same
+            logits = torch.cat([buffered_log_probs.push(audio), buffered_log_probs.flush()])
             log_probs_list_batch.append(logits)
             T_list_batch.append(logits.shape[0])
-            pred_text_batch.append(hyp)
+            pred_text_batch.append(ctc_greedy_text(model, logits))
 
     # we loop over every line in the manifest that is in our current batch,
     # and record the y (list of tokens, including blanks), U (list of lengths of y) and
@@ -745,8 +964,13 @@ def get_batch_variables(
             separator,
             T_list_batch[i_line],
             audio_filepaths_batch[i_line],
-            _get_utt_id(audio_filepaths_batch[i_line], audio_filepath_parts_in_utt_id),
+            _get_line_utt_id(line, audio_filepath_parts_in_utt_id),
+            tokenization_cache,
+            columnar,
         )
+        if columnar and type(utt_obj) is Utterance:
+            # char-based models, and utterances that will not be aligned
+            utt_obj = utt_obj_to_arrays(utt_obj)
 
         # update utt_obj.pred_text or utt_obj.text
         if align_using_pred_text:
@@ -796,8 +1020,10 @@ def get_batch_variables(
         U_utt = U_batch[b]
         y_batch[b, :U_utt] = torch.tensor(y_utt)
 
-    # calculate output_timestep_duration if it is None
-    if output_timestep_duration is None:
+    # calculate output_timestep_duration if it is None, from the first utterance that has any frames
+    # (if none has, there is nothing to time and the next batch tries again)
+    if output_timestep_duration is None and int(T_batch.max()) > 0:
+        b_ref = int(torch.nonzero(T_batch)[0])
         if not 'window_stride' in model.cfg.preprocessor:
             raise ValueError(
                 "Don't have attribute 'window_stride' in 'model.cfg.preprocessor' => cannot calculate "
@@ -810,10 +1036,13 @@ def get_batch_variables(
                 " and end time of segments => stopping process"
             )
 
-        with sf.SoundFile(audio_filepaths_batch[0]) as f:
-            audio_dur = f.frames / f.samplerate
+        if "audio" in manifest_lines_batch[b_ref]:
+            audio_dur = len(manifest_lines_batch[b_ref]["audio"]) / model.cfg.preprocessor.sample_rate
+        else:
+            with sf.SoundFile(audio_filepaths_batch[b_ref]) as f:
+                audio_dur = f.frames / f.samplerate
         n_input_frames = audio_dur / model.cfg.preprocessor.window_stride
-        model_downsample_factor = round(n_input_frames / int(T_batch[0]))
+        model_downsample_factor = round(n_input_frames / int(T_batch[b_ref]))
 
         output_timestep_duration = (
             model.preprocessor.featurizer.hop_length * model_downsample_factor / model.cfg.preprocessor.sample_rate
@@ -14,9 +14,10 @@
 
 import os
 
+import numpy as np
 import soundfile as sf
 from .constants import BLANK_TOKEN, SPACE_TOKEN
-from .data_prep import Segment, Word
+from .data_prep import ALIGNMENT_LEVELS, Segment, Word
 
 
 def make_ctm_files(
@@ -45,12 +46,11 @@ def make_ctm_files(
     return utt_obj
 
 
-def make_ctm(
-    alignment_level, utt_obj, output_dir_root, audio_file_duration, ctm_file_config,
-):
-    output_dir = os.path.join(output_dir_root, "ctm", alignment_level)
-    os.makedirs(output_dir, exist_ok=True)
-
+def get_boundary_info(alignment_level, utt_obj):
+    """
+    Returns the Token, Word or Segment objects of utt_obj for the given alignment level
+    ("tokens", "words" or "segments"), in order.
+    """
     boundary_info_utt = []
     for segment_or_token in utt_obj.segments_and_tokens:
         if type(segment_or_token) is Segment:
@@ -78,37 +78,103 @@ def make_ctm(
             if alignment_level == "tokens":
                 boundary_info_utt.append(token)
 
+    return boundary_info_utt
+
+
+def _iter_ctm_entries(boundary_info_utt, audio_file_duration, ctm_file_config):
+    """
+    Yields (text, start_time, end_time) for every token/word/segment that would go into a CTM file.
+    """
+    for boundary_info_ in boundary_info_utt:  # loop over every token/word/segment
+
+        # skip if t_start = t_end = negative number because we used it as a marker to skip some blank tokens
+        if not (boundary_info_.t_start < 0 or boundary_info_.t_end < 0):
+            text = boundary_info_.text
+            start_time = boundary_info_.t_start
+            end_time = boundary_info_.t_end
+
+            if (
+                ctm_file_config.minimum_timestamp_duration > 0
+                and ctm_file_config.minimum_timestamp_duration > end_time - start_time
+            ):
+                # make the predicted duration of the token/word/segment longer, growing it outwards equal
+                # amounts from the predicted center of the token/word/segment
+                token_mid_point = (start_time + end_time) / 2
+                start_time = max(token_mid_point - ctm_file_config.minimum_timestamp_duration / 2, 0)
+                end_time = min(
+                    token_mid_point + ctm_file_config.minimum_timestamp_duration / 2, audio_file_duration
+                )
+
+            if not (
+                text == BLANK_TOKEN and ctm_file_config.remove_blank_tokens
+            ):  # don't save blanks if we don't want to
+                yield text, start_time, end_time
+
+
+def make_ctm(
+    alignment_level, utt_obj, output_dir_root, audio_file_duration, ctm_file_config,
+):
+    output_dir = os.path.join(output_dir_root, "ctm", alignment_level)
+    os.makedirs(output_dir, exist_ok=True)
+
+    boundary_info_utt = get_boundary_info(alignment_level, utt_obj)
+
     with open(os.path.join(output_dir, f"{utt_obj.utt_id}.ctm"), "w") as f_ctm:
-        for boundary_info_ in boundary_info_utt:  # loop over every token/word/segment
-
-            # skip if t_start = t_end = negative number because we used it as a marker to skip some blank tokens
-            if not (boundary_info_.t_start < 0 or boundary_info_.t_end < 0):
-                text = boundary_info_.text
-                start_time = boundary_info_.t_start
-                end_time = boundary_info_.t_end
-
-                if (
-                    ctm_file_config.minimum_timestamp_duration > 0
-                    and ctm_file_config.minimum_timestamp_duration > end_time - start_time
-                ):
-                    # make the predicted duration of the token/word/segment longer, growing it outwards equal
-                    # amounts from the predicted center of the token/word/segment
-                    token_mid_point = (start_time + end_time) / 2
-                    start_time = max(token_mid_point - ctm_file_config.minimum_timestamp_duration / 2, 0)
-                    end_time = min(
-                        token_mid_point + ctm_file_config.minimum_timestamp_duration / 2, audio_file_duration
-                    )
-
-                if not (
-                    text == BLANK_TOKEN and ctm_file_config.remove_blank_tokens
-                ):  # don't save blanks if we don't want to
-                    # replace any spaces with <space> so we dont introduce extra space characters to our CTM files
-                    text = text.replace(" ", SPACE_TOKEN)
-
-                    f_ctm.write(f"{utt_obj.utt_id} 1 {start_time:.2f} {end_time - start_time:.2f} {text}\n")
+        for text, start_time, end_time in _iter_ctm_entries(boundary_info_utt, audio_file_duration, ctm_file_config):
+            # replace any spaces with <space> so we dont introduce extra space characters to our CTM files
+            text = text.replace(" ", SPACE_TOKEN)
+
+            f_ctm.write(f"{utt_obj.utt_id} 1 {start_time:.2f} {end_time - start_time:.2f} {text}\n")
 
     utt_obj.saved_output_files[f"{alignment_level}_level_ctm_filepath"] = os.path.join(
         output_dir, f"{utt_obj.utt_id}.ctm"
     )
 
-    return utt_obj
\ No newline at end of file
+    return utt_obj
+
+
+def make_ctm_items_from_arrays(utt_arrays, ctm_file_config, audio_file_duration=None):
+    """
+    In-memory counterpart of make_ctm_files for an UtteranceArrays: returns the entries the CTM files would
+    contain as {"tokens": [...], "words": [...], "segments": [...]}, each entry being a dict with "start",
+    "duration", "end" (seconds, rounded to ms) and "text". Nothing is written to disk. The entries of all
+    three levels come out of one pass over the rows, with the skip / minimum duration / blank filtering
+    done on whole columns at once.
+    """
+    ctm_items = {alignment_level: [] for alignment_level in ALIGNMENT_LEVELS}
+    if len(utt_arrays) == 0:
+        return ctm_items
+
+    start_times = utt_arrays.t_start.copy()
+    end_times = utt_arrays.t_end.copy()
+    # same rules as _iter_ctm_entries
+    keep = (start_times >= 0) & (end_times >= 0)
+
+    min_duration = ctm_file_config.minimum_timestamp_duration
+    if min_duration > 0:
+        if audio_file_duration is None:
+            raise ValueError("audio_file_duration is needed to apply minimum_timestamp_duration")
+        too_short = keep & (min_duration > end_times - start_times)
+        mid_points = (start_times[too_short] + end_times[too_short]) / 2
+        start_times[too_short] = np.maximum(mid_points - min_duration / 2, 0)
+        end_times[too_short] = np.minimum(mid_points + min_duration / 2, audio_file_duration)
+
+    if ctm_file_config.remove_blank_tokens:
+        keep &= np.array(utt_arrays.texts, dtype=object) != BLANK_TOKEN
+
+    rows = np.flatnonzero(keep)
+    level_items = [ctm_items[alignment_level] for alignment_level in ALIGNMENT_LEVELS]
+    texts = utt_arrays.texts
+    for row, level, start_time, end_time in zip(
+        rows.tolist(), utt_arrays.level[rows].tolist(), start_times[rows].tolist(), end_times[rows].tolist()
+    ):
+        level_items[level].append(
+            {
+                "start": round(start_time, 3),
+                "duration": round(end_time - start_time, 3),
+                "end": round(end_time, 3),
+                "text": texts[row],
+            }
+        )
+
+    return ctm_items
@@ -0,0 +1,104 @@
+# streaming_alignment.py
+import contextlib
+from typing import List, Optional
+
+import numpy as np
+import torch
+
+from .buffered_log_probs import BufferedLogProbs
+from .data_prep import (
+    LEVEL_WORD,
+    TokenizationCache,
+    Utterance,
+    add_t_start_end_to_utt_arrays,
+    clean_manifest_text,
+    get_utt_obj,
+    utt_obj_to_arrays,
+)
+from .viterbi_decoding import viterbi_decoding
+
+from nemo.utils import logging
+
+
+class StreamingAlignmentSession:
+    """
+    Forced alignment of one utterance whose audio is still arriving, against a transcript that grows
+    with it (e.g. the Whisper hypothesis of a live stream).
+
+    push() puts the new audio through the alignment model with BufferedLogProbs, so the encoder only ever
+    sees each chunk once, with its left context carried over from earlier calls and its right look-ahead.
+    align(text) then runs Viterbi for the given text over the log-probs of all audio so far (the chunks
+    still waiting for look-ahead are computed provisionally, see BufferedLogProbs.peek) and returns word
+    timings. Re-running Viterbi is cheap next to the model: utterances are at most a few hundred frames.
+
+    Every word of text is forced onto the audio, so the last word absorbs any audio spoken after it;
+    callers aligning a partial transcript should only trust words that are followed by another one.
+    Entries have the same {"start", "duration", "end", "text"} form as ForceAligner.to_ctm_items, with times
+    in seconds from the first sample pushed.
+    """
+
+    def __init__(
+        self,
+        model,
+        chunk_len_in_secs: float = 1.6,
+        total_buffer_in_secs: float = 4.0,
+        lock=None,
+        tokenization_cache: Optional[TokenizationCache] = None,
+    ):
+        self.model = model
+        self.buffered_log_probs = BufferedLogProbs(model, chunk_len_in_secs, total_buffer_in_secs, lock=lock)
+        self.model_stride_in_secs = self.buffered_log_probs.model_stride_in_secs
+        self.tokenization_cache = tokenization_cache
+        self._lock = lock if lock is not None else contextlib.nullcontext()
+        self._committed_log_probs = [torch.zeros((0, self.buffered_log_probs.n_classes))]
+
+    @property
+    def samples_received(self) -> int:
+        return self.buffered_log_probs.samples_received
+
+    def push(self, audio: np.ndarray):
+        """
+        Adds mono float32 samples at the model's sample rate.
+        """
+        log_probs = self.buffered_log_probs.push(audio)
+        if log_probs.shape[0]:
+            self._committed_log_probs.append(log_probs)
+
+    def align(self, text: str) -> List[dict]:
+        """
+        Word timings of text aligned to all audio pushed so far. Empty if there is no audio or text yet,
+        or if the text has more tokens than the audio has frames.
+        """
+        log_probs = torch.cat(self._committed_log_probs + [self.buffered_log_probs.peek()])
+        text = clean_manifest_text(text)
+        T = log_probs.shape[0]
+        if T == 0 or not text:
+            return []
+
+        # the tokenization cache is shared with the aligner's batch path, which takes the same lock
+        with self._lock:
+            utt = get_utt_obj(text, self.model, None, T, None, "stream", self.tokenization_cache, columnar=True)
+        if type(utt) is Utterance:
+            # char-based models, and text that does not fit the audio yet
+            utt = utt_obj_to_arrays(utt)
+        if len(utt) == 0:
+            return []
+
+        y = torch.tensor([utt.token_ids_with_blanks])
+        U = y.shape[1]
+        alignment = viterbi_decoding(log_probs.unsqueeze(0), y, torch.tensor([T]), torch.tensor([U]), "cpu")[0]
+        add_t_start_end_to_utt_arrays(utt, alignment, self.model_stride_in_secs)
+
+        words = []
+        for row in np.flatnonzero(utt.level == LEVEL_WORD).tolist():
+            start, end = float(utt.t_start[row]), float(utt.t_end[row])
+            words.append(
+                {
+                    "start": round(start, 3),
+                    "duration": round(end - start, 3),
+                    "end": round(end, 3),
+                    "text": utt.texts[row],
+                }
+            )
+        logging.debug(f"Streaming alignment of {len(words)} words over {T} frames")
+        return words
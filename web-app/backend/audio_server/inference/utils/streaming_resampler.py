@@ -0,0 +1,75 @@
+# streaming_resampler.py
+from math import gcd
+
+import numpy as np
+from scipy.signal import firwin, upfirdn
+
+
+class StreamingResampler:
+    """
+    Polyphase resampling of a stream that arrives in pieces of any size.
+
+    Uses the same anti-aliasing filter as scipy.signal.resample_poly, and the output of push() over all
+    pieces followed by flush() equals resample_poly of the whole stream. Resampling every piece on its own
+    would instead treat each piece's edges as silence, which adds clicks at message boundaries. The filter
+    needs a few input samples past each output sample, so push() holds the last output samples of a piece
+    back until the next one (around a millisecond of audio); flush() returns them at the end of the stream.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int):
+        divisor = gcd(orig_sr, target_sr)
+        self.up = target_sr // divisor
+        self.down = orig_sr // divisor
+        self.samples_received = 0
+        if self.up == self.down:
+            return
+
+        # as in resample_poly: the filter is zero-padded in front so that its delay is a whole number of
+        # output samples, and the outputs covering that delay are dropped
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        h = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * self.up
+        n_pre_pad = self.down - half_len % self.down
+        self.h = np.concatenate([np.zeros(n_pre_pad), h])
+        self._n_pre_remove = (half_len + n_pre_pad) // self.down
+
+        # input since sample _x_start of the stream (always a multiple of down, so that output sample m of
+        # the buffer is output sample _x_start * up / down + m of the stream)
+        self._x = np.zeros(0, dtype=np.float64)
+        self._x_start = 0
+        # next output sample of the stream to return, counting the dropped delay
+        self._next_out = self._n_pre_remove
+
+    def push(self, audio: np.ndarray) -> np.ndarray:
+        if self.up == self.down:
+            self.samples_received += len(audio)
+            return audio.astype(np.float32)
+        self._x = np.concatenate([self._x, audio])
+        self.samples_received += len(audio)
+        # output m only depends on input up to (m * down) / up
+        return self._emit((len(self._x) * self.up - 1) // self.down)
+
+    def flush(self) -> np.ndarray:
+        """The outputs held back for want of later input; the stream is taken to end here."""
+        if self.up == self.down:
+            return np.zeros(0, dtype=np.float32)
+        n_out = -(-self.samples_received * self.up // self.down) + self._n_pre_remove
+        last = n_out - 1 - self._x_start * self.up // self.down
+        # zeros after the end, as resample_poly pads them
+        self._x = np.concatenate([self._x, np.zeros(len(self.h) // self.up + 1)])
+        return self._emit(last)
+
+    def _emit(self, last: int) -> np.ndarray:
+        """Output samples from _next_out to buffer output sample last, then drops the input no longer needed."""
+        first = self._next_out - self._x_start * self.up // self.down
+        if last < first:
+            return np.zeros(0, dtype=np.float32)
+        y = upfirdn(self.h, self._x, self.up, self.down)[first : last + 1]
+        self._next_out += len(y)
+
+        # earliest input the next output needs, rounded down to a multiple of down
+        needed = (self._next_out * self.down - len(self.h) + 1) // self.up
+        keep_from = max(needed // self.down * self.down, self._x_start)
+        self._x = self._x[keep_from - self._x_start :]
+        self._x_start = keep_from
+        return y.astype(np.float32)
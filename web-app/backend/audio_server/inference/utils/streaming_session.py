@@ -0,0 +1,302 @@
+# streaming_session.py
+import asyncio
+import logging
+import re
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from inference.utils.vad import VAD_SAMPLE_RATE, StreamingVAD
+
+logger = logging.getLogger(__name__)
+
+
+class LocalAgreement:
+    """
+    LocalAgreement-n commit policy for hypotheses re-decoded from a growing audio buffer.
+
+    Each update() takes the latest full hypothesis of the buffer. A word is committed once the last `n`
+    hypotheses agree on it and on every word before it (compared case- and punctuation-insensitively);
+    committed words are never taken back. Returns the newly committed words - the delta to send - and the
+    still tentative tail of the latest hypothesis.
+    """
+
+    def __init__(self, n: int = 2):
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        self.n = n
+        self.committed: List[str] = []
+        self._history = deque(maxlen=n)
+
+    def update(self, text: str) -> Tuple[List[str], List[str]]:
+        words = text.split()
+        self._history.append([self._normalize(word) for word in words])
+        new_words = []
+        if len(self._history) == self.n:
+            agreed = self._common_prefix_length()
+            if agreed > len(self.committed):
+                new_words = words[len(self.committed) : agreed]
+                self.committed.extend(new_words)
+        return new_words, words[len(self.committed) :]
+
+    def _common_prefix_length(self) -> int:
+        length = 0
+        for tokens in zip(*self._history):
+            if any(token != tokens[0] for token in tokens[1:]):
+                break
+            length += 1
+        return length
+
+    @staticmethod
+    def _normalize(word: str) -> str:
+        return re.sub(r"[^\w']", "", word.lower())
+
+
+class StreamingTranscriptionSession:
+    """
+    Live transcription of one continuous audio stream, segmented on the server.
+
+    Audio is pushed as it arrives (mono float32 at 16 kHz). StreamingVAD cuts it into utterances at silence;
+    while an utterance is in progress its audio so far is re-transcribed every `partial_interval_sec` with
+    `transcribe_partial`, and once it ends the whole utterance (plus `speech_pad_ms` either side) goes
+    through `transcribe_final`. Consecutive partial hypotheses of an utterance go through LocalAgreement, so
+    a partial event carries only the words committed since the previous one plus the tentative tail.
+    Transcription runs in background tasks so ingest never waits on the model; at most one partial is in
+    flight, and finals are emitted in utterance order.
+
+    Events are put on `events` as plain dicts, times in seconds from the start of the stream:
+        {"type": "speech_start", "utterance": n, "start": ...}
+        {"type": "partial", "utterance": n, "start": ..., "end": ..., "text": newly committed words, "tentative": ...,
+         "words": timings of newly committed words}
+        {"type": "final", "utterance": n, "start": ..., "end": ..., "transcription": ...}
+        {"type": "discard", "utterance": n} when the utterance turned out too short to be speech
+        {"type": "error", "utterance": n, "error": ...} when its final transcription failed
+        {"type": "end"} once finish() has drained everything
+    A partial that completes after its utterance has ended is dropped, as is one that changes nothing; the
+    final supersedes whatever was committed for its utterance.
+
+    With `make_aligner` (returning a StreamingAlignmentSession per utterance), partials also carry word
+    timings: the utterance's audio is fed to the aligner as partials are made, the hypothesis is aligned
+    to it, and each committed word is timed once a later word follows it, so its end is not stretched
+    over audio that belongs to the next one. Timings, like the words, are sent once and never revised.
+    """
+
+    def __init__(
+        self,
+        vad: StreamingVAD,
+        transcribe_final: Callable[[np.ndarray], Awaitable],
+        transcribe_partial: Callable[[np.ndarray], Awaitable[str]],
+        speech_pad_ms: int = 200,
+        partial_interval_sec: float = 0.4,
+        agreement_n: int = 2,
+        make_aligner: Optional[Callable[[], Any]] = None,
+    ):
+        self.vad = vad
+        self.transcribe_final = transcribe_final
+        self.transcribe_partial = transcribe_partial
+        self.pad_samples = int(speech_pad_ms * VAD_SAMPLE_RATE / 1000)
+        self.partial_interval_samples = int(partial_interval_sec * VAD_SAMPLE_RATE)
+        self.agreement_n = agreement_n
+        self.make_aligner = make_aligner
+        self.events: asyncio.Queue = asyncio.Queue()
+
+        # _audio[0] is absolute sample _audio_start; only the utterance in progress (or the pre-roll
+        # padding of the next one) is kept
+        self._audio = np.zeros(0, dtype=np.float32)
+        self._audio_start = 0
+        # (index, first sample) of the utterance in progress
+        self._utterance: Optional[Tuple[int, int]] = None
+        self._n_utterances = 0
+        self._last_partial_at = 0
+        self._agreement = LocalAgreement(agreement_n)
+        self._tentative: List[str] = []
+        # alignment of the utterance in progress, and how many of its committed words were timed
+        self._aligner = None
+        self._timed_words = 0
+        self._partial_task: Optional[asyncio.Task] = None
+        self._last_final: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    @property
+    def samples_received(self) -> int:
+        return self._audio_start + len(self._audio)
+
+    async def push(self, audio: np.ndarray):
+        """
+        Adds mono float32 samples at 16 kHz.
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        self._audio = np.concatenate([self._audio, audio])
+        # the VAD model runs a window at a time; keep that off the event loop
+        self._handle_vad_events(await asyncio.to_thread(self.vad.push, audio))
+        self._maybe_start_partial()
+        self._trim()
+
+    async def finish(self):
+        """
+        Ends the stream: closes the utterance in progress, waits for every pending transcription and
+        puts the "end" event.
+        """
+        self._handle_vad_events(self.vad.flush())
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        self.events.put_nowait({"type": "end"})
+
+    def close(self):
+        """
+        Cancels pending transcriptions, e.g. when the client went away.
+        """
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _handle_vad_events(self, vad_events: List[Tuple[str, int]]):
+        for kind, sample in vad_events:
+            if kind == "start":
+                start = max(sample - self.pad_samples, self._audio_start)
+                self._utterance = (self._n_utterances, start)
+                self._n_utterances += 1
+                self._last_partial_at = sample
+                self._agreement = LocalAgreement(self.agreement_n)
+                self._tentative = []
+                self._aligner = self.make_aligner() if self.make_aligner is not None else None
+                self._timed_words = 0
+                self.events.put_nowait({
+                    "type": "speech_start",
+                    "utterance": self._utterance[0],
+                    "start": self._to_sec(start),
+                })
+            elif kind == "end":
+                index, start = self._utterance
+                self._utterance = None
+                self._aligner = None
+                end = min(sample + self.pad_samples, self.samples_received)
+                self._last_final = self._spawn(
+                    self._run_final(index, start, end, self._slice(start, end), self._last_final)
+                )
+            else:
+                # too short to be speech; clients drop what they showed for it
+                self.events.put_nowait({"type": "discard", "utterance": self._utterance[0]})
+                self._utterance = None
+                self._aligner = None
+
+    def _maybe_start_partial(self):
+        if self._utterance is None or self._partial_task is not None:
+            return
+        if self.samples_received - self._last_partial_at < self.partial_interval_samples:
+            return
+        self._last_partial_at = self.samples_received
+        index, start = self._utterance
+        end = self.samples_received
+        self._partial_task = self._spawn(self._run_partial(index, start, end, self._slice(start, end)))
+
+    async def _run_partial(self, index: int, start: int, end: int, audio: np.ndarray):
+        aligner = self._aligner
+        try:
+            try:
+                text = await self.transcribe_partial(audio)
+            except Exception as e:
+                logger.error(f"Partial transcription of utterance {index} failed: {str(e)}")
+                return
+            if self._utterance is None or self._utterance[0] != index:
+                return
+            new_words, tentative = self._agreement.update(text)
+            words = []
+            if aligner is not None:
+                try:
+                    words = await self._time_committed_words(aligner, start, audio, tentative)
+                except Exception as e:
+                    logger.error(f"Partial alignment of utterance {index} failed: {str(e)}")
+        finally:
+            # the aligner is fed one partial at a time, so the next partial waits for the alignment too
+            self._partial_task = None
+        if self._utterance is None or self._utterance[0] != index:
+            return
+        if not new_words and tentative == self._tentative and not words:
+            return
+        self._tentative = tentative
+        self.events.put_nowait({
+            "type": "partial",
+            "utterance": index,
+            "start": self._to_sec(start),
+            "end": self._to_sec(end),
+            "text": " ".join(new_words),
+            "tentative": " ".join(tentative),
+            "words": words,
+        })
+
+    async def _time_committed_words(self, aligner, start: int, audio: np.ndarray, tentative: List[str]) -> List[dict]:
+        """
+        Feeds the audio the aligner has not seen yet, aligns the current hypothesis and returns timings (in
+        seconds from the start of the stream) for the committed words not timed yet that are followed by
+        another word.
+        """
+        committed = list(self._agreement.committed)
+        hypothesis = committed + tentative
+        timed_until = len(committed) if tentative else len(committed) - 1
+        if timed_until <= self._timed_words:
+            return []
+
+        new_audio = audio[aligner.samples_received :]
+
+        def align():
+            aligner.push(new_audio)
+            return aligner.align(" ".join(hypothesis))
+
+        aligned = await asyncio.to_thread(align)
+        if aligner is not self._aligner:
+            # the utterance ended while aligning; _timed_words now belongs to the next one
+            return []
+        if len(aligned) != len(hypothesis):
+            # the hypothesis does not fit the audio yet
+            return []
+        offset = start / VAD_SAMPLE_RATE
+        words = [
+            {
+                "start": round(word["start"] + offset, 3),
+                "duration": word["duration"],
+                "end": round(word["end"] + offset, 3),
+                "text": committed[i],
+            }
+            for i, word in enumerate(aligned[self._timed_words : timed_until], self._timed_words)
+        ]
+        self._timed_words = timed_until
+        return words
+
+    async def _run_final(self, index: int, start: int, end: int, audio: np.ndarray, previous: Optional[asyncio.Task]):
+        try:
+            transcription = await self.transcribe_final(audio)
+            event = {
+                "type": "final",
+                "utterance": index,
+                "start": self._to_sec(start),
+                "end": self._to_sec(end),
+                "transcription": transcription,
+            }
+        except Exception as e:
+            logger.error(f"Final transcription of utterance {index} failed: {str(e)}")
+            event = {"type": "error", "utterance": index, "error": str(e)}
+        # keep finals in utterance order even when a later one finishes first
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        self.events.put_nowait(event)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _slice(self, start: int, end: int) -> np.ndarray:
+        return self._audio[start - self._audio_start : end - self._audio_start].copy()
+
+    def _trim(self):
+        if self._utterance is not None:
+            keep_from = self._utterance[1]
+        else:
+            keep_from = max(self._audio_start, self.samples_received - self.pad_samples)
+        self._audio = self._audio[keep_from - self._audio_start :]
+        self._audio_start = keep_from
+
+    def _to_sec(self, sample: int) -> float:
+        return round(sample / VAD_SAMPLE_RATE, 3)
@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionCache:
+    """
+    Content-addressed cache of aligned transcriptions (text, words, tokens, segments).
+
+    Keys are a hash of the normalized PCM that would go to the model plus the model name and the
+    decoding parameters, so resent or replayed audio is answered without running Whisper or alignment.
+    Results are kept as JSON in an LRU with a TTL, bounded by both entry count and total size; every get
+    returns a fresh copy. With `persist_dir` set, entries are also written there (one file per key) and a
+    memory miss falls back to the directory, so the cache survives restarts. The directory is pruned every
+    `PRUNE_EVERY` writes: expired files go, then the oldest ones until it holds at most `max_disk_bytes`.
+
+    get_or_compute() also folds identical requests that arrive while the first is still being transcribed
+    into that one computation.
+
+    The memory LRU is only touched from the event loop; worker threads do the file I/O and hand the
+    results back.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_sec: float = 3600.0,
+        persist_dir: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self.persist_dir = persist_dir
+        self.max_disk_bytes = max_disk_bytes
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+        # the first write prunes whatever an earlier run left behind
+        self._writes_since_prune = self.PRUNE_EVERY
+        self._pruning = False
+
+        # key -> (expires_at, serialized result), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._in_flight = {}
+
+        # counters reported by stats()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def make_key(audio: np.ndarray, sample_rate: int, **params) -> str:
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        digest.update(json.dumps({"sample_rate": sample_rate, **params}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        Returns the cached result for key, or awaits compute() (once, however many callers ask for the
+        same key meanwhile) and caches what it returns.
+        """
+        result = self.get(key)
+        if result is None and self.persist_dir:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None:
+                expires_at, serialized = entry
+                self._store(key, serialized, expires_at)
+                self.disk_hits += 1
+                result = json.loads(serialized)
+        if result is not None:
+            return result
+
+        if key in self._in_flight:
+            self.coalesced += 1
+            return json.loads(await asyncio.shield(self._in_flight[key]))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await compute()
+            serialized = json.dumps(result)
+            future.set_result(serialized)
+        except BaseException as e:
+            future.set_exception(e)
+            # nobody else may be waiting; do not leave "exception was never retrieved" behind
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        self._store(key, serialized)
+        if self.persist_dir:
+            await asyncio.to_thread(self._write_disk, key, serialized)
+            await self._maybe_prune_disk()
+        return result
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Memory lookup only; returns None on a miss or an expired entry.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, serialized = entry
+        if expires_at < time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return json.loads(serialized)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            "in_flight": len(self._in_flight),
+        }
+
+    def _store(self, key: str, serialized: str, expires_at: Optional[float] = None):
+        if len(serialized) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at if expires_at is not None else time.time() + self.ttl_sec, serialized)
+        self._bytes += len(serialized)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, serialized = self._entries.pop(key)
+        self._bytes -= len(serialized)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.persist_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, str]]:
+        """(expires_at, serialized result) of the file for key, or None if it is missing or expired."""
+        path = self._disk_path(key)
+        try:
+            expires_at = os.path.getmtime(path) + self.ttl_sec
+            if expires_at < time.time():
+                os.remove(path)
+                return None
+            with open(path) as f:
+                serialized = f.read()
+        except OSError:
+            return None
+        return expires_at, serialized
+
+    def _write_disk(self, key: str, serialized: str):
+        # write then rename, so a crash never leaves a truncated entry behind
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(serialized)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist transcription cache entry {key}: {str(e)}")
+
+    async def _maybe_prune_disk(self):
+        self._writes_since_prune += 1
+        if self._writes_since_prune < self.PRUNE_EVERY or self._pruning:
+            return
+        self._writes_since_prune = 0
+        self._pruning = True
+        try:
+            self.disk_evictions += await asyncio.to_thread(self._prune_disk)
+        finally:
+            self._pruning = False
+
+    def _prune_disk(self) -> int:
+        """Removes expired files, then the oldest ones until the directory fits max_disk_bytes."""
+        files = []
+        try:
+            with os.scandir(self.persist_dir) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logger.warning(f"Could not prune transcription cache directory: {str(e)}")
+            return 0
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - self.ttl_sec
+        removed = 0
+        for mtime, size, path in files:
+            if mtime >= cutoff and total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,114 @@
+# vad.py
+import copy
+from typing import List, Tuple
+
+import numpy as np
+import torch
+
+VAD_SAMPLE_RATE = 16000
+# Silero VAD scores 32 ms windows at 16 kHz
+VAD_WINDOW_SAMPLES = 512
+
+
+def load_silero_vad():
+    """
+    Loads the Silero VAD model the same way train_model/scripts/preprocess.py does.
+    """
+    model, _ = torch.hub.load(repo_or_dir='snakers4/silero-vad', model='silero_vad', trust_repo=True)
+    model.eval()
+    return model
+
+
+class StreamingVAD:
+    """
+    Speech / silence endpointing for one live audio stream.
+
+    Every 32 ms window is scored by the Silero model as it arrives; the model is recurrent, so each stream
+    gets its own copy and the state is carried from one window to the next. An utterance starts on the first
+    window at or above `threshold` and ends once the probability has stayed below `threshold - 0.15` for
+    `min_silence_ms` (the same hysteresis as Silero's get_speech_timestamps). Utterances are cut at
+    `max_utterance_sec` so the transcriber never gets more than one Whisper window, and ones shorter than
+    `min_speech_ms` are reported as discarded.
+
+    push() returns (event, sample) pairs, with sample counted from the start of the stream:
+        ("start", first sample of speech)
+        ("end", first sample after the utterance)
+        ("discard", first sample of an utterance that was too short)
+    """
+
+    def __init__(
+        self,
+        model,
+        threshold: float = 0.5,
+        min_silence_ms: int = 600,
+        min_speech_ms: int = 250,
+        max_utterance_sec: float = 30.0,
+    ):
+        self.model = copy.deepcopy(model)
+        self.model.reset_states()
+        self.threshold = threshold
+        self.neg_threshold = max(threshold - 0.15, 0.01)
+        self.min_silence_samples = int(min_silence_ms * VAD_SAMPLE_RATE / 1000)
+        self.min_speech_samples = int(min_speech_ms * VAD_SAMPLE_RATE / 1000)
+        self.max_utterance_samples = int(max_utterance_sec * VAD_SAMPLE_RATE)
+
+        # samples that do not fill a window yet; _pending[0] is absolute sample _position
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._position = 0
+        self.in_speech = False
+        self._speech_start = None
+        self._silence_start = None
+
+    def push(self, audio: np.ndarray) -> List[Tuple[str, int]]:
+        """
+        Adds mono float32 samples at 16 kHz and returns the endpointing events they triggered.
+        """
+        audio = np.concatenate([self._pending, np.asarray(audio, dtype=np.float32)])
+        n_windows = len(audio) // VAD_WINDOW_SAMPLES
+        events = []
+        with torch.no_grad():
+            for i in range(n_windows):
+                window = audio[i * VAD_WINDOW_SAMPLES : (i + 1) * VAD_WINDOW_SAMPLES]
+                speech_prob = self.model(torch.from_numpy(window), VAD_SAMPLE_RATE).item()
+                events.extend(self._update(speech_prob, self._position + i * VAD_WINDOW_SAMPLES))
+        self._pending = audio[n_windows * VAD_WINDOW_SAMPLES :]
+        self._position += n_windows * VAD_WINDOW_SAMPLES
+        return events
+
+    def flush(self) -> List[Tuple[str, int]]:
+        """
+        Ends the stream: closes the utterance in progress, if any, at the last sample received.
+        """
+        if not self.in_speech:
+            return []
+        return self._end(self._position + len(self._pending))
+
+    def _update(self, speech_prob: float, window_start: int) -> List[Tuple[str, int]]:
+        window_end = window_start + VAD_WINDOW_SAMPLES
+        if not self.in_speech:
+            if speech_prob >= self.threshold:
+                self.in_speech = True
+                self._speech_start = window_start
+                self._silence_start = None
+                return [("start", window_start)]
+            return []
+
+        if speech_prob >= self.threshold:
+            self._silence_start = None
+        elif speech_prob < self.neg_threshold and self._silence_start is None:
+            self._silence_start = window_start
+
+        if self._silence_start is not None and window_end - self._silence_start >= self.min_silence_samples:
+            return self._end(self._silence_start)
+        if window_end - self._speech_start >= self.max_utterance_samples:
+            return self._end(window_end)
+        return []
+
+    def _end(self, end_sample: int) -> List[Tuple[str, int]]:
+        start = self._speech_start
+        self.in_speech = False
+        self._speech_start = None
+        self._silence_start = None
+        if end_sample - start < self.min_speech_samples:
+            return [("discard", start)]
+        return [("end", end_sample)]
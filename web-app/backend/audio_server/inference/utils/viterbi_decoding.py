@@ -12,11 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import numpy as np
 import torch
 from .constants import V_NEGATIVE_NUM
 
+from nemo.utils import logging
 
-def viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, viterbi_device):
+
+def viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, viterbi_device, band_width=None):
     """
     Do Viterbi decoding with an efficient algorithm (the only for-loop in the 'forward pass' is over the time dimension). 
     Args:
@@ -30,6 +33,10 @@ def viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, viterbi_device)
         U_batch: tensor of shape (B, 1) - contains the lengths of y_batch (so we can ignore the parts of y_batch
             which are padding).
         viterbi_device: the torch device on which Viterbi decoding will be done.
+        band_width: if set, only token positions within band_width of the expected diagonal
+            (u = t * U / T) are considered at each timestep - see _banded_viterbi_decoding. This is an
+            approximation: the alignment returned is the best one inside the band, which need not be
+            the best one overall.
 
     Returns:
         alignments_batch: list of lists containing locations for the tokens we align to at each timestep.
@@ -40,6 +47,14 @@ def viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, viterbi_device)
     B, T_max, _ = log_probs_batch.shape
     U_max = y_batch.shape[1]
 
+    # no audio, nothing to align (every utterance gets an empty alignment)
+    if T_max == 0:
+        return [[] for _ in range(B)]
+
+    # a band at least as wide as the longest reference is just full decoding
+    if band_width is not None and 2 * band_width + 1 < U_max:
+        return _banded_viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, viterbi_device, band_width)
+
     # transfer all tensors to viterbi_device
     log_probs_batch = log_probs_batch.to(viterbi_device)
     y_batch = y_batch.to(viterbi_device)
@@ -117,20 +132,192 @@ def viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, viterbi_device)
         backpointers_rel[:, t, :] = bp_relative
 
     # trace backpointers
-    alignments_batch = []
+    # one host transfer of the backpointers and final viterbi probabilities, then the trace is done
+    # for all utterances at once, filling a preallocated array from the last timestep backwards
+    return _trace_backpointers(backpointers_rel.cpu().numpy(), v_prev.cpu().numpy(), T_batch.cpu(), U_batch.cpu())
+
+
+def _trace_backpointers(backpointers_rel, v_final, T_batch, U_batch, band_starts=None):
+    """
+    Follows the relative backpointers from the best final token position back to t=0.
+    Args:
+        backpointers_rel: numpy array of shape (B, T_max, U_max) with values 0, 1 or 2 - how many token
+            positions back the best path to (t, u) came from at t - 1. For banded decoding the last
+            dimension only covers the band, and band_starts must be given.
+        v_final: numpy array of shape (B, U_max) - viterbi probabilities at the final timestep.
+        T_batch, U_batch: durations / lengths of every utterance in the batch.
+        band_starts: optional numpy array of shape (B, T_max) - the token position that index 0 of the
+            last dimension of backpointers_rel refers to at every timestep.
+
+    Returns:
+        alignments_batch: list of lists in the same format as viterbi_decoding returns.
+    """
+    B, T_max, _ = backpointers_rel.shape
+    batch_idx = np.arange(B)
+
+    # an utterance ends in either its final token or the blank after it
+    current_u = np.zeros(B, dtype=np.int64)
     for b in range(B):
-        T_b = int(T_batch[b])
         U_b = int(U_batch[b])
+        if U_b > 1:  # if U_b == 1 we put only a blank token in the reference text because the reference text is empty
+            current_u[b] = int(np.argmax(v_final[b, U_b - 2 : U_b])) + U_b - 2
+
+    alignments = np.empty((B, T_max), dtype=np.int64)
+    alignments[:, T_max - 1] = current_u
+    for t in range(T_max - 1, 0, -1):
+        u_index = current_u if band_starts is None else current_u - band_starts[:, t]
+        current_u = current_u - backpointers_rel[batch_idx, t, u_index]
+        alignments[:, t - 1] = current_u
+
+    return [alignments[b, : int(T_batch[b])].tolist() for b in range(B)]
+
+
+def _get_band_starts(T_batch, U_batch, T_max, band_size):
+    """
+    Returns a (B, T_max) tensor with the first token position of the band at every timestep.
+    The band is centred on the diagonal u = t * U / T and kept inside [0, U - 1]; from T onwards
+    (padding timesteps) it sits on the final token positions.
+    """
+    t = torch.arange(T_max, device=T_batch.device).unsqueeze(0)
+    centre = torch.minimum(t * U_batch.unsqueeze(1) // T_batch.unsqueeze(1), U_batch.unsqueeze(1) - 1)
+    band_starts = (centre - band_size // 2).clamp(min=0)
+    return torch.minimum(band_starts, (U_batch.unsqueeze(1) - band_size).clamp(min=0))
+
+
+def _banded_viterbi_decoding(log_probs_batch, y_batch, T_batch, U_batch, viterbi_device, band_width):
+    """
+    Viterbi decoding restricted to a band of 2 * band_width + 1 token positions around the diagonal.
+    Same recursion as viterbi_decoding (stay, move one position, or skip a blank), but v_prev and the
+    backpointers only hold the band, so memory is O(T * band) instead of O(T * U) and every timestep
+    costs O(band) rather than O(U).
+
+    The band is an assumption about the speaking rate, so the result is the best path inside the band,
+    not necessarily the best path overall: a better path may lie outside the band without the banded
+    path ever touching its edge, and telling would take the full trellis the band is there to avoid.
+    Gross violations are caught heuristically: an utterance whose banded path cannot reach the end, or
+    runs along an edge of the band that was not clamped to [0, U - 1], is decoded again with full Viterbi.
+    Use a band wide enough for the speaking rate of the audio, or full decoding where exactness matters.
+    """
+    B, T_max, _ = log_probs_batch.shape
+    band_size = 2 * band_width + 1
+
+    log_probs_batch = log_probs_batch.to(viterbi_device)
+    y_batch = y_batch.to(viterbi_device)
+    T_batch = T_batch.to(viterbi_device)
+    U_batch = U_batch.to(viterbi_device)
 
-        if U_b == 1:  # i.e. we put only a blank token in the reference text because the reference text is empty
-            current_u = 0  # set initial u to 0 and let the rest of the code block run as usual
+    padding_for_log_probs = V_NEGATIVE_NUM * torch.ones((B, T_max, 1), device=viterbi_device)
+    log_probs_padded = torch.cat((log_probs_batch, padding_for_log_probs), dim=2)
+
+    # same letter_repetition_mask as in viterbi_decoding, indexed by absolute token position
+    y_shifted_left = torch.roll(y_batch, shifts=2, dims=1)
+    letter_repetition_mask = y_batch - y_shifted_left
+    letter_repetition_mask[:, :2] = 1
+    letter_repetition_mask = letter_repetition_mask == 0
+
+    band_starts = _get_band_starts(T_batch, U_batch, T_max, band_size)
+    band_offsets = torch.arange(band_size, device=viterbi_device)
+    # absolute token position of every band slot at every timestep, shape (B, T_max, band_size)
+    u_abs = band_starts.unsqueeze(2) + band_offsets
+
+    # everything that does not depend on v_prev is gathered for all timesteps up front; these are
+    # all (B, T_max, band_size), i.e. linear in T
+    y_band = torch.gather(y_batch.unsqueeze(1).expand(B, T_max, -1), 2, u_abs)
+    e_band = torch.gather(log_probs_padded, 2, y_band)
+    # same masking as e_current in viterbi_decoding, for timesteps beyond the duration of the audio
+    t_exceeded_T_batch = torch.arange(T_max, device=viterbi_device).unsqueeze(0) >= T_batch.unsqueeze(1)
+    U_can_be_final = torch.logical_or(
+        u_abs == U_batch.view(B, 1, 1), u_abs == (U_batch.view(B, 1, 1) - 1)
+    )
+    e_band = e_band.masked_fill(torch.logical_and(t_exceeded_T_batch.unsqueeze(2), U_can_be_final), 0)
+
+    # how far the band moved since the previous timestep, and for each of the 3 possible moves
+    # (stay, 1 back, 2 back) which band slots have no valid predecessor
+    band_shift = torch.zeros_like(band_starts)
+    band_shift[:, 1:] = band_starts[:, 1:] - band_starts[:, :-1]
+    n_back = torch.arange(3, device=viterbi_device).view(3, 1, 1, 1)
+    prev_index = band_offsets + band_shift.unsqueeze(2) - n_back  # (3, B, T_max, band_size)
+    invalid_move = (prev_index < 0) | (prev_index >= band_size) | (u_abs - n_back < 0)
+    invalid_move[2] |= torch.gather(letter_repetition_mask.unsqueeze(1).expand(B, T_max, -1), 2, u_abs)
+    del prev_index
+    move_base = (band_offsets - n_back.view(3, 1, 1)).expand(3, B, band_size)
+
+    # v_prev[:, i] is the viterbi probability of token position band_starts[:, t - 1] + i
+    # band_starts[:, 0] is always 0, so this matches the initialisation in viterbi_decoding
+    v_prev = V_NEGATIVE_NUM * torch.ones((B, band_size), device=viterbi_device)
+    v_prev[:, :2] = torch.gather(input=log_probs_padded[:, 0, :], dim=1, index=y_batch[:, :2])
+
+    backpointers_rel = -99 * torch.ones((B, T_max, band_size), dtype=torch.int8, device=viterbi_device)
+
+    for t in range(1, T_max):
+        prev_index_t = (move_base + band_shift[:, t].view(1, B, 1)).clamp(0, band_size - 1)
+        candidates = torch.gather(v_prev.unsqueeze(0).expand(3, -1, -1), 2, prev_index_t)
+        candidates = candidates.masked_fill(invalid_move[:, :, t], V_NEGATIVE_NUM)
+        v_prev, bp_relative = torch.max(candidates + e_band[:, t].unsqueeze(0), dim=0)
+
+        backpointers_rel[:, t, :] = bp_relative
+
+    # put the final band back at its absolute positions for the trace
+    U_max = y_batch.shape[1]
+    v_final = V_NEGATIVE_NUM * torch.ones((B, U_max), device=viterbi_device)
+    v_final.scatter_(1, u_abs[:, T_max - 1, :], v_prev)
+
+    band_starts_np = band_starts.cpu().numpy()
+    v_final_np = v_final.cpu().numpy()
+    T_cpu = T_batch.cpu()
+    U_cpu = U_batch.cpu()
+
+    # an utterance whose final tokens fall outside the band has no banded path to trace: every
+    # backpointer along the way is a tie and the trace would leave the band
+    needs_full_decoding = []
+    reachable = []
+    for b in range(B):
+        U_b = int(U_cpu[b])
+        final_score = v_final_np[b, max(U_b - 2, 0) : U_b].max()
+        if final_score > V_NEGATIVE_NUM / 2:
+            reachable.append(b)
         else:
-            current_u = int(torch.argmax(v_prev[b, U_b - 2 : U_b])) + U_b - 2
-        alignment_b = [current_u]
-        for t in range(T_max - 1, 0, -1):
-            current_u = current_u - int(backpointers_rel[b, t, current_u])
-            alignment_b.insert(0, current_u)
-        alignment_b = alignment_b[:T_b]
-        alignments_batch.append(alignment_b)
-
-    return alignments_batch
\ No newline at end of file
+            needs_full_decoding.append(b)
+
+    alignments_batch = [None] * B
+    if reachable:
+        traced = _trace_backpointers(
+            backpointers_rel.cpu().numpy()[reachable],
+            v_final_np[reachable],
+            T_cpu[reachable],
+            U_cpu[reachable],
+            band_starts=band_starts_np[reachable],
+        )
+        for b, alignment_b in zip(reachable, traced):
+            alignments_batch[b] = alignment_b
+
+    for b in reachable:
+        T_b = int(T_cpu[b])
+        U_b = int(U_cpu[b])
+        alignment_np = np.asarray(alignments_batch[b])
+        band_starts_b = band_starts_np[b, :T_b]
+        index_in_band = alignment_np - band_starts_b
+        on_lower_edge = (index_in_band == 0) & (band_starts_b > 0)
+        on_upper_edge = (index_in_band == band_size - 1) & (band_starts_b + band_size - 1 < U_b - 1)
+        if on_lower_edge.any() or on_upper_edge.any():
+            needs_full_decoding.append(b)
+
+    if needs_full_decoding:
+        logging.info(
+            f"Banded Viterbi (band_width={band_width}) was too narrow for {len(needs_full_decoding)} of {B}"
+            " utterances - decoding them again without the band"
+        )
+        needs_full_decoding.sort()
+        idx = torch.tensor(needs_full_decoding)
+        U_subset = U_cpu[idx]
+        full_alignments = viterbi_decoding(
+            log_probs_batch.cpu()[idx, : int(T_cpu[idx].max()), :],
+            y_batch.cpu()[idx, : int(U_subset.max())],
+            T_cpu[idx],
+            U_subset,
+            viterbi_device,
+        )
+        for b, alignment_b in zip(needs_full_decoding, full_alignments):
+            alignments_batch[b] = alignment_b
+
+    return alignments_batch
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import io
@@ -6,12 +7,11 @@ import torch
 import soundfile as sf
 import librosa
 from scipy.signal import resample_poly
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import base64
 from typing import Dict, Any, Optional, List
-from tempfile import NamedTemporaryFile
 from contextlib import asynccontextmanager
 
 from pydub import AudioSegment
@@ -24,22 +24,88 @@ os.environ["NEMO_CACHE_DIR"] = "/usr/src/app/models"
 # MODEL_NAME = 'aether-raid/WS-nrSG-HLBT'
 MODEL_NAME = 'jlvdoorn/whisper-medium.en-atco2-asr'
 
+# Cross-request batching of Whisper generate calls
+WHISPER_MAX_BATCH_SIZE = int(os.environ.get('WHISPER_MAX_BATCH_SIZE', '8'))
+WHISPER_MAX_WAIT_MS = float(os.environ.get('WHISPER_MAX_WAIT_MS', '25'))
+# Cross-request batching of forced alignment
+ALIGN_MAX_BATCH_SIZE = int(os.environ.get('ALIGN_MAX_BATCH_SIZE', '16'))
+ALIGN_MAX_WAIT_MS = float(os.environ.get('ALIGN_MAX_WAIT_MS', '25'))
+# Banded Viterbi for long alignments (approximate: best path within the band); unset/0 decodes the full trellis
+VITERBI_BAND_WIDTH = int(os.environ.get('VITERBI_BAND_WIDTH', '0')) or None
+# Clips are padded with silence to at least this length (Whisper pads its own 30 s window)
+MIN_AUDIO_SECONDS = 1.0
+# Content-addressed cache of aligned transcriptions; no TRANSCRIPTION_CACHE_DIR keeps it in memory only
+TRANSCRIPTION_CACHE_MAX_ENTRIES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_ENTRIES', '1024'))
+TRANSCRIPTION_CACHE_MAX_MB = float(os.environ.get('TRANSCRIPTION_CACHE_MAX_MB', '64'))
+TRANSCRIPTION_CACHE_TTL_SEC = float(os.environ.get('TRANSCRIPTION_CACHE_TTL_SEC', '3600'))
+TRANSCRIPTION_CACHE_DIR = os.environ.get('TRANSCRIPTION_CACHE_DIR') or None
+# Size bound of TRANSCRIPTION_CACHE_DIR; expired and then the oldest files are pruned as it fills
+TRANSCRIPTION_CACHE_MAX_DISK_MB = float(os.environ.get('TRANSCRIPTION_CACHE_MAX_DISK_MB', '512'))
+# Server-side VAD segmentation of /ws/stream
+STREAM_VAD_THRESHOLD = float(os.environ.get('STREAM_VAD_THRESHOLD', '0.5'))
+STREAM_MIN_SILENCE_MS = int(os.environ.get('STREAM_MIN_SILENCE_MS', '600'))
+STREAM_MIN_SPEECH_MS = int(os.environ.get('STREAM_MIN_SPEECH_MS', '250'))
+STREAM_SPEECH_PAD_MS = int(os.environ.get('STREAM_SPEECH_PAD_MS', '200'))
+STREAM_MAX_UTTERANCE_SEC = float(os.environ.get('STREAM_MAX_UTTERANCE_SEC', '30'))
+STREAM_PARTIAL_INTERVAL_SEC = float(os.environ.get('STREAM_PARTIAL_INTERVAL_SEC', '0.4'))
+# Consecutive partial hypotheses that must agree before words are committed
+STREAM_AGREEMENT_N = int(os.environ.get('STREAM_AGREEMENT_N', '2'))
+# Word timings on partials from streaming forced alignment of the committed words (0 turns it off)
+STREAM_WORD_TIMINGS = os.environ.get('STREAM_WORD_TIMINGS', '1') != '0'
+
 # Import the model loading function from inference.utils module
 from inference.models.chunked_whisper_transcriber import ChunkedWhisperTranscriber
+from inference.utils.batch_scheduler import DynamicBatchScheduler
+from inference.utils.streaming_resampler import StreamingResampler
+from inference.utils.streaming_session import StreamingTranscriptionSession
+from inference.utils.transcription_cache import TranscriptionCache
+from inference.utils.vad import VAD_SAMPLE_RATE, StreamingVAD, load_silero_vad
 
 # Global variables for model
 model = None
+whisper_scheduler = None
+align_scheduler = None
+# Silero VAD, loaded by the first /ws/stream connection
+vad_model = None
+vad_model_lock = asyncio.Lock()
+transcription_cache = TranscriptionCache(
+	max_entries=TRANSCRIPTION_CACHE_MAX_ENTRIES,
+	max_bytes=int(TRANSCRIPTION_CACHE_MAX_MB * 1024 * 1024),
+	ttl_sec=TRANSCRIPTION_CACHE_TTL_SEC,
+	persist_dir=TRANSCRIPTION_CACHE_DIR,
+	max_disk_bytes=int(TRANSCRIPTION_CACHE_MAX_DISK_MB * 1024 * 1024),
+)
 
 
 # Define lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 	# Startup: load model
-	global model
+	global model, whisper_scheduler, align_scheduler
 	# Use HuggingFace Whisper model instead of Canary
 	model = ChunkedWhisperTranscriber(model_name=MODEL_NAME)
 	print("Whisper model loaded successfully")
 
+	# Pending 30 s windows from concurrent requests are decoded together
+	whisper_scheduler = DynamicBatchScheduler(
+		model.transcriber.generate_batch,
+		max_batch_size=WHISPER_MAX_BATCH_SIZE,
+		max_wait_ms=WHISPER_MAX_WAIT_MS,
+		name="whisper",
+	)
+	await whisper_scheduler.start()
+
+	# Chunks waiting for alignment are put through the CTC model and Viterbi together
+	model.aligner.max_batch_size = ALIGN_MAX_BATCH_SIZE
+	model.aligner.viterbi_band_width = VITERBI_BAND_WIDTH
+	align_scheduler = DynamicBatchScheduler(
+		model.aligner.align_many,
+		max_batch_size=ALIGN_MAX_BATCH_SIZE,
+		max_wait_ms=ALIGN_MAX_WAIT_MS,
+		name="alignment",
+	)
+	await align_scheduler.start()
+
 	# Prepare a test file for the model
 	test_file_path = '/usr/src/app/mono_output.wav'
 
@@ -54,6 +120,8 @@ async def lifespan(app: FastAPI):
 
 	# Shutdown: cleanup resources
 	print("Shutting down and releasing resources")
+	await whisper_scheduler.stop()
+	await align_scheduler.stop()
 
 
 # Create FastAPI app with lifespan
@@ -145,6 +213,153 @@ async def transcribe_base64(request: AudioRequest):
 		raise HTTPException(status_code=500, detail=f"Error during transcription: {str(e)}")
 
 
+# Raw PCM sample formats accepted by /transcribe/pcm: numpy dtype and the scale that maps them to [-1, 1]
+PCM_ENCODINGS = {
+	"int16": (np.dtype('<i2'), 32768.0),
+	"float32": (np.dtype('<f4'), 1.0),
+}
+
+
+@app.post("/transcribe/pcm", response_model=TranscriptionResponse)
+async def transcribe_pcm(request: Request, sample_rate: int = 16000, encoding: str = "int16", channels: int = 1):
+	"""
+	Transcribe raw little-endian PCM sent as the request body (no WAV container, no base64).
+	The body may be streamed: the gateway forwards WebSocket frames here as they arrive.
+	"""
+	if not model:
+		raise HTTPException(status_code=500, detail="Model not loaded")
+	if encoding not in PCM_ENCODINGS:
+		raise HTTPException(status_code=400, detail=f"Unsupported encoding: {encoding}")
+	if sample_rate < 1 or channels < 1:
+		raise HTTPException(status_code=400, detail="sample_rate and channels must be positive")
+
+	body = bytearray()
+	async for chunk in request.stream():
+		body.extend(chunk)
+
+	dtype, _ = PCM_ENCODINGS[encoding]
+	if not body:
+		raise HTTPException(status_code=400, detail="No audio data received")
+	if len(body) % (dtype.itemsize * channels):
+		raise HTTPException(status_code=400, detail="Body is not a whole number of samples")
+
+	try:
+		transcription = await process_samples(decode_pcm(body, encoding, channels), sample_rate)
+		return {"transcription": transcription}
+
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error during transcription: {str(e)}")
+
+
+def decode_pcm(data, encoding, channels):
+	"""
+	Raw little-endian PCM bytes to float32 samples in [-1, 1], shape (n,) or (n, channels).
+	"""
+	dtype, scale = PCM_ENCODINGS[encoding]
+	audio_data = np.frombuffer(data, dtype=dtype).astype(np.float32) / scale
+	if channels > 1:
+		audio_data = audio_data.reshape(-1, channels)
+	return audio_data
+
+
+async def get_vad_model():
+	global vad_model
+	async with vad_model_lock:
+		if vad_model is None:
+			vad_model = await asyncio.to_thread(load_silero_vad)
+			print("Silero VAD loaded successfully")
+	return vad_model
+
+
+async def transcribe_partial(audio_16k):
+	"""
+	Whisper text of an utterance still in progress: one window through the shared scheduler, no alignment.
+	"""
+	features = await asyncio.to_thread(model.transcriber.extract_features, audio_16k, VAD_SAMPLE_RATE)
+	return await whisper_scheduler.submit(features)
+
+
+@app.websocket("/ws/stream")
+async def stream_transcription(websocket: WebSocket, sample_rate: int = 16000, encoding: str = "int16", channels: int = 1):
+	"""
+	Live transcription of one continuous stream. Binary messages carry raw little-endian PCM in the format
+	given by the query parameters; the text message {"type": "end"} ends the stream. Utterances are cut at
+	silence on the server (Silero VAD), and the session's speech_start / partial / final events are sent
+	back as JSON as soon as they are ready, followed by {"type": "end"}. Partials carry word timings from
+	streaming forced alignment unless STREAM_WORD_TIMINGS is 0; finals carry the full alignment.
+	"""
+	await websocket.accept()
+	if not model:
+		await websocket.close(code=1011, reason="Model not loaded")
+		return
+	if encoding not in PCM_ENCODINGS or sample_rate < 1 or channels < 1:
+		await websocket.close(code=1003, reason="Unsupported audio format")
+		return
+
+	vad = StreamingVAD(
+		await get_vad_model(),
+		threshold=STREAM_VAD_THRESHOLD,
+		min_silence_ms=STREAM_MIN_SILENCE_MS,
+		min_speech_ms=STREAM_MIN_SPEECH_MS,
+		max_utterance_sec=STREAM_MAX_UTTERANCE_SEC,
+	)
+	session = StreamingTranscriptionSession(
+		vad,
+		transcribe_final=lambda audio: process_samples(audio, VAD_SAMPLE_RATE),
+		transcribe_partial=transcribe_partial,
+		speech_pad_ms=STREAM_SPEECH_PAD_MS,
+		partial_interval_sec=STREAM_PARTIAL_INTERVAL_SEC,
+		agreement_n=STREAM_AGREEMENT_N,
+		make_aligner=model.aligner.stream if STREAM_WORD_TIMINGS else None,
+	)
+
+	async def send_events():
+		while True:
+			event = await session.events.get()
+			await websocket.send_json(event)
+			if event["type"] == "end":
+				return
+
+	sender = asyncio.create_task(send_events())
+	dtype, _ = PCM_ENCODINGS[encoding]
+	resampler = StreamingResampler(sample_rate, VAD_SAMPLE_RATE)
+	try:
+		while True:
+			message = await websocket.receive()
+			if message["type"] == "websocket.disconnect":
+				raise WebSocketDisconnect(message.get("code", 1000))
+
+			if message.get("bytes") is not None:
+				data = message["bytes"]
+				if len(data) % (dtype.itemsize * channels):
+					await websocket.close(code=1003, reason="Message is not a whole number of samples")
+					return
+				audio_data = decode_pcm(data, encoding, channels)
+				if channels > 1:
+					audio_data = audio_data.mean(axis=1)
+				# resampler state carries over, so message boundaries leave no filter edges
+				await session.push(resampler.push(audio_data))
+				continue
+
+			try:
+				message_type = json.loads(message["text"]).get("type")
+			except (TypeError, ValueError, AttributeError):
+				await websocket.close(code=1003, reason="Text messages must be JSON objects")
+				return
+			if message_type == "end":
+				await session.push(resampler.flush())
+				await session.finish()
+				await sender
+				await websocket.close()
+				return
+
+	except WebSocketDisconnect:
+		print("Stream client disconnected")
+	finally:
+		session.close()
+		sender.cancel()
+
+
 async def process_audio(wav_io=None, original_sample_rate=None):
 	"""
 	Process audio data for transcription by:
@@ -152,23 +367,33 @@ async def process_audio(wav_io=None, original_sample_rate=None):
 	2. Converting to mono
 	3. Removing DC offset
 	4. Normalizing
-	5. (Optionally) Padding
+	5. Padding clips shorter than MIN_AUDIO_SECONDS
 	6. Resampling to 16kHz
-	7. Writing to a temporary WAV file
-	8. Passing that file path to model.transcribe
-	"""
-	temp_file_path = None
+	7. Passing the float32 samples to model.transcribe_array_async, which batches
+	   the Whisper windows and the alignment of the chunks with those of other
+	   in-flight requests, unless the same audio is in the transcription cache
 
+	The audio never touches disk: no temporary WAV for the request or its chunks.
+	"""
 	try:
 		# If no wav_io provided, this is probably a test call
 		if wav_io is None:
 			return "Test transcription"
 
-		audio_data, original_sample_rate = sf.read(wav_io)
+		audio_data, original_sample_rate = sf.read(wav_io, dtype='float32')
+		return await process_samples(audio_data, original_sample_rate)
 
-		print(
-			'here'
-		)
+	except Exception as e:
+		print(f"Error processing audio: {str(e)}")
+		raise
+
+
+async def process_samples(audio_data, original_sample_rate):
+	"""
+	Steps 2-7 of process_audio, for float32 samples that are already decoded
+	(shape (n,) or (n, channels)).
+	"""
+	try:
 		# Convert to mono if necessary
 		if audio_data.ndim > 1:
 			audio_mono = librosa.to_mono(audio_data.T)
@@ -183,54 +408,42 @@ async def process_audio(wav_io=None, original_sample_rate=None):
 		if max_val > 0:
 			audio_mono = audio_mono / max_val * 0.99  # Scale to 99% to prevent clipping
 
-		# Calculate the length of the audio in seconds
-		audio_length_seconds = len(audio_mono) / original_sample_rate
-
-		# Target length in seconds (30 seconds)
-		target_length_seconds = 30
 		target_sample_rate = 16000
 
-		# If audio is shorter than 30 seconds, pad it with zeros
-		if audio_length_seconds < target_length_seconds:
-			padding_duration = target_length_seconds - audio_length_seconds
-			padding_samples = int(padding_duration * original_sample_rate)
-			audio_mono = np.pad(audio_mono, (0, padding_samples), 'constant')
+		# No padding to 30 s here: the Whisper feature extractor pads its own window, and resampling and
+		# alignment run on the true length. Only very short clips are padded, so the CTC model still
+		# gets enough frames for the tokens of a word or two.
+		min_length_samples = int(MIN_AUDIO_SECONDS * original_sample_rate)
+		if len(audio_mono) < min_length_samples:
+			audio_mono = np.pad(audio_mono, (0, min_length_samples - len(audio_mono)), 'constant')
 
 		# Resample to target sample rate
 		audio_resampled = resample_poly(audio_mono, up=target_sample_rate, down=original_sample_rate)
-
-		with NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-			print(f"Writing temporary file: {tmp.name}")
-			sf.write(tmp.name, audio_resampled, target_sample_rate, subtype='PCM_16')
-			temp_file_path = tmp.name
-
-		# ChunkedCanaryTranscriber expects a mono file
-		print(f"Transcribing file: {temp_file_path}")
-		transcription = model.transcribe(temp_file_path, chunk_duration_sec=30)
-
-		transcription_str = json.dumps(transcription)  # returns a JSON string
-
-		transcription_str = transcription_str.replace('<space>', ' ')
-
-		# If you want a Python dictionary again, parse it back:
-		transcription = json.loads(transcription_str)
-
-		# Clean up temporary file
-		if temp_file_path:
-			try:
-				os.remove(temp_file_path)
-			except OSError as e:
-				print(f"Warning: Could not remove temp file: {str(e)}")
+		audio_resampled = audio_resampled.astype(np.float32)
+
+		# Identical audio (client retries, overlapping resends, replayed sessions) skips Whisper and alignment
+		cache_key = transcription_cache.make_key(
+			audio_resampled,
+			target_sample_rate,
+			model=MODEL_NAME,
+			chunk_duration_sec=30,
+			viterbi_band_width=VITERBI_BAND_WIDTH,
+		)
+		transcription = await transcription_cache.get_or_compute(
+			cache_key,
+			lambda: model.transcribe_array_async(
+				audio_resampled,
+				target_sample_rate,
+				whisper_scheduler,
+				chunk_duration_sec=30,
+				align_scheduler=align_scheduler,
+			),
+		)
 
 		return transcription
 
 	except Exception as e:
 		print(f"Error processing audio: {str(e)}")
-		if temp_file_path and os.path.exists(temp_file_path):
-			try:
-				os.remove(temp_file_path)
-			except:
-				pass
 		raise
 
 
@@ -241,7 +454,13 @@ async def health_check():
 	"""
 	if not model:
 		return {"status": "model not loaded"}
-	return {"status": "healthy"}
+	return {
+		"status": "healthy",
+		"whisper_batching": whisper_scheduler.stats(),
+		"alignment_batching": align_scheduler.stats(),
+		"alignment_tokenization_cache": model.aligner.tokenization_cache.stats(),
+		"transcription_cache": transcription_cache.stats(),
+	}
 
 
 if __name__ == "__main__":
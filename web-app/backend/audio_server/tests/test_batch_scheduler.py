@@ -0,0 +1,127 @@
+# test_batch_scheduler.py
+import asyncio
+import threading
+
+import pytest
+
+from inference.utils.batch_scheduler import DynamicBatchScheduler
+
+
+def test_concurrent_submissions_are_batched_in_order():
+    batches = []
+
+    def batch_fn(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    async def scenario():
+        scheduler = DynamicBatchScheduler(batch_fn, max_batch_size=4, max_wait_ms=50)
+        results = await asyncio.gather(*(scheduler.submit(i) for i in range(6)))
+        await scheduler.stop()
+        return results, scheduler.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [i * 10 for i in range(6)]
+    # a full batch goes straight away, the rest once max_wait_ms has passed
+    assert batches == [[0, 1, 2, 3], [4, 5]]
+    assert stats["batches_run"] == 2 and stats["items_run"] == 6 and stats["max_batch_size_seen"] == 4
+
+
+def test_lone_item_runs_after_max_wait():
+    async def scenario():
+        scheduler = DynamicBatchScheduler(lambda items: items, max_batch_size=8, max_wait_ms=20)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await scheduler.submit("a")
+        waited = loop.time() - started
+        await scheduler.stop()
+        return result, waited
+
+    result, waited = asyncio.run(scenario())
+    assert result == "a"
+    assert 0.015 <= waited < 1.0
+
+
+def test_failed_batch_fails_the_bad_item_only():
+    calls = []
+
+    def batch_fn(items):
+        calls.append(list(items))
+        if "bad" in items:
+            raise ValueError("bad batch")
+        return items
+
+    async def scenario():
+        scheduler = DynamicBatchScheduler(batch_fn, max_batch_size=2, max_wait_ms=10)
+        first = await asyncio.gather(scheduler.submit("bad"), scheduler.submit("x"), return_exceptions=True)
+        second = await scheduler.submit_many(["y", "z"])
+        await scheduler.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first[0], ValueError)
+    assert first[1] == "x"
+    assert second == ["y", "z"]
+    # the failed batch is retried item by item before the next batch runs
+    assert calls == [["bad", "x"], ["bad"], ["x"], ["y", "z"]]
+
+
+def test_cancelled_requests_are_not_run():
+    ran = []
+    release = threading.Event()
+
+    def batch_fn(items):
+        ran.extend(items)
+        release.wait(1.0)
+        return items
+
+    async def scenario():
+        scheduler = DynamicBatchScheduler(batch_fn, max_batch_size=1, max_wait_ms=0)
+        running = asyncio.create_task(scheduler.submit("running"))
+        await asyncio.sleep(0.05)
+        cancelled = asyncio.create_task(scheduler.submit("cancelled"))
+        queued = asyncio.create_task(scheduler.submit("queued"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        release.set()
+        results = await asyncio.gather(running, queued)
+        await scheduler.stop()
+        return results
+
+    assert asyncio.run(scenario()) == ["running", "queued"]
+    assert ran == ["running", "queued"]
+
+
+def test_stop_fails_running_and_queued_requests():
+    release = threading.Event()
+
+    def batch_fn(items):
+        release.wait(1.0)
+        return items
+
+    async def scenario():
+        scheduler = DynamicBatchScheduler(batch_fn, max_batch_size=1, max_wait_ms=0)
+        running = asyncio.create_task(scheduler.submit("running"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(scheduler.submit("queued"))
+        await asyncio.sleep(0)
+        await scheduler.stop()
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(running, queued, return_exceptions=True), 1.0)
+
+    outcomes = asyncio.run(scenario())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+    async def stopped_while_collecting():
+        scheduler = DynamicBatchScheduler(lambda items: items, max_batch_size=4, max_wait_ms=1000)
+        collecting = asyncio.create_task(scheduler.submit("collecting"))
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return await asyncio.wait_for(asyncio.gather(collecting, return_exceptions=True), 1.0)
+
+    assert isinstance(asyncio.run(stopped_while_collecting())[0], RuntimeError)
+
+
+def test_max_batch_size_must_be_positive():
+    with pytest.raises(ValueError):
+        DynamicBatchScheduler(lambda items: items, max_batch_size=0)
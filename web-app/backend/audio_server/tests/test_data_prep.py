@@ -0,0 +1,80 @@
+# test_data_prep.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("nemo")
+from inference.utils.data_prep import (
+    Utterance,
+    UtteranceArrays,
+    add_t_start_end_to_utt_arrays,
+    add_t_start_end_to_utt_obj,
+    get_utt_obj,
+    utt_obj_to_arrays,
+)
+from inference.utils.viterbi_decoding import viterbi_decoding
+
+TEXT = "Cleared to land runway two seven | Wind calm"
+
+
+class StubTokenizer:
+    """Splits words into pieces of two characters, the first one prefixed with ▁ as sentencepiece does."""
+
+    def __init__(self, text):
+        self.vocab = sorted({token for word in text.split() for token in self.text_to_tokens(word)})
+
+    def text_to_tokens(self, word):
+        word = word.lower()
+        return ["▁" + word[:2]] + [word[i : i + 2] for i in range(2, len(word), 2)]
+
+    def text_to_ids(self, word):
+        return [self.vocab.index(token) for token in self.text_to_tokens(word)]
+
+
+def make_model(text=TEXT):
+    return SimpleNamespace(tokenizer=StubTokenizer(text))
+
+
+def assert_same_arrays(actual, expected):
+    for column in ("level", "parent", "s_start", "s_end", "t_start", "t_end"):
+        np.testing.assert_array_equal(getattr(actual, column), getattr(expected, column), err_msg=column)
+    assert actual.texts == expected.texts
+    assert actual.texts_cased == expected.texts_cased
+    assert actual.token_ids_with_blanks == expected.token_ids_with_blanks
+
+
+def test_columnar_utterance_matches_nested_utterance():
+    model = make_model()
+    nested = get_utt_obj(TEXT, model, "|", 100, None, "utt")
+    columnar = get_utt_obj(TEXT, model, "|", 100, None, "utt", columnar=True)
+    assert type(nested) is Utterance and type(columnar) is UtteranceArrays
+    assert_same_arrays(columnar, utt_obj_to_arrays(nested))
+    assert columnar.texts_cased[columnar.texts.index("▁cl")] == "▁Cl"
+
+
+def test_columnar_timings_match_nested_timings():
+    model = make_model()
+    nested = get_utt_obj(TEXT, model, "|", 100, None, "utt")
+    columnar = get_utt_obj(TEXT, model, "|", 100, None, "utt", columnar=True)
+
+    generator = torch.Generator().manual_seed(0)
+    V = len(model.tokenizer.vocab) + 1
+    T = 60
+    log_probs = torch.log_softmax(torch.randn(1, T, V, generator=generator), dim=-1)
+    y = torch.tensor([nested.token_ids_with_blanks])
+    alignment = viterbi_decoding(log_probs, y, torch.tensor([T]), torch.tensor([y.shape[1]]), "cpu")[0]
+
+    add_t_start_end_to_utt_obj(nested, alignment, 0.08)
+    add_t_start_end_to_utt_arrays(columnar, alignment, 0.08)
+    assert_same_arrays(columnar, utt_obj_to_arrays(nested))
+    # blanks the alignment skips are marked -1 in both
+    assert (columnar.t_start == -1).any()
+
+
+def test_text_too_long_for_the_audio_is_not_aligned():
+    model = make_model()
+    columnar = get_utt_obj(TEXT, model, "|", 5, None, "utt", columnar=True)
+    assert type(columnar) is Utterance and not columnar.segments_and_tokens
+    assert len(utt_obj_to_arrays(columnar)) == 0
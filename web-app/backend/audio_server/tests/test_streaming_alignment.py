@@ -0,0 +1,99 @@
+# test_streaming_alignment.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("nemo")
+from inference.utils.buffered_log_probs import BufferedLogProbs
+from inference.utils.data_prep import get_batch_variables
+from inference.utils.streaming_alignment import StreamingAlignmentSession
+from inference.utils.viterbi_decoding import viterbi_decoding
+
+VOCABULARY = [" ", "a", "b", "c"]
+BLANK = len(VOCABULARY)
+FRAME_SAMPLES = 1280  # 10 ms window stride * subsampling factor 8, at 16 kHz
+
+
+class StubCTCModel:
+    """
+    Char-based CTC model whose every output frame is the class (vocabulary index, or BLANK) written into
+    the samples of that frame as class / 10, so tests can spell out exactly what the audio says.
+    """
+
+    def __init__(self):
+        self.cfg = SimpleNamespace(
+            preprocessor=SimpleNamespace(sample_rate=16000, window_stride=0.01),
+            encoder=SimpleNamespace(subsampling_factor=8),
+        )
+        self.device = "cpu"
+        self.forward_samples = 0
+        self.decoder = StubDecoder()
+
+    def preprocessor(self, input_signal, length):
+        return input_signal, length
+
+    def encoder(self, audio_signal, length):
+        self.forward_samples += audio_signal.shape[1]
+        n_frames = -(-audio_signal.shape[1] // FRAME_SAMPLES)
+        padded = torch.nn.functional.pad(audio_signal, (0, n_frames * FRAME_SAMPLES - audio_signal.shape[1]))
+        return padded.view(1, n_frames, FRAME_SAMPLES)[:, :, 0], torch.tensor([n_frames])
+
+
+class StubDecoder:
+    vocabulary = VOCABULARY
+
+    def __call__(self, encoder_output):
+        classes = torch.round(encoder_output * 10).long()
+        return torch.log_softmax(10.0 * torch.nn.functional.one_hot(classes, BLANK + 1).float(), dim=-1)
+
+
+def spoken(frames):
+    """Audio whose frames say the given classes (characters, or None for blank)."""
+    classes = [BLANK if frame is None else VOCABULARY.index(frame) for frame in frames]
+    return np.repeat(np.array(classes, dtype=np.float32) / 10, FRAME_SAMPLES)
+
+
+def test_aligns_given_text_incrementally():
+    frames = [None, "a", "a", "b", None, " ", "c", "a", None, None]
+    audio = spoken(frames)
+    model = StubCTCModel()
+    session = StreamingAlignmentSession(model, chunk_len_in_secs=0.16, total_buffer_in_secs=0.48)
+    for piece in np.array_split(audio, 7):
+        session.push(piece)
+    # each committed chunk went through the model once, plus its look-ahead and left context
+    assert model.forward_samples < 4 * len(audio)
+
+    words = session.align("ab ca")
+    assert [word["text"] for word in words] == ["ab", "ca"]
+    assert (words[0]["start"], words[0]["end"]) == (0.08, 0.32)
+    assert (words[1]["start"], words[1]["end"]) == (0.48, 0.64)
+    # the text given is what gets aligned, not what the model would transcribe
+    assert [word["text"] for word in session.align("ab cb")] == ["ab", "cb"]
+
+
+def test_empty_audio_gives_empty_alignment():
+    model = StubCTCModel()
+    session = StreamingAlignmentSession(model)
+    assert session.align("ab") == []
+    session.push(np.zeros(0, dtype=np.float32))
+    assert session.align("ab") == []
+
+    buffered = BufferedLogProbs(model)
+    assert buffered.push(np.zeros(0, dtype=np.float32)).shape == (0, BLANK + 1)
+    assert buffered.flush().shape == (0, BLANK + 1)
+
+    log_probs, y, T, U, utt_objs, _ = get_batch_variables(
+        [{"audio": np.zeros(0, dtype=np.float32), "text": "ab", "utt_id": "empty"}],
+        model,
+        None,
+        False,
+        1,
+        None,
+        use_buffered_chunked_streaming=True,
+        buffered_chunk_params={"chunk_len_in_secs": 0.16, "total_buffer_in_secs": 0.48},
+        columnar=True,
+    )
+    assert viterbi_decoding(log_probs, y, T, U, "cpu") == [[]]
+    assert len(utt_objs[0]) == 0
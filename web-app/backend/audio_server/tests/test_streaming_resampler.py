@@ -0,0 +1,21 @@
+# test_streaming_resampler.py
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+from inference.utils.streaming_resampler import StreamingResampler
+
+
+@pytest.mark.parametrize("orig_sr", [8000, 11025, 16000, 22050, 44100, 48000])
+@pytest.mark.parametrize("n_samples", [0, 1, 100, 4801, 20000])
+def test_pieces_resample_like_the_whole_stream(orig_sr, n_samples):
+    rng = np.random.default_rng(n_samples)
+    audio = rng.standard_normal(n_samples).astype(np.float32)
+    resampler = StreamingResampler(orig_sr, 16000)
+    pieces = np.split(audio, np.sort(rng.integers(0, n_samples + 1, size=7)))
+    resampled = np.concatenate([resampler.push(piece) for piece in pieces] + [resampler.flush()])
+
+    expected = resample_poly(audio, 16000, orig_sr) if n_samples else np.zeros(0)
+    assert resampled.dtype == np.float32
+    assert resampled.shape == expected.shape
+    np.testing.assert_allclose(resampled, expected, atol=1e-5)
@@ -0,0 +1,35 @@
+# test_streaming_session.py
+import pytest
+
+from inference.utils.streaming_session import LocalAgreement
+
+
+def test_words_are_committed_once_n_hypotheses_agree():
+    agreement = LocalAgreement(n=2)
+    assert agreement.update("cleared to") == ([], ["cleared", "to"])
+    assert agreement.update("cleared to land") == (["cleared", "to"], ["land"])
+    # agreement ignores case and punctuation, but the words sent are those of the latest hypothesis
+    assert agreement.update("Cleared to land, runway") == (["land,"], ["runway"])
+    assert agreement.committed == ["cleared", "to", "land,"]
+
+
+def test_committed_words_are_never_taken_back():
+    agreement = LocalAgreement(n=2)
+    agreement.update("climb flight level")
+    agreement.update("climb flight level three")
+    assert agreement.committed == ["climb", "flight", "level"]
+    # a hypothesis that rewrites committed words only changes the tentative tail
+    assert agreement.update("descend flight level three") == ([], ["three"])
+    assert agreement.update("climb flight level three five") == ([], ["three", "five"])
+    assert agreement.update("climb flight level three five zero") == (["three", "five"], ["zero"])
+
+
+def test_n_of_one_commits_every_hypothesis():
+    agreement = LocalAgreement(n=1)
+    assert agreement.update("squawk") == (["squawk"], [])
+    assert agreement.update("squawk seven") == (["seven"], [])
+
+
+def test_n_must_be_positive():
+    with pytest.raises(ValueError):
+        LocalAgreement(n=0)
@@ -0,0 +1,196 @@
+# test_transcription_cache.py
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from inference.utils import transcription_cache
+from inference.utils.transcription_cache import TranscriptionCache
+
+
+def result(i):
+    return {"text": f"climb flight level {i}", "words": [{"start": 0.0, "end": 0.4, "text": "climb"}]}
+
+
+def compute_returning(value, calls):
+    async def compute():
+        calls.append(value)
+        return value
+
+    return compute
+
+
+def test_make_key_depends_on_audio_and_parameters():
+    audio = np.linspace(-1, 1, 1600, dtype=np.float32)
+    key = TranscriptionCache.make_key(audio, 16000, model="whisper", beam_size=1)
+    assert key == TranscriptionCache.make_key(audio.astype(np.float64), 16000, beam_size=1, model="whisper")
+    assert key != TranscriptionCache.make_key(audio[:-1], 16000, model="whisper", beam_size=1)
+    assert key != TranscriptionCache.make_key(audio, 16000, model="whisper", beam_size=5)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(transcription_cache.time, "time", lambda: now[0])
+    cache = TranscriptionCache(ttl_sec=60)
+    calls = []
+    asyncio.run(cache.get_or_compute("a", compute_returning(result(1), calls)))
+
+    now[0] += 59
+    assert cache.get("a") == result(1)
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+    asyncio.run(cache.get_or_compute("a", compute_returning(result(2), calls)))
+    assert calls == [result(1), result(2)]
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes():
+    entry_bytes = len(json.dumps(result(1)))
+    cache = TranscriptionCache(max_bytes=2 * entry_bytes)
+    calls = []
+
+    async def scenario():
+        await cache.get_or_compute("a", compute_returning(result(1), calls))
+        await cache.get_or_compute("b", compute_returning(result(2), calls))
+        assert cache.get("a") == result(1)
+        await cache.get_or_compute("c", compute_returning(result(3), calls))
+
+    asyncio.run(scenario())
+    assert cache.get("b") is None
+    assert cache.get("a") == result(1) and cache.get("c") == result(3)
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] <= cache.max_bytes
+
+    # a result larger than the whole cache is returned but not kept
+    small = TranscriptionCache(max_bytes=10)
+    assert asyncio.run(small.get_or_compute("a", compute_returning(result(1), calls))) == result(1)
+    assert small.stats()["entries"] == 0
+
+
+def test_gets_return_copies():
+    cache = TranscriptionCache()
+    asyncio.run(cache.get_or_compute("a", compute_returning(result(1), [])))
+    cache.get("a")["words"].clear()
+    assert cache.get("a") == result(1)
+
+
+def test_persisted_entries_survive_a_restart(tmp_path):
+    calls = []
+    first = TranscriptionCache(persist_dir=str(tmp_path))
+    asyncio.run(first.get_or_compute("a", compute_returning(result(1), calls)))
+    assert os.listdir(tmp_path) == ["a.json"]
+
+    restarted = TranscriptionCache(persist_dir=str(tmp_path))
+    assert restarted.get("a") is None
+    assert asyncio.run(restarted.get_or_compute("a", compute_returning(result(2), calls))) == result(1)
+    assert calls == [result(1)]
+    assert restarted.stats()["disk_hits"] == 1
+    # read back into memory
+    assert restarted.get("a") == result(1)
+
+    # files older than the TTL are removed instead of served
+    old = time.time() - 2 * restarted.ttl_sec
+    os.utime(tmp_path / "a.json", (old, old))
+    expired = TranscriptionCache(persist_dir=str(tmp_path))
+    assert asyncio.run(expired.get_or_compute("a", compute_returning(result(2), calls))) == result(2)
+    assert calls == [result(1), result(2)]
+
+
+def test_identical_requests_in_flight_share_one_computation():
+    calls = []
+
+    async def scenario():
+        cache = TranscriptionCache()
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return result(1)
+
+        requests = [asyncio.create_task(cache.get_or_compute("a", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*requests)
+        return cache, results
+
+    cache, results = asyncio.run(scenario())
+    assert calls == [1]
+    assert results == [result(1)] * 3
+    # coalesced callers get their own copy
+    assert results[1] is not results[2]
+    assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 2 and cache.stats()["in_flight"] == 0
+
+
+def test_failed_computation_fails_every_waiter_and_is_not_cached():
+    async def scenario():
+        cache = TranscriptionCache()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            raise RuntimeError("model crashed")
+
+        requests = [asyncio.create_task(cache.get_or_compute("a", compute)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*requests, return_exceptions=True)
+        assert cache.stats()["in_flight"] == 0 and cache.get("a") is None
+
+        # the next request computes again
+        retried = await cache.get_or_compute("a", compute_returning(result(1), []))
+        return outcomes, retried
+
+    outcomes, retried = asyncio.run(scenario())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert retried == result(1)
+
+
+def test_lone_failure_does_not_leave_an_unretrieved_exception(recwarn):
+    async def compute():
+        raise RuntimeError("model crashed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(TranscriptionCache().get_or_compute("a", compute))
+    assert not [warning for warning in recwarn if "never retrieved" in str(warning.message)]
+
+
+def test_disk_hits_are_stored_on_the_event_loop_thread(tmp_path, monkeypatch):
+    asyncio.run(TranscriptionCache(persist_dir=str(tmp_path)).get_or_compute("a", compute_returning(result(1), [])))
+
+    restarted = TranscriptionCache(persist_dir=str(tmp_path))
+    stored_on = []
+    store = restarted._store
+    monkeypatch.setattr(restarted, "_store", lambda *args: stored_on.append(threading.current_thread()) or store(*args))
+    assert asyncio.run(restarted.get_or_compute("a", compute_returning(result(2), []))) == result(1)
+    assert stored_on == [threading.main_thread()]
+
+
+def test_persist_dir_is_pruned_to_max_disk_bytes_and_ttl(tmp_path):
+    entry_bytes = len(json.dumps(result(1)))
+    cache = TranscriptionCache(persist_dir=str(tmp_path), max_disk_bytes=2 * entry_bytes, ttl_sec=60)
+    cache.PRUNE_EVERY = 1
+    now = time.time()
+
+    async def write(key, age):
+        await cache.get_or_compute(key, compute_returning(result(1), []))
+        os.utime(tmp_path / f"{key}.json", (now - age, now - age))
+
+    async def scenario():
+        await write("a", 30)
+        await write("b", 20)
+        # over max_disk_bytes: the oldest file goes
+        await write("c", 10)
+        assert sorted(os.listdir(tmp_path)) == ["b.json", "c.json"]
+        # expired files go even when there is room
+        os.utime(tmp_path / "b.json", (now - 120, now - 120))
+        cache.max_disk_bytes = 10 * entry_bytes
+        await write("d", 0)
+        assert sorted(os.listdir(tmp_path)) == ["c.json", "d.json"]
+
+    asyncio.run(scenario())
+    assert cache.stats()["disk_evictions"] == 2
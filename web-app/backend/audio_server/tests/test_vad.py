@@ -0,0 +1,72 @@
+# test_vad.py
+import numpy as np
+import torch
+
+from inference.utils.vad import VAD_SAMPLE_RATE, VAD_WINDOW_SAMPLES, StreamingVAD
+
+
+class StubSileroModel:
+    """Speech probability of a window is its first sample, so tests can write the probabilities into the audio."""
+
+    def __init__(self):
+        self.windows = 0
+
+    def reset_states(self):
+        self.windows = 0
+
+    def __call__(self, window, sample_rate):
+        assert window.shape == (VAD_WINDOW_SAMPLES,) and sample_rate == VAD_SAMPLE_RATE
+        self.windows += 1
+        return torch.tensor(float(window[0]))
+
+
+def windows(*probabilities):
+    return np.repeat(np.array(probabilities, dtype=np.float32), VAD_WINDOW_SAMPLES)
+
+
+def make_vad(**kwargs):
+    # 32 ms windows: 3 windows of silence end an utterance, 2 windows of speech are enough to keep it
+    return StreamingVAD(StubSileroModel(), min_silence_ms=96, min_speech_ms=64, **kwargs)
+
+
+def test_utterance_starts_on_speech_and_ends_after_min_silence():
+    vad = make_vad()
+    audio = windows(0.0, 0.9, 0.9, 0.9, 0.1, 0.1, 0.1, 0.0)
+    events = []
+    # pieces that do not line up with the windows
+    for piece in np.array_split(audio, 7):
+        events.extend(vad.push(piece))
+    assert events == [("start", 1 * VAD_WINDOW_SAMPLES), ("end", 4 * VAD_WINDOW_SAMPLES)]
+    assert not vad.in_speech
+
+
+def test_hysteresis_keeps_the_utterance_through_uncertain_windows():
+    vad = make_vad(threshold=0.5)
+    # 0.4 is below the threshold but above threshold - 0.15, so it is not silence
+    events = vad.push(windows(0.9, 0.4, 0.4, 0.4, 0.4, 0.9, 0.0, 0.0, 0.0))
+    assert events == [("start", 0), ("end", 6 * VAD_WINDOW_SAMPLES)]
+
+
+def test_short_blips_are_discarded():
+    vad = make_vad()
+    assert vad.push(windows(0.9, 0.0, 0.0, 0.0)) == [("start", 0), ("discard", 0)]
+
+
+def test_long_utterances_are_cut_at_max_utterance_sec():
+    vad = make_vad(max_utterance_sec=4 * VAD_WINDOW_SAMPLES / VAD_SAMPLE_RATE)
+    events = vad.push(windows(*[0.9] * 6))
+    assert events == [("start", 0), ("end", 4 * VAD_WINDOW_SAMPLES), ("start", 4 * VAD_WINDOW_SAMPLES)]
+
+
+def test_flush_ends_the_utterance_at_the_last_sample():
+    vad = make_vad()
+    vad.push(windows(0.9, 0.9, 0.9)[:-100])
+    assert vad.flush() == [("end", 3 * VAD_WINDOW_SAMPLES - 100)]
+    assert vad.flush() == []
+
+
+def test_every_stream_gets_its_own_model_state():
+    model = StubSileroModel()
+    first, second = StreamingVAD(model), StreamingVAD(model)
+    first.push(windows(0.0, 0.0))
+    assert first.model.windows == 2 and second.model.windows == 0 and model.windows == 0
@@ -0,0 +1,90 @@
+# test_viterbi_decoding.py
+import pytest
+import torch
+
+pytest.importorskip("nemo")
+from inference.utils.viterbi_decoding import _get_band_starts, viterbi_decoding
+
+V = 12
+
+
+def make_batch(seed, T_list, n_tokens_list, diagonal_bias=0.0):
+    """Random log-probs and references with blanks (id V - 1) in every other position, padded like get_batch_variables."""
+    generator = torch.Generator().manual_seed(seed)
+    y_list = []
+    for n_tokens in n_tokens_list:
+        y_utt = [V - 1]
+        for token in torch.randint(0, V - 1, (n_tokens,), generator=generator).tolist():
+            y_utt.extend([token, V - 1])
+        y_list.append(y_utt)
+    logits = torch.randn(len(T_list), max(T_list), V, generator=generator)
+    if diagonal_bias:
+        for b, (T_b, y_utt) in enumerate(zip(T_list, y_list)):
+            expected_u = torch.arange(T_b) * len(y_utt) // T_b
+            logits[b, torch.arange(T_b), torch.tensor(y_utt)[expected_u]] += diagonal_bias
+    log_probs = torch.log_softmax(logits, dim=2)
+    for b, T_b in enumerate(T_list):
+        log_probs[b, T_b:, :] = -3.4e38
+    y_batch = V * torch.ones((len(y_list), max(map(len, y_list))), dtype=torch.int64)
+    for b, y_utt in enumerate(y_list):
+        y_batch[b, : len(y_utt)] = torch.tensor(y_utt)
+    return log_probs, y_batch, torch.tensor(T_list), torch.tensor([len(y_utt) for y_utt in y_list])
+
+
+def score(log_probs, y, alignment):
+    return sum(float(log_probs[t, y[u]]) for t, u in enumerate(alignment))
+
+
+def assert_valid_path(alignment, y, U):
+    assert alignment[0] in (0, 1) and alignment[-1] in (U - 2, U - 1)
+    for u_prev, u in zip(alignment, alignment[1:]):
+        step = u - u_prev
+        # skipping a position is only allowed over a blank between two different tokens
+        assert step in (0, 1) or (step == 2 and y[u] != y[u - 2])
+
+
+def test_banded_matches_full_on_diagonal_inputs():
+    log_probs, y_batch, T_batch, U_batch = make_batch(0, [400, 380], [60, 55], diagonal_bias=6.0)
+    full = viterbi_decoding(log_probs, y_batch, T_batch, U_batch, "cpu")
+    assert viterbi_decoding(log_probs, y_batch, T_batch, U_batch, "cpu", band_width=10) == full
+
+
+def test_banded_is_best_path_within_band_on_non_diagonal_inputs():
+    # without a diagonal bias the best path often strays from the diagonal, so banded decoding is
+    # allowed to lose - but only to paths that leave the band, and never to return an invalid path
+    differing = 0
+    for seed in range(20):
+        generator = torch.Generator().manual_seed(seed)
+        T_list = torch.randint(60, 160, (2,), generator=generator).tolist()
+        n_tokens_list = [min(T_b // 2 - 1, int(n)) for T_b, n in zip(T_list, torch.randint(15, 40, (2,), generator=generator))]
+        band_width = int(torch.randint(4, 11, (1,), generator=generator))
+        log_probs, y_batch, T_batch, U_batch = make_batch(seed, T_list, n_tokens_list)
+
+        full = viterbi_decoding(log_probs, y_batch, T_batch, U_batch, "cpu")
+        banded = viterbi_decoding(log_probs, y_batch, T_batch, U_batch, "cpu", band_width=band_width)
+        band_size = 2 * band_width + 1
+        band_starts = _get_band_starts(T_batch, U_batch, int(T_batch.max()), band_size)
+        for b in range(2):
+            U_b = int(U_batch[b])
+            assert_valid_path(banded[b], y_batch[b].tolist(), U_b)
+            full_score, banded_score = score(log_probs[b], y_batch[b], full[b]), score(log_probs[b], y_batch[b], banded[b])
+            assert banded_score <= full_score + 1e-3
+            if banded_score < full_score - 1e-3:
+                differing += 1
+                starts = band_starts[b, : int(T_batch[b])].tolist()
+                assert any(not start <= u < start + band_size for u, start in zip(full[b], starts))
+    assert differing > 0
+
+
+def test_banded_falls_back_to_full_when_end_is_unreachable():
+    # a short chunk with far too much text (U > 2T): no path reaches the end, inside the band or not
+    log_probs, y_batch, T_batch, U_batch = make_batch(1, [10], [20])
+    full = viterbi_decoding(log_probs, y_batch, T_batch, U_batch, "cpu")
+    assert viterbi_decoding(log_probs, y_batch, T_batch, U_batch, "cpu", band_width=2) == full
+
+    # batched with an utterance the band handles, each gets the same path as full decoding
+    log_probs, y_batch, T_batch, U_batch = make_batch(2, [10, 400], [20, 60], diagonal_bias=6.0)
+    banded = viterbi_decoding(log_probs, y_batch, T_batch, U_batch, "cpu", band_width=10)
+    T_0, U_0 = int(T_batch[0]), int(U_batch[0])
+    assert banded[0] == viterbi_decoding(log_probs[:1, :T_0], y_batch[:1, :U_0], T_batch[:1], U_batch[:1], "cpu")[0]
+    assert banded[1] == viterbi_decoding(log_probs, y_batch, T_batch, U_batch, "cpu")[1]
@@ -1,21 +1,32 @@
 import os
 import io
+import asyncio
 import base64
 import json
+import contextlib
 from typing import Dict, List, Optional
 import numpy as np
-import requests
 import logging
 import jwt
 import datetime
 from fastapi import FastAPI, File, UploadFile, HTTPException, Header, WebSocket, Depends, BackgroundTasks, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
-
-from server.funcs.transcription import apply_custom_fixes
+from urllib.parse import urlencode
+import websockets
+
+from server.funcs.transcription import apply_custom_fixes, normalization_engine
+from server.funcs.callsign_matcher import callsign_matcher
+from server.funcs.llm_stream import ThinkStripper, stream_chat
+from server.funcs.rolling_summary import SummarySession, SummarySessionStore
+from server.funcs.summary_coalescer import SummaryCoalescer, merge_transcriptions
+from server.funcs.prompt_registry import prompt_registry
+from server.funcs.summary_cache import SummaryCache
+from server.funcs.llm_queue import LLMJobQueue, QueueFullError, mode_priority
+from server.funcs.pcm_protocol import PcmProtocolError, PcmStreamState, PcmUpload, parse_pcm_frame
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -24,22 +35,65 @@ logger = logging.getLogger(__name__)
 # Environment variables
 AUDIO_SERVER_URL = os.environ.get('AUDIO_SERVER_URL', 'http://audio_server:8000')
 OLLAMA_SERVER_URL = os.environ.get('OLLAMA_SERVER_URL', 'http://ollama:11434')
+AUDIO_SERVER_WS_URL = AUDIO_SERVER_URL.replace('http', 'ws', 1)
 LLM_URI = f"{OLLAMA_SERVER_URL}/api/chat"
 JWT_SECRET = os.environ.get('JWT_SECRET', 'meeting_minutes_transcription_2024_secure_key')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'hf.co/bartowski/DeepSeek-R1-Distill-Qwen-7B-GGUF:IQ4_XS')
+# Connection pool limits and timeouts (seconds) for the upstream services
+AUDIO_SERVER_MAX_CONNECTIONS = int(os.environ.get('AUDIO_SERVER_MAX_CONNECTIONS', '16'))
+AUDIO_SERVER_TIMEOUT = float(os.environ.get('AUDIO_SERVER_TIMEOUT', '300'))
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get('OLLAMA_MAX_CONNECTIONS', '4'))
+OLLAMA_TIMEOUT = float(os.environ.get('OLLAMA_TIMEOUT', '600'))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', '5'))
+# Rolling summaries: size of the report sent with each update (characters of JSON) before its oldest
+# entries are archived, entries per list always kept in it, and idle time before a session is dropped
+SUMMARY_REPORT_MAX_CHARS = int(os.environ.get('SUMMARY_REPORT_MAX_CHARS', '4000'))
+SUMMARY_KEEP_RECENT = int(os.environ.get('SUMMARY_KEEP_RECENT', '3'))
+SUMMARY_SESSION_TTL_SEC = float(os.environ.get('SUMMARY_SESSION_TTL_SEC', '43200'))
+# Minimum time between two summaries for the same user, session and mode; requests in between are merged
+SUMMARY_MIN_INTERVAL_SEC = float(os.environ.get('SUMMARY_MIN_INTERVAL_SEC', '2'))
+# Cache of summary replies for identical requests; 0 entries disables it
+SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get('SUMMARY_CACHE_MAX_ENTRIES', '256'))
+SUMMARY_CACHE_TTL_SEC = float(os.environ.get('SUMMARY_CACHE_TTL_SEC', '600'))
+# Summary jobs run against Ollama at once, and how many may wait (overall / per user) before new ones get a 429
+LLM_QUEUE_CONCURRENCY = int(os.environ.get('LLM_QUEUE_CONCURRENCY', '1'))
+LLM_QUEUE_MAX_DEPTH = int(os.environ.get('LLM_QUEUE_MAX_DEPTH', '32'))
+LLM_QUEUE_MAX_PER_USER = int(os.environ.get('LLM_QUEUE_MAX_PER_USER', '4'))
+HEALTH_CHECK_TIMEOUT = 5
 
 # Define lifespan context manager using asynccontextmanager
 import httpx
 
+# Shared HTTP clients, one per upstream, created in lifespan. Every route uses these so requests reuse
+# keep-alive connections and never block the event loop.
+audio_client: Optional[httpx.AsyncClient] = None
+ollama_client: Optional[httpx.AsyncClient] = None
+
+def create_upstream_client(max_connections: int, timeout: float) -> httpx.AsyncClient:
+	"""
+	Async client with its own connection pool: at most max_connections requests in flight to the
+	upstream (further requests wait for a free connection), idle connections kept alive for reuse.
+	"""
+	return httpx.AsyncClient(
+		limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+		timeout=httpx.Timeout(timeout, connect=UPSTREAM_CONNECT_TIMEOUT),
+	)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global audio_client, ollama_client
     logger.info("Starting transcription server...")
-    
-    async with httpx.AsyncClient() as client:
+    # Compile the callsign table and read the summary prompts now rather than on first use
+    callsign_matcher.load()
+    prompt_registry.load()
+    audio_client = create_upstream_client(AUDIO_SERVER_MAX_CONNECTIONS, AUDIO_SERVER_TIMEOUT)
+    ollama_client = create_upstream_client(OLLAMA_MAX_CONNECTIONS, OLLAMA_TIMEOUT)
+
+    async with audio_client, ollama_client:
         # Check audio server health asynchronously
         try:
-            audio_response = await client.get(f"{AUDIO_SERVER_URL}/health", timeout=5)
+            audio_response = await audio_client.get(f"{AUDIO_SERVER_URL}/health", timeout=HEALTH_CHECK_TIMEOUT)
             if audio_response.status_code == 200:
                 logger.info("Audio server is available")
             else:
@@ -54,17 +108,17 @@ async def lifespan(app: FastAPI):
                 "messages": [{"role": "system", "content": "Test connection"}],
                 "stream": False
             }
-            ollama_response = await client.post(LLM_URI, json=payload, timeout=5)
+            ollama_response = await ollama_client.post(LLM_URI, json=payload, timeout=HEALTH_CHECK_TIMEOUT)
             if ollama_response.status_code == 200:
                 logger.info(f"Ollama server is available with model: {OLLAMA_MODEL}")
             else:
                 logger.warning(f"Ollama server returned status {ollama_response.status_code}")
         except Exception as e:
             logger.warning(f"Could not connect to Ollama server: {str(e)}. Proceeding with startup.")
-    
-    yield  # Yield control back to FastAPI
-    
-    logger.info("Shutting down transcription server...")
+
+        yield  # Yield control back to FastAPI
+
+        logger.info("Shutting down transcription server...")
 
 
 # Create FastAPI application with lifespan
@@ -87,6 +141,12 @@ app.add_middleware(
 connected_clients = {}
 transcription_history = {}
 current_summary = {}
+# Admission control for summary jobs sent to Ollama, see server/funcs/llm_queue.py
+llm_queue = LLMJobQueue(LLM_QUEUE_CONCURRENCY, LLM_QUEUE_MAX_DEPTH, LLM_QUEUE_MAX_PER_USER)
+# Recent LLM summary replies, see server/funcs/summary_cache.py
+summary_cache = SummaryCache(SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_TTL_SEC)
+# Rolling summary sessions, see server/funcs/rolling_summary.py
+summary_sessions = SummarySessionStore(SUMMARY_REPORT_MAX_CHARS, SUMMARY_KEEP_RECENT, SUMMARY_SESSION_TTL_SEC)
 
 # Pydantic models for request/response validation
 class LoginRequest(BaseModel):
@@ -104,6 +164,9 @@ class TranscriptionRequest(BaseModel):
 	transcription: str
 	previous_report: Optional[str] = None
 	summary_mode: str = "atc"
+	# With a session id the server keeps the report between requests: send only the new transcriptions
+	# and leave previous_report out
+	session_id: Optional[str] = None
 
 # Function to generate JWT token
 def generate_jwt_token(user_id: str) -> str:
@@ -132,41 +195,42 @@ async def get_token_data(authorization: str = Header(None)) -> TokenData:
 	except (jwt.InvalidTokenError, IndexError):
 		raise HTTPException(status_code=401, detail="Invalid token")
 
+# Build the Ollama chat payload for a summary request
+def build_summary_payload(transcription: str, previous_report: Optional[str] = None, summary_mode: str = 'atc') -> Dict:
+	# Format content based on previous report
+	if previous_report is not None and previous_report != '':
+		content = f"This is the previous report:\n{previous_report}\n\nand these are new transcriptions that just came in:\n{transcription}"
+	else:
+		content = transcription
+		
+	# System prompts are kept in memory and reloaded when their file changes
+	system_prompt = prompt_registry.get(summary_mode)
+	
+	# Define the payload to send to the LLM service
+	return {
+		"model": OLLAMA_MODEL,
+		"options": {"temperature": 0.1},
+		"messages": [
+			{"role": "system", "content": system_prompt},
+			{"role": "user", "content": content}
+		],
+		"stream": False
+	}
+
 # Function to summarize transcription text
-async def summarize_text(transcription: str, previous_report: Optional[str] = None, summary_mode: str = 'atc') -> Dict:
+async def summarize_text(transcription: str, previous_report: Optional[str] = None, summary_mode: str = 'atc', user_id: str = '') -> Dict:
 	try:
-		# Format content based on previous report
-		if previous_report is not None and previous_report != '':
-			content = f"This is the previous report:\n{previous_report}\n\nand these are new transcriptions that just came in:\n{transcription}"
-		else:
-			content = transcription
-			
-		# Get the system prompt from the appropriate file
-		file_path = f"./server/models/prompt_{summary_mode}"
-		absolute_path = os.path.abspath(file_path)
+		payload = build_summary_payload(transcription, previous_report, summary_mode)
 		
-		try:
-			with open(file_path, 'r') as file:
-				system_prompt = file.read()
-		except FileNotFoundError:
-			logger.warning(f"System prompt file not found: {file_path}. Using default prompt.")
-			system_prompt = "You will summarize the meeting transcription provided."
+		# Identical requests (reconnects, retries) are answered from the cache
+		cache_key = summary_cache.make_key(payload)
+		cached = summary_cache.get(cache_key)
+		if cached is not None:
+			return cached
 		
-		# Define the payload to send to the LLM service
-		payload = {
-			"model": OLLAMA_MODEL,
-			"options": {"temperature": 0.1},
-			"messages": [
-				{"role": "system", "content": system_prompt},
-				{"role": "user", "content": content}
-			],
-			"stream": False
-		}
-		
-		# Make the request to the Ollama server
-		response = await run_in_threadpool(
-			lambda: requests.post(LLM_URI, json=payload)
-		)
+		# Make the request to the Ollama server once the job queue gives this user a slot
+		async with llm_queue.slot(user_id, mode_priority(summary_mode)):
+			response = await ollama_client.post(LLM_URI, json=payload)
 		
 		# Check if the request was successful
 		if response.status_code != 200:
@@ -174,12 +238,82 @@ async def summarize_text(transcription: str, previous_report: Optional[str] = No
 			return {"error": "Failed to generate summary", "details": response.text}
 		
 		# Return the response from the LLM service
-		return response.json()
+		summary_result = response.json()
+		summary_cache.put(cache_key, summary_result)
+		return summary_result
 		
 	except Exception as e:
-		logger.error(f"Error in summarize_text: {str(e)}")
+		# a full queue is not an error here; callers turn it into a 429
+		if not isinstance(e, QueueFullError):
+			logger.error(f"Error in summarize_text: {str(e)}")
 		raise
 
+def sse_event(data: Dict) -> str:
+	return f"data: {json.dumps(data)}\n\n"
+
+async def replay_chunks(content: str):
+	yield content
+
+# Stream a summary as server-sent events while the LLM generates it
+async def stream_summary_events(request: TranscriptionRequest, user_id: str):
+	"""
+	Yields "token" events with the visible text of each chunk Ollama streams back (<think> reasoning is
+	removed on the fly), then one "done" event with the whole summary, or an "error" event. The finished
+	summary is stored for the user in the same shape as a non-streamed Ollama response. With a session_id,
+	the update runs on the session's report and "done" also carries the updated report.
+	"""
+	session = summary_sessions.get(user_id, request.session_id, request.summary_mode) if request.session_id else None
+	async with session.lock if session else contextlib.nullcontext():
+		previous_report = session.prompt_report() if session else request.previous_report
+		payload = build_summary_payload(request.transcription, previous_report, request.summary_mode)
+		cache_key = summary_cache.make_key(payload)
+		cached = summary_cache.get(cache_key)
+		chunks = replay_chunks(cached["message"]["content"]) if cached else stream_chat(ollama_client, LLM_URI, payload)
+		stripper = ThinkStripper()
+		parts = []
+		try:
+			async with llm_queue.slot(user_id, mode_priority(request.summary_mode)) if not cached else contextlib.nullcontext():
+				async for chunk in chunks:
+					visible = stripper.feed(chunk)
+					if visible:
+						parts.append(visible)
+						yield sse_event({"type": "token", "content": visible})
+			visible = stripper.flush()
+			if visible:
+				parts.append(visible)
+				yield sse_event({"type": "token", "content": visible})
+		except QueueFullError as e:
+			yield sse_event({"type": "error", "error": str(e), "retry_after": e.retry_after})
+			return
+		except httpx.HTTPStatusError as e:
+			logger.error(f"Error from LLM server: {e.response.text}")
+			yield sse_event({"type": "error", "error": "Failed to generate summary", "details": e.response.text})
+			return
+		except Exception as e:
+			logger.error(f"Error streaming summary: {str(e)}")
+			yield sse_event({"type": "error", "error": "Failed to generate summary", "details": str(e)})
+			return
+
+		summary = ''.join(parts)
+		summary_result = {"model": OLLAMA_MODEL, "message": {"role": "assistant", "content": summary}, "done": True}
+		if not cached:
+			summary_cache.put(cache_key, summary_result)
+		done_event = {"type": "done", "summary": summary}
+		if session:
+			apply_session_update(session, summary_result)
+			done_event["report"] = summary_result["report"]
+		current_summary[user_id] = summary_result
+		yield sse_event(done_event)
+
+def apply_session_update(session: SummarySession, summary_result: Dict):
+	"""
+	Folds an LLM reply into a rolling summary session and adds the session's full report to the reply.
+	"""
+	content = summary_result.get("message", {}).get("content", "")
+	if "error" not in summary_result and not session.apply(content):
+		logger.warning(f"No JSON report in the LLM reply; keeping the previous {session.summary_mode} report")
+	summary_result["report"] = session.full_report()
+
 # API Routes
 @app.post("/auth/login", response_model=TokenResponse)
 async def login(request: LoginRequest):
@@ -234,7 +368,7 @@ async def transcribe_audio(file: UploadFile = File(...), token_data: TokenData =
 		print('received')
 		# Forward the file to the audio_server
 		files = {'file': (file.filename, file_content, file.content_type)}
-		response = requests.post(f"{AUDIO_SERVER_URL}/transcribe/file", files=files)
+		response = await audio_client.post(f"{AUDIO_SERVER_URL}/transcribe/file", files=files)
 		
 		if response.status_code != 200:
 			raise HTTPException(status_code=response.status_code, 
@@ -257,37 +391,89 @@ async def transcribe_audio(file: UploadFile = File(...), token_data: TokenData =
 
 	except HTTPException:
 		raise
+	except httpx.TimeoutException as e:
+		logger.error(f"Audio server timed out: {str(e)}")
+		raise HTTPException(status_code=504, detail="Audio server timed out")
 	except Exception as e:
 		logger.error(f"Error transcribing audio: {str(e)}")
 		raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
-@app.post("/summary")
-async def get_summary(request: TranscriptionRequest, token_data: TokenData = Depends(get_token_data)):
-	try:
+# Produce one summary: a coalesced batch of /summary requests from one user, session and mode
+async def run_summary(key, request: TranscriptionRequest) -> Dict:
+	user_id = key[0]
+	if request.session_id:
+		# Rolling summary: the server keeps the report, the client sends only new transmissions
+		session = summary_sessions.get(user_id, request.session_id, request.summary_mode)
+		async with session.lock:
+			summary_result = await summarize_text(
+				request.transcription,
+				session.prompt_report(),
+				request.summary_mode,
+				user_id
+			)
+			apply_session_update(session, summary_result)
+	else:
 		# Call the internal summarize method
 		summary_result = await summarize_text(
 			request.transcription, 
 			request.previous_report, 
-			request.summary_mode
+			request.summary_mode,
+			user_id
 		)
-		
-		# Store the summary for this user
-		user_id = token_data.user_id
-		current_summary[user_id] = summary_result
-		
-		return summary_result
+	
+	# Store the summary for this user
+	current_summary[user_id] = summary_result
+	return summary_result
+
+def merge_summary_requests(older: TranscriptionRequest, newer: TranscriptionRequest) -> TranscriptionRequest:
+	return newer.model_copy(update={"transcription": merge_transcriptions(older.transcription, newer.transcription)})
+
+# Summary requests are coalesced per user, session and mode, see server/funcs/summary_coalescer.py
+summary_coalescer = SummaryCoalescer(run_summary, merge_summary_requests, SUMMARY_MIN_INTERVAL_SEC)
+
+@app.post("/summary")
+async def get_summary(request: TranscriptionRequest, token_data: TokenData = Depends(get_token_data)):
+	try:
+		key = (token_data.user_id, request.session_id, request.summary_mode)
+		return await summary_coalescer.submit(key, request)
 
+	except QueueFullError as e:
+		raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 	except Exception as e:
 		logger.error(f"Error generating summary: {str(e)}")
 		raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+@app.post("/summary/stream")
+async def get_summary_stream(request: TranscriptionRequest, token_data: TokenData = Depends(get_token_data)):
+	"""
+	Same request as /summary, but the summary is sent as server-sent events while the model generates
+	it instead of in one response at the end (see stream_summary_events).
+	"""
+	# refuse up front while the LLM queue is full, so the client gets a 429 rather than an error event
+	try:
+		llm_queue.check(token_data.user_id)
+	except QueueFullError as e:
+		raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+	return StreamingResponse(
+		stream_summary_events(request, token_data.user_id),
+		media_type="text/event-stream",
+		headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+	)
+
+@app.delete("/summary/session/{session_id}")
+async def reset_summary_session(session_id: str, token_data: TokenData = Depends(get_token_data)):
+	"""
+	Forgets a rolling summary session, e.g. at the end of a shift; the next update with this id starts a new report.
+	"""
+	return {"dropped": summary_sessions.drop(token_data.user_id, session_id)}
+
 @app.get("/health")
 async def health_check():
 	health_status = {"status": "healthy", "services": {}}
 	
 	# Check audio server health
 	try:
-		audio_response = requests.get(f"{AUDIO_SERVER_URL}/health", timeout=5)
+		audio_response = await audio_client.get(f"{AUDIO_SERVER_URL}/health", timeout=HEALTH_CHECK_TIMEOUT)
 		health_status["services"]["audio_server"] = {
 			"status": "healthy" if audio_response.status_code == 200 else "unhealthy",
 			"details": audio_response.json() if audio_response.status_code == 200 else {"error": audio_response.text}
@@ -297,29 +483,104 @@ async def health_check():
 	
 	# Check Ollama server health
 	try:
-		ollama_response = requests.post(LLM_URI, json={
+		ollama_response = await ollama_client.post(LLM_URI, json={
 			"model": OLLAMA_MODEL,
 			"messages": [{"role": "system", "content": "Health check"}],
 			"stream": False
-		}, timeout=5)
+		}, timeout=HEALTH_CHECK_TIMEOUT)
 		health_status["services"]["ollama_server"] = {
 			"status": "healthy" if ollama_response.status_code == 200 else "unhealthy"
 		}
 	except Exception as e:
 		health_status["services"]["ollama_server"] = {"status": "unhealthy", "details": {"error": str(e)}}
 	
+	# How often each post-processing rule fired since startup
+	health_status["normalization"] = normalization_engine.stats()
+	health_status["llm_queue"] = llm_queue.stats()
+	health_status["summary_cache"] = summary_cache.stats()
+	health_status["summary_sessions"] = summary_sessions.stats()
+	health_status["summary_coalescing"] = summary_coalescer.stats()
+
 	# Set overall status
 	if any(service["status"] != "healthy" for service in health_status["services"].values()):
 		health_status["status"] = "degraded"
 	
 	return health_status
 
+async def send_pcm_transcription(websocket: WebSocket, upload: PcmUpload, last_sequence: int):
+	"""
+	Waits for the audio server's reply to a finished PCM upload and sends it to the client.
+	"""
+	try:
+		response = await upload.response
+		if response.status_code != 200:
+			await websocket.send_json({
+				'error': 'Failed to transcribe audio',
+				'session': upload.session_id,
+				'status_code': response.status_code,
+				'details': response.text
+			})
+			return
+		transcription_data = response.json().get('transcription', '')
+		await websocket.send_json({
+			'session': upload.session_id,
+			'sequence': last_sequence,
+			'transcription': json.dumps(transcription_data)
+		})
+	except asyncio.CancelledError:
+		pass
+	except Exception as e:
+		logger.error(f"Error transcribing PCM session {upload.session_id}: {str(e)}")
+		try:
+			await websocket.send_json({
+				'error': 'Failed to transcribe audio',
+				'session': upload.session_id,
+				'details': str(e)
+			})
+		except Exception:
+			# the client has gone away; nobody is waiting for the reply
+			pass
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+	"""
+	Text messages: JSON {"audio": <base64 audio file>}, answered one at a time.
+	Binary messages: PCM frames (see server/funcs/pcm_protocol.py). The payloads of each session are
+	streamed to the audio server as they arrive - no base64 or JSON on the way - and the transcription
+	is sent back, tagged with the session id, once its last frame is in.
+	"""
 	await websocket.accept()
+	pcm_uploads: Dict[int, PcmUpload] = {}
+	pending_replies = set()
 	try:
 		while True:
-			data = await websocket.receive_json()
+			message = await websocket.receive()
+			if message["type"] == "websocket.disconnect":
+				raise WebSocketDisconnect(message.get("code", 1000))
+
+			if message.get("bytes") is not None:
+				try:
+					frame = parse_pcm_frame(message["bytes"])
+					upload = pcm_uploads.get(frame.session_id)
+					if upload is None:
+						upload = PcmUpload(audio_client, f"{AUDIO_SERVER_URL}/transcribe/pcm", frame)
+						pcm_uploads[frame.session_id] = upload
+					upload.add(frame)
+				except PcmProtocolError as e:
+					# drop the broken session; the client can start it again
+					if e.session_id in pcm_uploads:
+						pcm_uploads.pop(e.session_id).abort()
+					await websocket.send_json({'error': str(e), 'session': e.session_id})
+					continue
+
+				if frame.is_last:
+					del pcm_uploads[frame.session_id]
+					reply = asyncio.create_task(send_pcm_transcription(websocket, upload, frame.sequence))
+					pending_replies.add(reply)
+					reply.add_done_callback(pending_replies.discard)
+				continue
+
+			data = json.loads(message["text"])
 			
 			# Get the base64 audio data from the client
 			audio_base64 = data.get('audio')
@@ -332,7 +593,7 @@ async def websocket_endpoint(websocket: WebSocket):
 			payload = {'audio': audio_base64}
 			
 			# Make the request to the audio server
-			response = requests.post(f"{AUDIO_SERVER_URL}/transcribe/base64", json=payload)
+			response = await audio_client.post(f"{AUDIO_SERVER_URL}/transcribe/base64", json=payload)
 			print("RESPONSE:", response)
 			
 			if response.status_code != 200:
@@ -355,6 +616,72 @@ async def websocket_endpoint(websocket: WebSocket):
 	except Exception as e:
 		logger.error(f"WebSocket error: {str(e)}")
 		await websocket.close(code=1002, reason=str(e))
+	finally:
+		for upload in pcm_uploads.values():
+			upload.abort()
+		for reply in list(pending_replies):
+			reply.cancel()
+
+async def relay_stream_events(websocket: WebSocket, upstream):
+	"""
+	Passes the audio server's streaming events (JSON text) to the client until the audio server closes.
+	"""
+	async for event in upstream:
+		await websocket.send_text(event)
+
+@app.websocket("/ws/stream")
+async def stream_websocket_endpoint(websocket: WebSocket):
+	"""
+	Live transcription with server-side endpointing. The client sends one continuous session as binary
+	PCM frames (see server/funcs/pcm_protocol.py) without chunking it itself; the frame with the last-frame
+	flag ends the stream. Payloads are relayed to the audio server's /ws/stream, which cuts utterances at
+	silence, and its speech_start / partial / final / end events are passed back unchanged.
+	"""
+	await websocket.accept()
+	state = None
+	upstream = None
+	relay = None
+	try:
+		while True:
+			message = await websocket.receive()
+			if message["type"] == "websocket.disconnect":
+				raise WebSocketDisconnect(message.get("code", 1000))
+			if message.get("bytes") is None:
+				await websocket.send_json({'error': 'Expected binary PCM frames'})
+				continue
+
+			try:
+				frame = parse_pcm_frame(message["bytes"])
+				if state is None:
+					state = PcmStreamState(frame)
+				state.advance(frame)
+			except PcmProtocolError as e:
+				await websocket.send_json({'error': str(e), 'session': e.session_id})
+				await websocket.close(code=1003, reason=str(e))
+				return
+
+			if upstream is None:
+				upstream = await websockets.connect(f"{AUDIO_SERVER_WS_URL}/ws/stream?{urlencode(state.params)}", max_size=None)
+				relay = asyncio.create_task(relay_stream_events(websocket, upstream))
+			if frame.payload:
+				await upstream.send(frame.payload)
+			if frame.is_last:
+				await upstream.send(json.dumps({'type': 'end'}))
+				# the audio server closes the stream after its "end" event
+				await relay
+				await websocket.close()
+				return
+
+	except WebSocketDisconnect:
+		logger.info("Streaming client disconnected")
+	except Exception as e:
+		logger.error(f"Streaming WebSocket error: {str(e)}")
+		await websocket.close(code=1011, reason=str(e))
+	finally:
+		if relay is not None:
+			relay.cancel()
+		if upstream is not None:
+			await upstream.close()
 
 if __name__ == "__main__":
 	import uvicorn
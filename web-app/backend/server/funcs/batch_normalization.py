@@ -0,0 +1,104 @@
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import multiprocessing
+import sys
+from typing import Iterable, Iterator, Optional, Union
+
+from .transcription import apply_custom_fixes, process_transcript_data
+
+logger = logging.getLogger(__name__)
+
+# Below this many transcripts a process pool costs more to start than it saves
+PARALLEL_THRESHOLD = 2000
+
+
+def normalize_one(item: Union[str, dict]) -> Union[str, dict]:
+	"""
+	A plain transcript goes through apply_custom_fixes; a transcript dict ({"text", optionally "words"}
+	with timings) through process_transcript_data, so its words follow the new text. Nothing is logged.
+	"""
+	if isinstance(item, str):
+		return apply_custom_fixes(item, log=False)
+	# process_transcript_data edits words in place; leave the caller's dicts alone
+	data = dict(item)
+	if "words" in data:
+		data["words"] = [dict(word) for word in data["words"]]
+	return process_transcript_data(data, log=False)
+
+
+def normalize_batch(items: Iterable[Union[str, dict]], processes: Optional[int] = None, chunksize: int = 256) -> Iterator[Union[str, dict]]:
+	"""
+	Normalizes many transcripts, yielding results in input order as they are ready, so arbitrarily large
+	inputs stream through in constant memory.
+
+	With processes=None, inputs of up to PARALLEL_THRESHOLD items are processed in this process and larger
+	ones are fanned out over a pool with one worker per CPU. An explicit `processes` is always honoured:
+	1 is the single-process path, more always uses a pool of that many workers. Pools take chunks of
+	`chunksize` items.
+	"""
+	items = iter(items)
+	head = []
+	if processes is None:
+		head = list(itertools.islice(items, PARALLEL_THRESHOLD))
+		if len(head) < PARALLEL_THRESHOLD:
+			processes = 1
+	if processes == 1:
+		for item in itertools.chain(head, items):
+			yield normalize_one(item)
+		return
+
+	with multiprocessing.Pool(processes, initializer=_quiet_worker) as pool:
+		yield from pool.imap(normalize_one, itertools.chain(head, items), chunksize=chunksize)
+
+
+def _quiet_worker():
+	logging.disable(logging.INFO)
+
+
+def read_transcripts(lines: Iterable[str]) -> Iterator[Union[str, dict]]:
+	"""
+	One transcript per line: a JSON object ({"text": ..., "words": [...]}) or plain text. A line that
+	starts with { but is not a JSON object (e.g. "{inaudible} climb ...") is plain text. Blank lines are
+	skipped.
+	"""
+	for line in lines:
+		line = line.strip()
+		if not line:
+			continue
+		if line.startswith('{'):
+			try:
+				item = json.loads(line)
+			except ValueError:
+				item = None
+			if isinstance(item, dict):
+				yield item
+				continue
+		yield line
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Normalize a file of transcripts (plain text or JSON lines).")
+	parser.add_argument("input", help="Transcript file, or - for stdin")
+	parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+	parser.add_argument(
+		"-p", "--processes", type=int, default=None,
+		help=f"Worker processes (default: one per CPU, or none below {PARALLEL_THRESHOLD} transcripts)",
+	)
+	args = parser.parse_args()
+
+	count = 0
+	with contextlib.ExitStack() as stack:
+		# stdin / stdout are not ours to close
+		source = sys.stdin if args.input == '-' else stack.enter_context(open(args.input, encoding='utf-8'))
+		sink = stack.enter_context(open(args.output, 'w', encoding='utf-8')) if args.output else sys.stdout
+		for result in normalize_batch(read_transcripts(source), processes=args.processes):
+			sink.write((result if isinstance(result, str) else json.dumps(result)) + '\n')
+			count += 1
+	logger.info(f"Normalized {count} transcripts")
+
+
+if __name__ == "__main__":
+	main()
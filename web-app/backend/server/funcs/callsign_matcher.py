@@ -0,0 +1,92 @@
+import os
+import re
+import threading
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+AIRCRAFT_CALLSIGN_PARQUET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aircraft_callsign.parquet')
+
+
+def build_trie_pattern(words):
+	"""
+	One regex that matches any of `words` (lowercase), built from their character trie so that a scan
+	tries a single branch per character instead of every word in turn. Optional suffixes are greedy,
+	so the longest word matches first and shorter ones are only tried when the rest of the pattern fails.
+	"""
+	trie = {}
+	for word in words:
+		node = trie
+		for char in word:
+			node = node.setdefault(char, {})
+		node[''] = True
+
+	def node_pattern(node):
+		alternatives = [re.escape(char) + node_pattern(child) for char, child in sorted(node.items()) if char]
+		if not alternatives:
+			return ''
+		if len(alternatives) == 1 and '' not in node:
+			return alternatives[0]
+		pattern = '(?:' + '|'.join(alternatives) + ')'
+		return pattern + '?' if '' in node else pattern
+
+	return node_pattern(trie)
+
+
+class CallsignMatcher:
+	"""
+	Rewrites spoken airline callsigns followed by a flight number ("Singapore 318") to ICAO form ("SIA318").
+
+	The callsign table is compiled into one case-insensitive trie regex when first used, and again
+	whenever the parquet file's mtime changes, so a rewrite is a single scan of the text whatever the
+	size of the table. At each position the longest callsign that is followed by a number wins.
+	"""
+
+	def __init__(self, parquet_file: str = AIRCRAFT_CALLSIGN_PARQUET):
+		self.parquet_file = parquet_file
+		self._lock = threading.Lock()
+		self._mtime = None
+		self._pattern = None
+		self._icao_by_callsign = {}
+
+	def load(self):
+		"""
+		(Re)builds the matcher if the parquet file changed since it was last read.
+		"""
+		mtime = os.path.getmtime(self.parquet_file)
+		if mtime == self._mtime:
+			return
+		with self._lock:
+			if mtime == self._mtime:
+				return
+			df = pd.read_parquet(self.parquet_file, columns=['Callsign', 'ICAO'])
+			icao_by_callsign = {}
+			# same precedence as the per-row substitutions this replaces: the last row of a callsign
+			# gives its ICAO code, and of callsigns differing only in case the first one listed wins
+			for callsign, icao in dict(zip(df['Callsign'], df['ICAO'])).items():
+				icao_by_callsign.setdefault(callsign.lower(), icao)
+			self._pattern = re.compile(r'\b(' + build_trie_pattern(icao_by_callsign) + r')\b\s*(\d+)', flags=re.IGNORECASE)
+			self._icao_by_callsign = icao_by_callsign
+			self._mtime = mtime
+			logger.info(f"Loaded {len(icao_by_callsign)} airline callsigns from {self.parquet_file}")
+
+	def replace(self, text: str) -> str:
+		return self.compiled_pattern().sub(self.replace_match, text)
+
+	def compiled_pattern(self):
+		"""
+		The current pattern (reloaded first if the table changed); group 1 is the callsign, group 2 the number.
+		"""
+		self.load()
+		return self._pattern
+
+	def replace_match(self, match):
+		icao = self._icao_by_callsign.get(match.group(1).lower())
+		if icao is None:
+			return match.group(0)
+		return icao + match.group(2)
+
+
+callsign_matcher = CallsignMatcher()
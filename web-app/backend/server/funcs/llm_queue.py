@@ -0,0 +1,180 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+# lower runs first; modes not listed get DEFAULT_PRIORITY
+MODE_PRIORITIES = {"atc": 0, "minutes": 1}
+DEFAULT_PRIORITY = 1
+
+
+def mode_priority(summary_mode: str) -> int:
+	return MODE_PRIORITIES.get(summary_mode, DEFAULT_PRIORITY)
+
+
+class QueueFullError(Exception):
+	"""Raised instead of queueing a job when the queue is at its limit; retry_after is in seconds."""
+
+	def __init__(self, message: str, retry_after: int):
+		super().__init__(message)
+		self.retry_after = retry_after
+
+
+class _Waiter:
+	def __init__(self, user_id: str, priority: int):
+		self.user_id = user_id
+		self.priority = priority
+		self.enqueued_at = time.monotonic()
+		self.granted = asyncio.get_running_loop().create_future()
+
+
+class LLMJobQueue:
+	"""
+	Admission control in front of the LLM server: at most `concurrency` jobs run at once and the rest
+	wait here rather than piling up as open requests to Ollama.
+
+	A free slot goes to the highest-priority class with anyone waiting (atc before minutes), and within
+	a class to users in turn, so one user's burst waits behind a single job of every other user rather
+	than in front of all of them. Beyond max_depth waiting jobs overall, or max_per_user for one user,
+	new jobs are refused straight away with QueueFullError, whose retry_after estimates when the queue will
+	have drained from the recent average job duration.
+	"""
+
+	def __init__(self, concurrency: int = 1, max_depth: int = 32, max_per_user: int = 4, wait_window: int = 1000):
+		self.concurrency = concurrency
+		self.max_depth = max_depth
+		self.max_per_user = max_per_user
+		self.running = 0
+		# priority -> user -> waiters in arrival order; users are served in the dict's order, moving to
+		# the back after each turn
+		self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+		self._depth = 0
+		self._depth_by_user: Dict[str, int] = {}
+
+		# counters and recent queue waits (seconds) per priority, reported by stats()
+		self.completed = 0
+		self.rejected = 0
+		self._waits: Dict[int, Deque[float]] = {}
+		self._wait_window = wait_window
+		self._avg_job_sec = None
+
+	def check(self, user_id: str):
+		"""Raises QueueFullError if a job from user_id would be refused now."""
+		if self.running < self.concurrency and self._depth == 0:
+			return
+		if self._depth >= self.max_depth:
+			self.rejected += 1
+			raise QueueFullError(f"LLM queue is full ({self._depth} jobs waiting)", self.retry_after())
+		if self._depth_by_user.get(user_id, 0) >= self.max_per_user:
+			self.rejected += 1
+			raise QueueFullError(f"Too many summary jobs waiting for user {user_id}", self.retry_after())
+
+	@asynccontextmanager
+	async def slot(self, user_id: str, priority: int = DEFAULT_PRIORITY):
+		"""
+		Waits for a slot (or raises QueueFullError) and holds it for the body of the with block.
+		"""
+		self.check(user_id)
+		waiter = None
+		if self.running < self.concurrency and self._depth == 0:
+			self.running += 1
+			self._record_wait(priority, 0.0)
+		else:
+			waiter = _Waiter(user_id, priority)
+			self._enqueue(waiter)
+			try:
+				await waiter.granted
+			except asyncio.CancelledError:
+				if waiter.granted.done() and not waiter.granted.cancelled():
+					# granted just as the caller went away: pass the slot on
+					self._release()
+				else:
+					self._remove(waiter)
+				raise
+
+		started = time.monotonic()
+		try:
+			yield
+		finally:
+			duration = time.monotonic() - started
+			self._avg_job_sec = duration if self._avg_job_sec is None else 0.8 * self._avg_job_sec + 0.2 * duration
+			self.completed += 1
+			self._release()
+
+	def retry_after(self) -> int:
+		avg_job_sec = self._avg_job_sec if self._avg_job_sec is not None else 10.0
+		return max(1, math.ceil(avg_job_sec * (self._depth + self.running) / self.concurrency))
+
+	def _enqueue(self, waiter: _Waiter):
+		users = self._queues.setdefault(waiter.priority, OrderedDict())
+		users.setdefault(waiter.user_id, deque()).append(waiter)
+		self._depth += 1
+		self._depth_by_user[waiter.user_id] = self._depth_by_user.get(waiter.user_id, 0) + 1
+
+	def _remove(self, waiter: _Waiter):
+		users = self._queues.get(waiter.priority, {})
+		waiters = users.get(waiter.user_id)
+		if waiters is None or waiter not in waiters:
+			return
+		waiters.remove(waiter)
+		if not waiters:
+			del users[waiter.user_id]
+		self._dequeued(waiter)
+
+	def _dequeued(self, waiter: _Waiter):
+		self._depth -= 1
+		self._depth_by_user[waiter.user_id] -= 1
+		if not self._depth_by_user[waiter.user_id]:
+			del self._depth_by_user[waiter.user_id]
+
+	def _release(self):
+		self.running -= 1
+		while self.running < self.concurrency:
+			waiter = self._next_waiter()
+			if waiter is None:
+				return
+			if waiter.granted.cancelled():
+				continue
+			self.running += 1
+			self._record_wait(waiter.priority, time.monotonic() - waiter.enqueued_at)
+			waiter.granted.set_result(None)
+
+	def _next_waiter(self) -> Optional[_Waiter]:
+		for priority in sorted(self._queues):
+			users = self._queues[priority]
+			if not users:
+				continue
+			user_id, waiters = next(iter(users.items()))
+			waiter = waiters.popleft()
+			# the user goes to the back of this class until their next turn
+			del users[user_id]
+			if waiters:
+				users[user_id] = waiters
+			self._dequeued(waiter)
+			return waiter
+		return None
+
+	def _record_wait(self, priority: int, wait_sec: float):
+		self._waits.setdefault(priority, deque(maxlen=self._wait_window)).append(wait_sec)
+
+	def stats(self) -> dict:
+		queue_wait = {}
+		for priority, waits in sorted(self._waits.items()):
+			ordered = sorted(waits)
+			queue_wait[priority] = {
+				"jobs": len(ordered),
+				"avg_ms": 1000 * sum(ordered) / len(ordered),
+				"p95_ms": 1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+				"max_ms": 1000 * ordered[-1],
+			}
+		return {
+			"running": self.running,
+			"waiting": self._depth,
+			"completed": self.completed,
+			"rejected": self.rejected,
+			"avg_job_sec": self._avg_job_sec,
+			# over the last wait_window jobs of each priority
+			"queue_wait": queue_wait,
+		}
@@ -0,0 +1,86 @@
+import json
+import logging
+from typing import AsyncIterator
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+
+
+class ThinkStripper:
+	"""
+	Removes <think>...</think> reasoning from a model's output as it streams in, so only the answer is
+	forwarded. Tags may be split across chunks: a chunk ending in what could be the start of a tag is
+	held back until the next one shows whether it is. Whitespace right after a reasoning block is dropped.
+	"""
+
+	def __init__(self):
+		self.in_think = False
+		self._pending = ''
+		self._after_think = False
+
+	def feed(self, chunk: str) -> str:
+		"""Returns the visible text that chunk completes (possibly empty)."""
+		text = self._pending + chunk
+		self._pending = ''
+		visible = []
+		while text:
+			tag = THINK_CLOSE if self.in_think else THINK_OPEN
+			index = text.find(tag)
+			if index >= 0:
+				if not self.in_think:
+					visible.append(self._visible(text[:index]))
+				text = text[index + len(tag):]
+				self.in_think = not self.in_think
+				self._after_think = not self.in_think
+				continue
+			held = _partial_tag_length(text, tag)
+			if not self.in_think:
+				visible.append(self._visible(text[:len(text) - held]))
+			self._pending = text[len(text) - held:]
+			break
+		return ''.join(visible)
+
+	def flush(self) -> str:
+		"""Text held back at the end of the stream; an unterminated reasoning block is dropped."""
+		text, self._pending = self._pending, ''
+		return '' if self.in_think else self._visible(text)
+
+	def _visible(self, text: str) -> str:
+		if self._after_think:
+			text = text.lstrip()
+			self._after_think = not text
+		return text
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+	"""Length of the longest suffix of text that is a proper prefix of tag."""
+	for length in range(min(len(tag) - 1, len(text)), 0, -1):
+		if text.endswith(tag[:length]):
+			return length
+	return 0
+
+
+async def stream_chat(client: httpx.AsyncClient, url: str, payload: dict) -> AsyncIterator[str]:
+	"""
+	Posts a chat request to Ollama with streaming on and yields the message content of each NDJSON line
+	as it arrives. Raises httpx.HTTPStatusError for a non-200 response and RuntimeError for an error line.
+	"""
+	async with client.stream("POST", url, json={**payload, "stream": True}) as response:
+		if response.status_code != 200:
+			await response.aread()
+			response.raise_for_status()
+		async for line in response.aiter_lines():
+			if not line.strip():
+				continue
+			data = json.loads(line)
+			if "error" in data:
+				raise RuntimeError(data["error"])
+			content = data.get("message", {}).get("content", "")
+			if content:
+				yield content
+			if data.get("done"):
+				return
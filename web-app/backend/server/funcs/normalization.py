@@ -0,0 +1,228 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Iterable, List, Optional, Pattern, Tuple
+
+# keywords for rules that only apply to text containing a digit
+DIGITS = tuple('0123456789')
+
+# (start, end, replacement length) of one edit in the text a rule was given
+Edit = Tuple[int, int, int]
+# an output token and the span (first, last) of source tokens it came from; (-1, -1) if it was inserted
+TracedToken = Tuple[str, int, int]
+
+
+@dataclass
+class NormalizationRule:
+	name: str
+	# substitution rules: a function returning the compiled pattern, and a template or function of the match
+	pattern: Optional[Callable[[], Pattern]] = None
+	replacement: Any = None
+	# all other rules: text -> text
+	function: Optional[Callable[[str], str]] = None
+	keywords: Optional[Tuple[str, ...]] = None
+
+	def applies_to(self, text: str) -> bool:
+		if self.keywords is None:
+			return True
+		lowered = text.lower()
+		return any(keyword in lowered for keyword in self.keywords)
+
+	def apply(self, text: str) -> Tuple[str, int]:
+		"""Returns the new text and the number of hits."""
+		if not self.applies_to(text):
+			return text, 0
+		if self.function is not None:
+			result = self.function(text)
+			return result, int(result != text)
+		return self.pattern().subn(self.replacement, text)
+
+	def apply_traced(self, text: str) -> Tuple[str, int, List[Edit]]:
+		"""Like apply, but also returns the edits that turned text into the result."""
+		if not self.applies_to(text):
+			return text, 0, []
+		if self.function is not None:
+			result = self.function(text)
+			return result, int(result != text), _single_edit(text, result)
+
+		edits = []
+
+		def record(match):
+			if callable(self.replacement):
+				replacement = self.replacement(match)
+				edits.append((match.start(), match.end(), len(replacement)))
+				return replacement
+			replacement, match_edits = _expand_traced(match, self.replacement)
+			edits.extend(match_edits)
+			return replacement
+
+		# a template match can make several edits (or none), so hits count matches as in apply
+		result, hits = self.pattern().subn(record, text)
+		return result, hits, edits
+
+
+def regex_rule(name: str, pattern, replacement, flags=re.IGNORECASE, keywords: Optional[Tuple[str, ...]] = None) -> NormalizationRule:
+	"""
+	A substitution compiled once; every match counts as a hit. `replacement` is a template or a function
+	of the match, as for re.sub. `pattern` may also be a function returning the current compiled pattern,
+	for tables that are reloaded at runtime. With `keywords` (lowercase), the text is only scanned when it
+	contains one of them - a cheap substring test that lets most rules skip most transcripts.
+	"""
+	if callable(pattern):
+		return NormalizationRule(name, pattern=pattern, replacement=replacement, keywords=keywords)
+	compiled = re.compile(pattern, flags)
+	return NormalizationRule(name, pattern=lambda: compiled, replacement=replacement, keywords=keywords)
+
+
+def function_rule(name: str, function: Callable[[str], str]) -> NormalizationRule:
+	"""
+	A rule that is not a single substitution; it counts a hit whenever it changes the text. When traced,
+	whatever lies between the unchanged prefix and suffix counts as one edit, so these should make at most
+	one local change (or replace the whole text).
+	"""
+	return NormalizationRule(name, function=function)
+
+
+# a group reference in a replacement template: \N or \g<name or N>
+TEMPLATE_GROUP_PATTERN = re.compile(r'\\(\d+)|\\g<(\w+)>')
+
+
+@lru_cache(maxsize=None)
+def _template_pieces(template: str) -> Tuple[Tuple[str, Any], ...]:
+	"""The template as ("literal", text) and ("group", number or name) pieces, in order."""
+	pieces = []
+	position = 0
+	for match in TEMPLATE_GROUP_PATTERN.finditer(template):
+		if match.start() > position:
+			pieces.append(("literal", template[position:match.start()]))
+		group = match.group(1) or match.group(2)
+		pieces.append(("group", int(group) if group.isdigit() else group))
+		position = match.end()
+	if position < len(template):
+		pieces.append(("literal", template[position:]))
+	return tuple(pieces)
+
+
+def _expand_traced(match, template: str) -> Tuple[str, List[Edit]]:
+	"""
+	match.expand(template), with the edits as finely as the template allows: text a group reference writes
+	back unchanged keeps its own origins, and only the literal parts replace the text between the groups.
+	Falls back to one edit for the whole match when the groups are re-emitted out of order, twice, or
+	did not take part in the match.
+	"""
+	replacement = match.expand(template)
+	edits = []
+	position = match.start()
+	literal = ""
+	for kind, value in _template_pieces(template):
+		if kind == "literal":
+			# expand() resolves escapes such as \n in the literal parts
+			literal += match.expand(value)
+			continue
+		group_start, group_end = match.span(value)
+		if group_start < position:
+			return replacement, [(match.start(), match.end(), len(replacement))]
+		if group_start > position or literal:
+			edits.append((position, group_start, len(literal)))
+		literal = ""
+		position = group_end
+	if match.end() > position or literal:
+		edits.append((position, match.end(), len(literal)))
+	return replacement, edits
+
+
+def _single_edit(text: str, result: str) -> List[Edit]:
+	if result == text:
+		return []
+	limit = min(len(text), len(result))
+	prefix = 0
+	while prefix < limit and text[prefix] == result[prefix]:
+		prefix += 1
+	suffix = 0
+	while suffix < limit - prefix and text[-1 - suffix] == result[-1 - suffix]:
+		suffix += 1
+	return [(prefix, len(text) - suffix, len(result) - suffix - prefix)]
+
+
+class NormalizationEngine:
+	"""
+	Runs an ordered table of rules over a transcript. Rules are built (and their patterns compiled) once,
+	when the table is created, and the engine counts how often each one fired.
+
+	apply_traced() also records where every output token came from. Each character of the text carries the
+	span of source tokens (whitespace-separated tokens of the input) it derives from; a rule's edit gives its
+	replacement the combined span of the characters it replaced. Template substitutions only edit their
+	literal parts, so text a group reference writes back keeps its own span. That costs one linear pass
+	per rule that fired, so timings can be carried over to the output without diffing it against the
+	input.
+	"""
+
+	def __init__(self, rules: Iterable[NormalizationRule]):
+		self.rules = list(rules)
+		self.hits = {}
+		for rule in self.rules:
+			if rule.name in self.hits:
+				raise ValueError(f"Duplicate normalization rule name: {rule.name}")
+			self.hits[rule.name] = 0
+		self.transcripts = 0
+
+	def apply(self, text: str) -> str:
+		for rule in self.rules:
+			text, hits = rule.apply(text)
+			if hits:
+				self.hits[rule.name] += hits
+		self.transcripts += 1
+		return text
+
+	def apply_traced(self, text: str) -> Tuple[str, List[TracedToken]]:
+		"""
+		Returns the normalized text and, for each of its whitespace-separated tokens, the span of input
+		tokens it was produced from.
+		"""
+		first, last = _initial_origins(text)
+		for rule in self.rules:
+			text, hits, edits = rule.apply_traced(text)
+			if hits:
+				self.hits[rule.name] += hits
+			if edits:
+				first, last = _apply_edits(first, last, edits)
+		self.transcripts += 1
+		return text, _traced_tokens(text, first, last)
+
+	def stats(self) -> dict:
+		return {"transcripts": self.transcripts, "rule_hits": dict(self.hits)}
+
+
+def _initial_origins(text: str) -> Tuple[List[int], List[int]]:
+	origins = [-1] * len(text)
+	for index, match in enumerate(re.finditer(r'\S+', text)):
+		origins[match.start():match.end()] = [index] * (match.end() - match.start())
+	return origins, list(origins)
+
+
+def _apply_edits(first: List[int], last: List[int], edits: List[Edit]) -> Tuple[List[int], List[int]]:
+	new_first, new_last = [], []
+	position = 0
+	for start, end, length in edits:
+		new_first.extend(first[position:start])
+		new_last.extend(last[position:start])
+		replaced_first = [origin for origin in first[start:end] if origin >= 0]
+		replaced_last = [origin for origin in last[start:end] if origin >= 0]
+		new_first.extend([min(replaced_first) if replaced_first else -1] * length)
+		new_last.extend([max(replaced_last) if replaced_last else -1] * length)
+		position = end
+	new_first.extend(first[position:])
+	new_last.extend(last[position:])
+	return new_first, new_last
+
+
+def _traced_tokens(text: str, first: List[int], last: List[int]) -> List[TracedToken]:
+	tokens = []
+	for match in re.finditer(r'\S+', text):
+		token_first = [origin for origin in first[match.start():match.end()] if origin >= 0]
+		token_last = [origin for origin in last[match.start():match.end()] if origin >= 0]
+		if token_first:
+			tokens.append((match.group(0), min(token_first), max(token_last)))
+		else:
+			tokens.append((match.group(0), -1, -1))
+	return tokens
@@ -0,0 +1,145 @@
+import asyncio
+import struct
+from dataclasses import dataclass
+
+import httpx
+
+# Binary WebSocket audio frames: a fixed 16-byte little-endian header followed by raw PCM.
+#
+#   offset  size  field
+#   0       1     protocol version (PCM_PROTOCOL_VERSION)
+#   1       1     encoding: 1 = int16, 2 = float32 (little-endian samples)
+#   2       1     channels (interleaved)
+#   3       1     flags: bit 0 set on the last frame of an utterance
+#   4       4     session id (u32, chosen by the client)
+#   8       4     sequence number (u32, 0 for the first frame of a session, +1 per frame)
+#   12      4     sample rate in Hz (u32)
+#   16      ...   PCM payload, a whole number of samples for every channel
+PCM_PROTOCOL_VERSION = 1
+PCM_HEADER = struct.Struct("<BBBBIII")
+FLAG_LAST_FRAME = 0x01
+
+# encoding id -> (name used by the audio server, bytes per sample)
+PCM_ENCODINGS = {
+	1: ("int16", 2),
+	2: ("float32", 4),
+}
+
+
+class PcmProtocolError(ValueError):
+	def __init__(self, message: str, session_id: int = None):
+		super().__init__(message)
+		# None when the frame was too short to carry a session id
+		self.session_id = session_id
+
+
+@dataclass
+class PcmFrame:
+	session_id: int
+	sequence: int
+	sample_rate: int
+	encoding: str
+	channels: int
+	is_last: bool
+	payload: bytes
+
+
+def parse_pcm_frame(message: bytes) -> PcmFrame:
+	"""
+	Splits a binary WebSocket message into its header fields and PCM payload, validating both.
+	"""
+	if len(message) < PCM_HEADER.size:
+		raise PcmProtocolError(f"Frame is {len(message)} bytes, shorter than the {PCM_HEADER.size}-byte header")
+
+	version, encoding_id, channels, flags, session_id, sequence, sample_rate = PCM_HEADER.unpack_from(message)
+	if version != PCM_PROTOCOL_VERSION:
+		raise PcmProtocolError(f"Unsupported protocol version {version}", session_id)
+	if encoding_id not in PCM_ENCODINGS:
+		raise PcmProtocolError(f"Unknown encoding {encoding_id}", session_id)
+	if channels < 1:
+		raise PcmProtocolError("Channel count must be at least 1", session_id)
+	if sample_rate < 1:
+		raise PcmProtocolError("Sample rate must be positive", session_id)
+
+	encoding, sample_width = PCM_ENCODINGS[encoding_id]
+	payload = message[PCM_HEADER.size:]
+	if len(payload) % (sample_width * channels):
+		raise PcmProtocolError(f"Payload of {len(payload)} bytes is not a whole number of {encoding} samples", session_id)
+
+	return PcmFrame(
+		session_id=session_id,
+		sequence=sequence,
+		sample_rate=sample_rate,
+		encoding=encoding,
+		channels=channels,
+		is_last=bool(flags & FLAG_LAST_FRAME),
+		payload=payload,
+	)
+
+
+def pack_pcm_frame(session_id: int, sequence: int, sample_rate: int, payload: bytes, encoding: str = "int16", channels: int = 1, is_last: bool = False) -> bytes:
+	"""
+	Builds a binary frame - the client side of parse_pcm_frame.
+	"""
+	encoding_id = next(key for key, (name, _) in PCM_ENCODINGS.items() if name == encoding)
+	flags = FLAG_LAST_FRAME if is_last else 0
+	return PCM_HEADER.pack(PCM_PROTOCOL_VERSION, encoding_id, channels, flags, session_id, sequence, sample_rate) + payload
+
+
+class PcmStreamState:
+	"""
+	Sequence and format bookkeeping for the frames of one session: it must start at sequence 0, count up
+	by one and keep the audio format of its first frame.
+	"""
+
+	def __init__(self, first_frame: PcmFrame):
+		if first_frame.sequence != 0:
+			raise PcmProtocolError(f"Session {first_frame.session_id} must start at sequence 0, got {first_frame.sequence}", first_frame.session_id)
+		self.session_id = first_frame.session_id
+		self.sample_rate = first_frame.sample_rate
+		self.encoding = first_frame.encoding
+		self.channels = first_frame.channels
+		self.next_sequence = 0
+
+	@property
+	def params(self) -> dict:
+		"""Audio format as the audio server's query parameters."""
+		return {"sample_rate": self.sample_rate, "encoding": self.encoding, "channels": self.channels}
+
+	def advance(self, frame: PcmFrame):
+		if frame.sequence != self.next_sequence:
+			raise PcmProtocolError(f"Session {self.session_id} expected sequence {self.next_sequence}, got {frame.sequence}", self.session_id)
+		if (frame.sample_rate, frame.encoding, frame.channels) != (self.sample_rate, self.encoding, self.channels):
+			raise PcmProtocolError(f"Session {self.session_id} changed its audio format mid-stream", self.session_id)
+		self.next_sequence += 1
+
+
+class PcmUpload:
+	"""
+	Streams the PCM payloads of one session to the audio server as the body of a single request,
+	as the frames arrive. The request is sent when the first frame comes in and its body ends with the
+	last frame; `response` resolves to the audio server's reply.
+	"""
+
+	def __init__(self, client: httpx.AsyncClient, url: str, first_frame: PcmFrame):
+		self.state = PcmStreamState(first_frame)
+		self.session_id = first_frame.session_id
+		self._payloads = asyncio.Queue()
+		self.response = asyncio.create_task(client.post(url, params=self.state.params, content=self._body()))
+
+	async def _body(self):
+		while True:
+			payload = await self._payloads.get()
+			if payload is None:
+				return
+			yield payload
+
+	def add(self, frame: PcmFrame):
+		self.state.advance(frame)
+		if frame.payload:
+			self._payloads.put_nowait(frame.payload)
+		if frame.is_last:
+			self._payloads.put_nowait(None)
+
+	def abort(self):
+		self.response.cancel()
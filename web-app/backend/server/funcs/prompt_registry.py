@@ -0,0 +1,59 @@
+import os
+import re
+import threading
+import logging
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+DEFAULT_PROMPT = "You will summarize the meeting transcription provided."
+
+# summary modes name files prompt_{mode}; anything else could point outside the prompt directory
+MODE_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class PromptRegistry:
+	"""
+	System prompts by summary mode, read from prompt_{mode} files in prompt_dir. Each prompt is read once
+	and then served from memory; a get() only stats the file, and re-reads it when its mtime changed, so
+	prompts can be edited on a running server.
+	"""
+
+	def __init__(self, prompt_dir: str = PROMPT_DIR):
+		self.prompt_dir = prompt_dir
+		self._lock = threading.Lock()
+		# mode -> (mtime, prompt)
+		self._prompts: Dict[str, Tuple[float, str]] = {}
+
+	def load(self):
+		"""Reads every prompt file in the directory."""
+		for name in sorted(os.listdir(self.prompt_dir)):
+			if name.startswith('prompt_'):
+				self.get(name[len('prompt_'):])
+		logger.info(f"Loaded summary prompts: {', '.join(self._prompts) or 'none'}")
+
+	def get(self, summary_mode: str) -> str:
+		if not MODE_PATTERN.match(summary_mode):
+			logger.warning(f"Invalid summary mode: {summary_mode!r}. Using default prompt.")
+			return DEFAULT_PROMPT
+		file_path = os.path.join(self.prompt_dir, f"prompt_{summary_mode}")
+		try:
+			mtime = os.path.getmtime(file_path)
+		except OSError:
+			logger.warning(f"System prompt file not found: {file_path}. Using default prompt.")
+			return DEFAULT_PROMPT
+
+		cached = self._prompts.get(summary_mode)
+		if cached is not None and cached[0] == mtime:
+			return cached[1]
+		with self._lock:
+			with open(file_path, 'r') as file:
+				prompt = file.read()
+			self._prompts[summary_mode] = (mtime, prompt)
+		if cached is not None:
+			logger.info(f"Reloaded system prompt {file_path}")
+		return prompt
+
+
+prompt_registry = PromptRegistry()
@@ -0,0 +1,161 @@
+import asyncio
+import copy
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .llm_stream import ThinkStripper
+
+# the report is returned in triple backticks, optionally tagged as json
+REPORT_BLOCK_PATTERN = re.compile(r'```(?:json)?\s*(\{.*\})\s*```', re.DOTALL)
+
+# path of keys from the report root to a list, e.g. ("situation_report", "status")
+ListPath = Tuple[str, ...]
+
+
+def extract_report(content: str) -> Optional[dict]:
+	"""
+	The JSON report in an LLM reply: the fenced block the prompts ask for, or failing that everything
+	from the first { to the last }. <think> reasoning is ignored. Returns None if there is no valid JSON object.
+	"""
+	stripper = ThinkStripper()
+	content = stripper.feed(content) + stripper.flush()
+	match = REPORT_BLOCK_PATTERN.search(content)
+	if match:
+		candidate = match.group(1)
+	else:
+		start, end = content.find('{'), content.rfind('}')
+		if start < 0 or end < start:
+			return None
+		candidate = content[start:end + 1]
+	try:
+		report = json.loads(candidate)
+	except json.JSONDecodeError:
+		return None
+	return report if isinstance(report, dict) else None
+
+
+def _list_paths(report: dict, prefix: ListPath = ()) -> List[ListPath]:
+	paths = []
+	for key, value in report.items():
+		if isinstance(value, list):
+			paths.append(prefix + (key,))
+		elif isinstance(value, dict):
+			paths.extend(_list_paths(value, prefix + (key,)))
+	return paths
+
+
+def _get_path(report: dict, path: ListPath) -> list:
+	for key in path:
+		report = report[key]
+	return report
+
+
+class SummarySession:
+	"""
+	Server-side state of one rolling summary: the structured report the LLM keeps updating, so each
+	update sends only the new transmissions plus that report instead of the whole session.
+
+	The report is kept within max_chars of JSON by compaction: while it is too large, the oldest entry of
+	its longest list (status bullets, actions taken, agenda items...) is moved to an archive that is no
+	longer sent to the model, keeping at least keep_recent entries per list in the prompt. Archived entries
+	are never rewritten or dropped; full_report() puts them back in front of the live ones, so the report
+	the client gets keeps every detail while the prompt, and the cost of each update, stays bounded.
+	"""
+
+	def __init__(self, summary_mode: str, max_chars: int = 4000, keep_recent: int = 3):
+		self.summary_mode = summary_mode
+		self.max_chars = max_chars
+		self.keep_recent = keep_recent
+		self.report = None
+		self.archive = {}
+		self.updates = 0
+		self.compactions = 0
+		self.last_used = time.time()
+		# updates of one session run one at a time, each on the report the previous one produced
+		self.lock = asyncio.Lock()
+
+	def prompt_report(self) -> Optional[str]:
+		"""The live report as sent to the LLM, or None before the first update."""
+		if self.report is None:
+			return None
+		return json.dumps(self.report, separators=(',', ':'))
+
+	def apply(self, content: str) -> bool:
+		"""
+		Takes the report out of an LLM reply and compacts it. Returns False (and keeps the previous report)
+		if the reply has none.
+		"""
+		report = extract_report(content)
+		if report is None:
+			return False
+		self.report = report
+		self.updates += 1
+		self.compact()
+		return True
+
+	def compact(self):
+		while len(self.prompt_report()) > self.max_chars:
+			candidates = [path for path in _list_paths(self.report) if len(_get_path(self.report, path)) > self.keep_recent]
+			if not candidates:
+				return
+			path = max(candidates, key=lambda path: len(_get_path(self.report, path)))
+			self.archive.setdefault(path, []).append(_get_path(self.report, path).pop(0))
+			self.compactions += 1
+
+	def full_report(self) -> Optional[dict]:
+		"""The live report with archived entries restored in front of the entries of the same list."""
+		if self.report is None:
+			return None
+		report = copy.deepcopy(self.report)
+		for path, archived in self.archive.items():
+			parent = report
+			for key in path[:-1]:
+				parent = parent.setdefault(key, {})
+				if not isinstance(parent, dict):
+					break
+			else:
+				live = parent.get(path[-1])
+				parent[path[-1]] = archived + (live if isinstance(live, list) else [])
+		return report
+
+
+class SummarySessionStore:
+	"""
+	Rolling summary sessions by (user, session id, summary mode); sessions idle for longer than ttl_sec are dropped.
+	"""
+
+	def __init__(self, max_chars: int = 4000, keep_recent: int = 3, ttl_sec: float = 12 * 3600):
+		self.max_chars = max_chars
+		self.keep_recent = keep_recent
+		self.ttl_sec = ttl_sec
+		self._sessions: Dict[Tuple[str, str, str], SummarySession] = {}
+
+	def get(self, user_id: str, session_id: str, summary_mode: str) -> SummarySession:
+		self._expire()
+		key = (user_id, session_id, summary_mode)
+		session = self._sessions.get(key)
+		if session is None:
+			session = self._sessions[key] = SummarySession(summary_mode, self.max_chars, self.keep_recent)
+		session.last_used = time.time()
+		return session
+
+	def drop(self, user_id: str, session_id: str) -> int:
+		"""Forgets a session (in every summary mode); returns how many were dropped."""
+		keys = [key for key in self._sessions if key[:2] == (user_id, session_id)]
+		for key in keys:
+			del self._sessions[key]
+		return len(keys)
+
+	def stats(self) -> dict:
+		return {
+			"sessions": len(self._sessions),
+			"updates": sum(session.updates for session in self._sessions.values()),
+			"compactions": sum(session.compactions for session in self._sessions.values()),
+		}
+
+	def _expire(self):
+		cutoff = time.time() - self.ttl_sec
+		for key in [key for key, session in self._sessions.items() if session.last_used < cutoff and not session.lock.locked()]:
+			del self._sessions[key]
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_content(text: str) -> str:
+	"""Whitespace-insensitive form of a prompt, so resent text that differs only in spacing hits the cache."""
+	return re.sub(r'\s+', ' ', text).strip()
+
+
+class SummaryCache:
+	"""
+	In-memory LRU cache of LLM summary replies with a TTL, so a request resent on reconnect or retry is
+	answered without another round trip to Ollama.
+
+	Keys hash everything that determines the reply: the model, its options and every message (the system
+	prompt, and the user content with whitespace normalized). Replies are stored serialized and every get returns
+	a fresh copy, so callers may modify what they get.
+	"""
+
+	def __init__(self, max_entries: int = 256, ttl_sec: float = 600.0):
+		self.max_entries = max_entries
+		self.ttl_sec = ttl_sec
+		# key -> (expires_at, serialized reply), least recently used first
+		self._entries = OrderedDict()
+
+		# counters reported by stats()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	@staticmethod
+	def make_key(payload: dict) -> str:
+		key = {
+			"model": payload.get("model"),
+			"options": payload.get("options"),
+			# only what users send is normalized; system prompts come verbatim from the prompt files
+			"messages": [
+				(message["role"], normalize_content(message["content"]) if message["role"] == "user" else message["content"])
+				for message in payload.get("messages", [])
+			],
+		}
+		return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+	def get(self, key: str) -> Optional[dict]:
+		entry = self._entries.get(key)
+		if entry is not None and entry[0] < time.time():
+			del self._entries[key]
+			entry = None
+		if entry is None:
+			self.misses += 1
+			return None
+		self._entries.move_to_end(key)
+		self.hits += 1
+		return json.loads(entry[1])
+
+	def put(self, key: str, reply: dict):
+		if self.max_entries <= 0:
+			return
+		self._entries.pop(key, None)
+		self._entries[key] = (time.time() + self.ttl_sec, json.dumps(reply))
+		while len(self._entries) > self.max_entries:
+			self._entries.popitem(last=False)
+			self.evictions += 1
+
+	def stats(self) -> dict:
+		lookups = self.hits + self.misses
+		return {
+			"entries": len(self._entries),
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"hit_rate": self.hits / lookups if lookups else 0.0,
+		}
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def merge_transcriptions(older: str, newer: str) -> str:
+	"""
+	The transcriptions of two superseded requests as one: the newer text alone if it already contains the
+	older one (a retry, or a client resending everything so far), otherwise both in order.
+	"""
+	if not older or older in newer:
+		return newer
+	if not newer or newer in older:
+		return older
+	return f"{older}\n{newer}"
+
+
+class _KeyState:
+	def __init__(self):
+		self.request = None
+		self.future: Optional[asyncio.Future] = None
+		self.worker: Optional[asyncio.Task] = None
+		self.last_started = float('-inf')
+
+
+class SummaryCoalescer:
+	"""
+	Runs at most one summary per key (user, session, mode) at a time, and starts them at least
+	min_interval_sec apart.
+
+	A request that arrives while another is running for its key waits for the next slot. Requests that
+	arrive before that slot opens are folded into one with merge(older, newer), and every caller gets the
+	result of that single run, so a burst of near-identical requests costs one LLM call. A run is never
+	cancelled for a newer request, because its reply (and any session state it updates) is still needed;
+	callers that go away simply stop waiting for it.
+	"""
+
+	def __init__(
+		self,
+		run: Callable[[Hashable, Any], Awaitable[Any]],
+		merge: Callable[[Any, Any], Any],
+		min_interval_sec: float = 2.0,
+	):
+		self.run = run
+		self.merge = merge
+		self.min_interval_sec = min_interval_sec
+		self._keys: Dict[Hashable, _KeyState] = {}
+
+		# counters reported by stats()
+		self.submitted = 0
+		self.coalesced = 0
+		self.runs = 0
+
+	async def submit(self, key: Hashable, request) -> Any:
+		state = self._keys.setdefault(key, _KeyState())
+		self.submitted += 1
+		if state.future is None:
+			state.request = request
+			state.future = asyncio.get_running_loop().create_future()
+		else:
+			state.request = self.merge(state.request, request)
+			self.coalesced += 1
+		future = state.future
+		if state.worker is None:
+			state.worker = asyncio.create_task(self._drain(key, state))
+		# a caller going away must not cancel a run others are waiting on
+		return await asyncio.shield(future)
+
+	async def _drain(self, key: Hashable, state: _KeyState):
+		try:
+			while state.future is not None:
+				delay = state.last_started + self.min_interval_sec - time.monotonic()
+				if delay > 0:
+					await asyncio.sleep(delay)
+				request, future = state.request, state.future
+				state.request, state.future = None, None
+				state.last_started = time.monotonic()
+				self.runs += 1
+				try:
+					future.set_result(await self.run(key, request))
+				except Exception as e:
+					future.set_exception(e)
+					# every caller may have gone; do not leave "exception was never retrieved" behind
+					future.exception()
+		finally:
+			state.worker = None
+			# keep the state until its interval has passed, so the next request still waits for it
+			asyncio.get_running_loop().call_later(self.min_interval_sec, self._forget, key, state)
+
+	def _forget(self, key: Hashable, state: _KeyState):
+		if self._keys.get(key) is state and state.worker is None and state.future is None:
+			del self._keys[key]
+
+	def stats(self) -> dict:
+		return {
+			"keys": len(self._keys),
+			"submitted": self.submitted,
+			"coalesced": self.coalesced,
+			"runs": self.runs,
+		}
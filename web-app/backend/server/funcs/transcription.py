@@ -1,10 +1,11 @@
-import pandas as pd
 import re
 import logging
 from fuzzywuzzy import fuzz, process
 from collections import defaultdict
 import difflib
 from .lists import nato  # Removed number_mapping import
+from .callsign_matcher import callsign_matcher
+from .normalization import DIGITS, NormalizationEngine, function_rule, regex_rule
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -106,176 +107,35 @@ def parse_number(text):
 			return number_str
 
 
-def replace_number_words(transcription):
-	number_words_pattern = r'\b(?:' + '|'.join(number_words) + r')\b(?:\s+\b(?:' + '|'.join(number_words) + r')\b)*'
-	pattern = re.compile(number_words_pattern, flags=re.IGNORECASE)
+# Longest first, so that e.g. "sixty" is never cut short at "six"
+number_word_pattern = r'\b(?:' + '|'.join(sorted(number_words, key=len, reverse=True)) + r')\b'
 
-	def replace_match(match):
-		text = match.group(0)
-		number = parse_number(text)
-		return str(number)
 
-	transcription_before = transcription
-	transcription = pattern.sub(replace_match, transcription)
-	return transcription
-
-
-def remove_and_between_number_words(transcription):
-	number_word_pattern = r'\b(?:' + '|'.join(number_words) + r')\b'
-	pattern = re.compile(rf'({number_word_pattern})\s+and\s+({number_word_pattern})', flags=re.IGNORECASE)
-	transcription_before = transcription
-	transcription = pattern.sub(r'\1 \2', transcription)
-	return transcription
-
-
-# ============================
-# 1. Initial Cleanup
-# ============================
-def remove_whisper_artifacts(transcription):
-	artifacts = [
-		(r'\bthanks for watching\b[\.\!\?]?', '', "Removed 'thanks for watching'"),
-		(r'\bfor watching\b[\.\!\?]?', '', "Removed 'for watching'"),
-		# Ignore transcripts that are only 'so', 'so.', 'okay', or 'okay.' regardless of capitalization.
-		(r'^(so|so\.|okay|okay\.)$', '', "Removed trivial artifact ('so', 'okay', etc.)")
-	]
-	for pattern, replacement, description in artifacts:
-		transcription_before = transcription
-		transcription = re.sub(pattern, replacement, transcription, flags=re.IGNORECASE)
-	transcription = re.sub(r'\s*\.\s*$', '.', transcription)
-	transcription = re.sub(r'\.\.', '.', transcription)
-	transcription = transcription.strip()
-	return transcription
-
-
-# ============================
-# 2. Standardize Units and Directions
-# ============================
-def standardize_units(transcription):
-	transcription_before = transcription
-	transcription = transcription.replace(' feet', 'ft')
-	transcription = transcription.replace(' knots', 'kts')
-	return transcription
-
-
-def standardize_directions(transcription):
-	transformations = [
-		(r'\b(\d+)\s+left\b', r'\1L', "Transformed 'left' to 'L'"),
-		(r'\b(\d+)\s+right\b', r'\1R', "Transformed 'right' to 'R'"),
-		(r'\b(\d+)\s+centre\b', r'\1C', "Transformed 'centre' to 'C'"),
-		(r'\b(\d+)\s+center\b', r'\1C', "Transformed 'center' to 'C'"),
-	]
-	for pattern, replacement, description in transformations:
-		transcription_before = transcription
-		transcription = re.sub(pattern, replacement, transcription, flags=re.IGNORECASE)
-	transcription = re.sub(r'(\d+)\s+([LRC])\b', r'\1\2', transcription, flags=re.IGNORECASE)
-	return transcription
+def replace_number_match(match):
+	return parse_number(match.group(0))
 
 
 # ============================
-# 3. Specific Patterns and Mappings
+# Rules that are not single substitutions
 # ============================
-def capitalize_nato_and_first_word(transcription):
-	nato_pattern = r'\b(' + '|'.join(nato) + r')\b'
-	transcription_before = transcription
-	transcription = re.sub(
-		nato_pattern,
-		lambda match: match.group(0).capitalize(),
-		transcription,
-		flags=re.IGNORECASE
-	)
-	return transcription
-
-
-def replace_zulu_with_z(transcription):
-	transcription_before = transcription
-	transcription = re.sub(
-		r'\b(\d+)\s*Zulu\b',
-		r'\1Z',
-		transcription,
-		flags=re.IGNORECASE
-	)
-	return transcription
-
-
-def handle_gocat(transcription):
-	transcription_before = transcription
-	transcription = re.sub(r'\bgocat\s*(\d+)\b', r'TGW\1', transcription, flags=re.IGNORECASE)
-	transcription = re.sub(r'\bgocad\s*(\d+)\b', r'TGW\1', transcription, flags=re.IGNORECASE)
-
-	return transcription
-
-
-# ============================
-# 4. Number Handling and Formatting
-# ============================
-def combine_adjacent_digits_for_callsigns(transcription):
-	digit_patterns = [
-		(r'\b(\d)\s+(\d)\s+(\d)\s+(\d)\b', r'\1\2\3\4', "Combined four adjacent digits"),
-		(r'\b(\d)\s+(\d)\s+(\d)(?=\s|$|[A-Za-z])', r'\1\2\3', "Combined three adjacent digits"),
-	]
-	for pattern, replacement, description in digit_patterns:
-		transcription_before = transcription
-		transcription = re.sub(pattern, replacement, transcription, flags=re.IGNORECASE)
-	return transcription
-
-
-def combine_letter_and_number(transcription):
-	transcription_before = transcription
-	transcription = re.sub(r'\b([A-Z])\s+(\d+)\b', r'\1\2', transcription, flags=re.IGNORECASE)
-	return transcription
-
-
-def handle_flight_levels(transcription):
-	transcription_before = transcription
-	transcription = re.sub(
-		r'\bflight level\s*(\d{3})(?=\s|\.|,|$)',
-		r'FL\1',
-		transcription,
-		flags=re.IGNORECASE
-	)
-	transcription_before = transcription
-	transcription = re.sub(
-		r'(FL\d{3})(?=\d)',
-		r'\1 ',
-		transcription,
-		flags=re.IGNORECASE
-	)
-	return transcription
-
-
-def handle_squawk_codes(transcription):
-	transcription_before = transcription
-	transcription = re.sub(
-		r'\bsquawk\s+(\d)\s*(\d)\s*(\d)\s*(\d)\b',
-		r'squawk \1\2\3\4',
-		transcription,
-		flags=re.IGNORECASE
-	)
-	return transcription
-
-
-def combine_numbers_with_units(transcription):
-	combinations = [
-		(r'(\d{1,2})\s+(\d{2,3})\s*ft\b', r'\1\2ft', "Combined numbers with 'ft'"),
-		(r'(\d{1,2})\s+(\d{2,3})\s*kts\b', r'\1\2kts', "Combined numbers with 'kts'"),
-		(r'(\d{1,2})\s+(00|000)\b', r'\1\2', "Combined numbers with '00' or '000'"),
-	]
-	for pattern, replacement, description in combinations:
-		transcription_before = transcription
-		transcription = re.sub(pattern, replacement, transcription, flags=re.IGNORECASE)
-	return transcription
-
-
-def replace_point_or_decimal(transcription):
-	transcription_before = transcription
-	transcription = re.sub(r'\s*(point|decimal)\s*', '.', transcription, flags=re.IGNORECASE)
-	return transcription
+decimal_followup_pattern = re.compile(r'(\d+\.\d{1,2})\s*(\d+)')
+repeated_word_pattern = re.compile(r'\b(\w+)(\s+\1){3,}\b')
+false_activation_phrases = frozenset([
+	'you', 'bye', '.', 'bye bye', 'thank you',
+	'thank you.', 'thank you very much', 'thank you very much..',
+	'thank you very much.', 'thank you so much', 'thank you so much.',
+	'so', 'so.', 'okay', 'okay.'
+])
+misheard_words = {
+	"soles": "souls",
+	"rodger": "roger",
+	"Everett": "Emirates",
+	"tree": "three",
+}
 
 
 def handle_decimal_followups(transcription):
-	transcription_before = transcription
-	pattern = r'(\d+\.\d{1,2})\s*(\d+)'
-	matches = re.findall(pattern, transcription)
+	matches = decimal_followup_pattern.findall(transcription)
 
 	for match in matches:
 		full_number, follow_up = match
@@ -296,125 +156,165 @@ def handle_decimal_followups(transcription):
 	return transcription
 
 
-# ============================
-# 5. General Number and Pattern Handling
-# ============================
-def combine_remaining_adjacent_digits(transcription):
-	patterns = [
-		(r'\b(\d)\s+(\d+)\b', r'\1\2', "Combined single digit with multi-digit number"),
-		(r'\b(\d)\s+(\d)([A-Z])\b', r'\1\2\3', "Combined digits and letter for runway designations"),
-	]
-	for pattern, replacement, description in patterns:
-		transcription_before = transcription
-		transcription = re.sub(pattern, replacement, transcription, flags=re.IGNORECASE)
-	return transcription
-
-
-# ============================
-# 6. Final Cleanup and Validation
-# ============================
 def validate_transcription(transcription):
-	repeated_pattern = r'\b(\w+)(\s+\1){3,}\b'
-	if (re.search(repeated_pattern, transcription) or
-			transcription.lower() in [
-				'you', 'bye', '.', 'bye bye', 'thank you',
-				'thank you.', 'thank you very much', 'thank you very much..',
-				'thank you very much.', 'thank you so much', 'thank you so much.',
-				'so', 'so.', 'okay', 'okay.'
-			] or
+	if (repeated_word_pattern.search(transcription) or
+			transcription.lower() in false_activation_phrases or
 			(len(transcription.split()) == 1 and 'FL' not in transcription)):
 		return "false activation"
 	return transcription
 
 
 def handle_icao_callsign(transcription):
-	parquet_file = './server/funcs/aircraft_callsign.parquet'
-	df = pd.read_parquet(parquet_file)
-
-	def replace_callsign_with_icao(text: str, df: pd.DataFrame) -> str:
-		callsign_to_icao = dict(zip(df['Callsign'], df['ICAO']))
-		for callsign, icao in callsign_to_icao.items():
-			pattern = r'\b' + re.escape(callsign) + r'\b\s*(\d+)'
-			replacement = icao + r'\1'
-			text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-		return text
-
-	transcription = replace_callsign_with_icao(transcription, df)
-	return transcription
+	return callsign_matcher.replace(transcription)
 
 
 def capitalize_first_word(transcription):
-	transcription_before = transcription
 	if transcription:
 		transcription = transcription[0].upper() + transcription[1:]
 	return transcription
 
 
-def validate_atc_transcription(transcription):
-	misheard_words = {
-		"soles": "souls",
-		"rodger": "roger",
-		"Everett": "Emirates",
-		"tree": "three",
-	}
-	words = transcription.split()
-	corrected_words = []
-	for word in words:
-		corrected_words.append(misheard_words.get(word, word))
-	transcription = ' '.join(corrected_words)
-	return transcription
-
-
 # ============================
-# Main Transformation Function
+# Rule Table
 # ============================
-def apply_custom_fixes(transcription):
-	logging.info(f"Original transcription: {YELLOW}'{transcription}'{RESET}")
+direction_letters = {'left': 'L', 'right': 'R', 'centre': 'C', 'center': 'C'}
+unit_abbreviations = {'feet': 'ft', 'knots': 'kts'}
 
+# Applied in this order by apply_custom_fixes; every pattern is compiled once, here.
+normalization_engine = NormalizationEngine([
 	# 1. Initial Cleanup
-	transcription = remove_whisper_artifacts(transcription)
-	transcription = replace_point_or_decimal(transcription)
-	transcription = remove_and_between_number_words(transcription)
-	transcription = replace_number_words(transcription)
-	transcription = handle_decimal_followups(transcription)
-	transcription = combine_remaining_adjacent_digits(transcription)
+	regex_rule('thanks_for_watching', r'\bthanks for watching\b[\.\!\?]?', '', keywords=('watching',)),
+	regex_rule('for_watching', r'\bfor watching\b[\.\!\?]?', '', keywords=('watching',)),
+	# Ignore transcripts that are only 'so', 'so.', 'okay', or 'okay.' regardless of capitalization.
+	regex_rule('trivial_artifact', r'^(so|so\.|okay|okay\.)$', ''),
+	regex_rule('trailing_period', r'\s*\.\s*$', '.', flags=0),
+	regex_rule('double_period', r'\.\.', '.', flags=0),
+	function_rule('strip', str.strip),
+	regex_rule('point_or_decimal', r'\s*(point|decimal)\s*', '.', keywords=('point', 'decimal')),
+	regex_rule('and_between_number_words', rf'({number_word_pattern})\s+and\s+({number_word_pattern})', r'\1 \2', keywords=('and',)),
+	regex_rule('number_words', rf'{number_word_pattern}(?:\s+{number_word_pattern})*', replace_number_match),
+	function_rule('decimal_followups', handle_decimal_followups),
+	regex_rule('digit_and_number', r'\b(\d)\s+(\d+)\b', r'\1\2', keywords=DIGITS),
+	regex_rule('digits_and_runway_letter', r'\b(\d)\s+(\d)([A-Z])\b', r'\1\2\3', keywords=DIGITS),
 
 	# 3. Specific Patterns
-	transcription = capitalize_nato_and_first_word(transcription)
+	regex_rule('nato_capitalization', r'\b(' + '|'.join(nato) + r')\b', lambda match: match.group(0).capitalize()),
 
 	# 4. Number Handling
-	transcription = combine_adjacent_digits_for_callsigns(transcription)
-	transcription = combine_letter_and_number(transcription)
-	transcription = combine_numbers_with_units(transcription)
+	regex_rule('four_adjacent_digits', r'\b(\d)\s+(\d)\s+(\d)\s+(\d)\b', r'\1\2\3\4', keywords=DIGITS),
+	regex_rule('three_adjacent_digits', r'\b(\d)\s+(\d)\s+(\d)(?=\s|$|[A-Za-z])', r'\1\2\3', keywords=DIGITS),
+	regex_rule('letter_and_number', r'\b([A-Z])\s+(\d+)\b', r'\1\2', keywords=DIGITS),
+	regex_rule('numbers_with_ft', r'(\d{1,2})\s+(\d{2,3})\s*ft\b', r'\1\2ft', keywords=('ft',)),
+	regex_rule('numbers_with_kts', r'(\d{1,2})\s+(\d{2,3})\s*kts\b', r'\1\2kts', keywords=('kts',)),
+	regex_rule('numbers_with_hundreds', r'(\d{1,2})\s+(00|000)\b', r'\1\2', keywords=('00',)),
 
 	# 5. General Number and Pattern Handling
-	transcription = handle_flight_levels(transcription)
-	transcription = handle_squawk_codes(transcription)
-	transcription = handle_gocat(transcription)
+	regex_rule('flight_level', r'\bflight level\s*(\d{3})(?=\s|\.|,|$)', r'FL\1', keywords=('flight level',)),
+	regex_rule('flight_level_spacing', r'(FL\d{3})(?=\d)', r'\1 ', keywords=('fl',)),
+	regex_rule('squawk_code', r'\bsquawk\s+(\d)\s*(\d)\s*(\d)\s*(\d)\b', r'squawk \1\2\3\4', keywords=('squawk',)),
+	regex_rule('gocat', r'\bgoca[td]\s*(\d+)\b', r'TGW\1', keywords=('goca',)),
 
 	# 2. Standardize Units and Directions
-	transcription = standardize_units(transcription)
-	transcription = standardize_directions(transcription)
-	transcription = replace_zulu_with_z(transcription)
+	regex_rule('units', r' (feet|knots)', lambda match: unit_abbreviations[match.group(1)], flags=0, keywords=(' feet', ' knots')),
+	regex_rule('direction_words', r'\b(\d+)\s+(left|right|centre|center)\b', lambda match: match.group(1) + direction_letters[match.group(2).lower()], keywords=('left', 'right', 'cent')),
+	regex_rule('direction_letters', r'(\d+)\s+([LRC])\b', r'\1\2', keywords=DIGITS),
+	regex_rule('zulu', r'\b(\d+)\s*Zulu\b', r'\1Z', keywords=('zulu',)),
 
 	# 6. Final Cleanup and Validation
-	transcription = validate_transcription(transcription)
-	transcription = capitalize_first_word(transcription)
-	transcription = validate_atc_transcription(transcription)
+	function_rule('false_activation', validate_transcription),
+	function_rule('capitalize_first_word', capitalize_first_word),
+	# whitespace, then misheard words token by token, as substitutions so that each one is traced on its own
+	regex_rule('collapse_whitespace', r'\s{2,}|[^\S ]', ' ', flags=0),
+	function_rule('strip_final', str.strip),
+	regex_rule('misheard_words', r'(?<!\S)(' + '|'.join(misheard_words) + r')(?!\S)', lambda match: misheard_words[match.group(1)], flags=0),
 	# 7. Handle Aircraft Callsign
-	transcription = handle_icao_callsign(transcription)
-	logging.info(f"Final transcription: {GREEN}'{transcription}'{RESET}")
+	regex_rule('icao_callsign', callsign_matcher.compiled_pattern, callsign_matcher.replace_match),
+])
+
+
+# ============================
+# Main Transformation Function
+# ============================
+def apply_custom_fixes(transcription, log=True):
+	# log=False for bulk reprocessing (see batch_normalization.py), where per-call logging dominates
+	if log:
+		logging.info("Original transcription: %s'%s'%s", YELLOW, transcription, RESET)
+	transcription = normalization_engine.apply(transcription)
+	if log:
+		logging.info("Final transcription: %s'%s'%s", GREEN, transcription, RESET)
 	return transcription
 
 
+def apply_custom_fixes_traced(transcription, log=True):
+	"""
+	apply_custom_fixes that also returns the engine's edit trace: for every output token, the span of
+	input tokens it came from (see NormalizationEngine.apply_traced).
+	"""
+	if log:
+		logging.info("Original transcription: %s'%s'%s", YELLOW, transcription, RESET)
+	transcription, traced_tokens = normalization_engine.apply_traced(transcription)
+	if log:
+		logging.info("Final transcription: %s'%s'%s", GREEN, transcription, RESET)
+	return transcription, traced_tokens
+
+
 # ============================================
 # New Functions to Update Timestamped Transcripts
 # ============================================
+def carry_word_timings(original_words, traced_tokens):
+	"""
+	Builds the "words" list for the final transcript from the aligner's words and the edit trace of
+	apply_custom_fixes_traced, in a single pass: an output token made from exactly one original word
+	keeps that word's entry with the new text, output tokens made from the same span of words share
+	its time interval evenly, and inserted tokens get a zero-length slot at the end of the previous word.
+	"""
+	new_words = []
+	i = 0
+	while i < len(traced_tokens):
+		final_token, first, last = traced_tokens[i]
+		if first < 0:
+			prev_end = new_words[-1]['end'] if new_words else (original_words[0]['start'] if original_words else 0)
+			new_words.append({
+				'text': final_token,
+				'start': prev_end,
+				'end': prev_end,
+				'duration': 0
+			})
+			i += 1
+			continue
+
+		# all consecutive output tokens that came from the same original words
+		j = i + 1
+		while j < len(traced_tokens) and traced_tokens[j][1:] == (first, last):
+			j += 1
+		if j - i == 1 and first == last:
+			new_word = original_words[first].copy()
+			new_word['text'] = final_token
+			new_words.append(new_word)
+		else:
+			start_time = original_words[first]['start']
+			block_duration = original_words[last]['end'] - start_time
+			num_new = j - i
+			for k, (final_token, _, _) in enumerate(traced_tokens[i:j]):
+				token_start = start_time + (block_duration * k / num_new)
+				token_end = start_time + (block_duration * (k + 1) / num_new)
+				new_words.append({
+					'text': final_token,
+					'start': token_start,
+					'end': token_end,
+					'duration': token_end - token_start
+				})
+		i = j
+	return new_words
+
+
 def update_words_with_final_transcript(original_words, final_transcript):
 	"""
 	Update the "words" list (each with its own timestamps) so that their 'text' values match
 	the final transcript produced by apply_custom_fixes. This function uses difflib to
 	align the original tokens (from the words list) with the final tokens.
+	process_transcript_data only falls back to it when the words do not line up with the
+	transcript's tokens; otherwise carry_word_timings uses the edit trace instead.
 	"""
 	orig_tokens = [w['text'] for w in original_words]
 	final_tokens = final_transcript.split()
@@ -473,14 +373,15 @@ def update_words_with_final_transcript(original_words, final_transcript):
 	return new_words
 
 
-def process_transcript_data(data):
+def process_transcript_data(data, log=True):
 	"""
 	Given a transcript data dictionary (with keys like "text" and "words"), this function:
 	  1. Extracts the transcript from data["text"]
 	  2. Applies the custom fixes to it via apply_custom_fixes()
 	  3. Replaces the old transcript with the new one in data["text"]
 	  4. Updates the "words" list so that each word's "text" reflects the modifications,
-		 while keeping the original timestamps unchanged (or merged appropriately).
+		 while keeping the original timestamps unchanged (or merged appropriately), by
+		 following the edit trace of the normalization rules.
 
 	Also checks if the transcript is empty (or just whitespace). In that case, returns "false activation".
 	"""
@@ -494,8 +395,11 @@ def process_transcript_data(data):
 			data["words"] = update_words_with_final_transcript(data["words"], final_transcript)
 		return data
 
-	final_transcript = apply_custom_fixes(original_transcript)
+	final_transcript, traced_tokens = apply_custom_fixes_traced(original_transcript, log=log)
 	data["text"] = final_transcript
 	if "words" in data:
-		data["words"] = update_words_with_final_transcript(data["words"], final_transcript)
+		if len(data["words"]) == len(original_transcript.split()):
+			data["words"] = carry_word_timings(data["words"], traced_tokens)
+		else:
+			data["words"] = update_words_with_final_transcript(data["words"], final_transcript)
 	return data
\ No newline at end of file
@@ -0,0 +1,77 @@
+# test_batch_normalization.py
+import io
+import multiprocessing
+import sys
+
+from ..funcs import batch_normalization
+from ..funcs.batch_normalization import normalize_batch, read_transcripts
+from ..funcs.transcription import apply_custom_fixes
+
+TRANSCRIPTS = [
+	"climb flight level three five zero",
+	"squawk seven seven zero zero",
+	"runway two seven left cleared to land",
+]
+
+
+def test_results_keep_input_order_and_match_apply_custom_fixes():
+	words = [{"text": "squawk", "start": 0.0, "end": 0.4}, {"text": "one", "start": 0.4, "end": 0.6}]
+	item = {"text": "squawk one", "words": words}
+
+	results = list(normalize_batch(TRANSCRIPTS + [item]))
+
+	assert results[:3] == [apply_custom_fixes(text) for text in TRANSCRIPTS]
+	assert results[3]["text"] == apply_custom_fixes("squawk one")
+	assert [word["start"] for word in results[3]["words"]] == [0.0, 0.4]
+	# the caller's word timings are not modified
+	assert words[1]["text"] == "one"
+
+
+def spy_on_pools(monkeypatch):
+	pools = []
+	real_pool = multiprocessing.Pool
+
+	def pool(processes, **kwargs):
+		pools.append(processes)
+		return real_pool(processes, **kwargs)
+
+	monkeypatch.setattr(batch_normalization.multiprocessing, "Pool", pool)
+	return pools
+
+
+def test_large_inputs_use_a_process_pool(monkeypatch):
+	pools = spy_on_pools(monkeypatch)
+	monkeypatch.setattr(batch_normalization, "PARALLEL_THRESHOLD", 4)
+	items = TRANSCRIPTS * 5
+
+	assert list(normalize_batch(items[:3])) == [apply_custom_fixes(text) for text in items[:3]]
+	assert pools == []
+	assert list(normalize_batch(items, chunksize=2)) == [apply_custom_fixes(text) for text in items]
+	assert pools == [None]
+
+
+def test_explicit_processes_are_honoured_below_the_threshold(monkeypatch):
+	pools = spy_on_pools(monkeypatch)
+	assert list(normalize_batch(TRANSCRIPTS, processes=2, chunksize=1)) == [apply_custom_fixes(text) for text in TRANSCRIPTS]
+	assert list(normalize_batch(TRANSCRIPTS * 1000, processes=1))[:3] == [apply_custom_fixes(text) for text in TRANSCRIPTS]
+	assert pools == [2]
+
+
+def test_read_transcripts_accepts_text_and_json_lines():
+	lines = ["climb flight level three five zero\n", "\n", '{"text": "squawk one", "words": []}\n']
+	assert list(read_transcripts(lines)) == ["climb flight level three five zero", {"text": "squawk one", "words": []}]
+
+
+def test_lines_starting_with_a_brace_may_be_plain_text():
+	lines = ["{inaudible} climb flight level three five zero\n", "{1, 2}\n", "[1, 2]\n"]
+	assert list(read_transcripts(lines)) == ["{inaudible} climb flight level three five zero", "{1, 2}", "[1, 2]"]
+
+
+def test_main_leaves_stdin_and_stdout_open(monkeypatch, capsys):
+	monkeypatch.setattr(sys, "argv", ["batch_normalization", "-"])
+	monkeypatch.setattr(sys, "stdin", io.StringIO("{inaudible} climb flight level three five zero\n"))
+
+	batch_normalization.main()
+
+	assert not sys.stdin.closed and not sys.stdout.closed
+	assert capsys.readouterr().out == apply_custom_fixes("{inaudible} climb flight level three five zero") + "\n"
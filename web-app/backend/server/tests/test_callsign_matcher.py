@@ -0,0 +1,32 @@
+# test_callsign_matcher.py
+import os
+
+import pandas as pd
+from ..funcs.callsign_matcher import CallsignMatcher
+
+
+def write_table(path, rows):
+	pd.DataFrame(rows, columns=["ICAO", "Airline", "Callsign"]).to_parquet(path, index=False)
+
+
+def test_longest_callsign_wins(tmp_path):
+	path = tmp_path / "callsigns.parquet"
+	write_table(path, [("CCA", "Air China", "Air China"), ("CHN", "China", "China"), ("SIA", "Singapore Airlines", "Singapore")])
+	matcher = CallsignMatcher(str(path))
+
+	assert matcher.replace("air china 123 climb") == "CCA123 climb"
+	assert matcher.replace("China 5, contact Singapore 318") == "CHN5, contact SIA318"
+	# a callsign is only rewritten when a flight number follows it
+	assert matcher.replace("Singapore approach") == "Singapore approach"
+
+
+def test_reloads_when_table_changes(tmp_path):
+	path = tmp_path / "callsigns.parquet"
+	write_table(path, [("SIA", "Singapore Airlines", "Singapore")])
+	matcher = CallsignMatcher(str(path))
+	assert matcher.replace("Speedbird 12") == "Speedbird 12"
+
+	write_table(path, [("BAW", "British Airways", "Speedbird")])
+	mtime = os.path.getmtime(path) + 1
+	os.utime(path, (mtime, mtime))
+	assert matcher.replace("Speedbird 12") == "BAW12"
@@ -0,0 +1,62 @@
+# test_llm_queue.py
+import asyncio
+
+import pytest
+from ..funcs.llm_queue import LLMJobQueue, QueueFullError
+
+
+def test_priority_then_round_robin_between_users():
+	order = []
+
+	async def job(queue, user_id, priority, name):
+		async with queue.slot(user_id, priority):
+			order.append(name)
+			await asyncio.sleep(0.01)
+
+	async def scenario():
+		queue = LLMJobQueue(concurrency=1, max_depth=10, max_per_user=5)
+		tasks = [asyncio.create_task(job(queue, "busy", 0, "running"))]
+		await asyncio.sleep(0)
+		# a burst from one user, then one job each from two others; minutes jobs come last
+		for name, user_id, priority in [("busy1", "busy", 0), ("busy2", "busy", 0), ("busy3", "busy", 0),
+										("minutes", "b", 1), ("a1", "a", 0), ("c1", "c", 0)]:
+			tasks.append(asyncio.create_task(job(queue, user_id, priority, name)))
+			await asyncio.sleep(0)
+		await asyncio.gather(*tasks)
+		return queue.stats()
+
+	stats = asyncio.run(scenario())
+	assert order == ["running", "busy1", "a1", "c1", "busy2", "busy3", "minutes"]
+	assert stats["completed"] == 7 and stats["running"] == 0 and stats["waiting"] == 0
+	assert stats["queue_wait"][0]["jobs"] == 6 and stats["queue_wait"][1]["jobs"] == 1
+
+
+def test_full_queue_rejects_and_cancelled_waiters_leave():
+	async def scenario():
+		queue = LLMJobQueue(concurrency=1, max_depth=2, max_per_user=1)
+		release = asyncio.Event()
+
+		async def job(user_id):
+			async with queue.slot(user_id):
+				await release.wait()
+
+		running = asyncio.create_task(job("a"))
+		await asyncio.sleep(0)
+		waiting = [asyncio.create_task(job(user_id)) for user_id in ("a", "b")]
+		await asyncio.sleep(0)
+
+		with pytest.raises(QueueFullError) as error:
+			await job("c")
+		assert error.value.retry_after >= 1
+		with pytest.raises(QueueFullError):
+			await job("a")
+
+		waiting[0].cancel()
+		await asyncio.sleep(0)
+		assert queue.stats()["waiting"] == 1
+		release.set()
+		await asyncio.gather(running, waiting[1])
+		return queue.stats()
+
+	stats = asyncio.run(scenario())
+	assert stats == {**stats, "running": 0, "waiting": 0, "completed": 2, "rejected": 2}
@@ -0,0 +1,45 @@
+# test_llm_stream.py
+import asyncio
+import json
+
+import httpx
+from ..funcs.llm_stream import ThinkStripper, stream_chat
+
+
+def strip_chunks(chunks):
+	stripper = ThinkStripper()
+	return ''.join(stripper.feed(chunk) for chunk in chunks) + stripper.flush()
+
+
+def test_strips_think_split_across_chunks():
+	text = "<think>\nThe pilot said climb.\n</think>\n\n**Situation**: SIA318 climbing <to> FL350"
+	expected = "**Situation**: SIA318 climbing <to> FL350"
+	assert strip_chunks([text]) == expected
+	# every way of cutting the stream in two gives the same output
+	for cut in range(len(text)):
+		assert strip_chunks([text[:cut], text[cut:]]) == expected
+	assert strip_chunks(list(text)) == expected
+
+
+def test_unterminated_think_is_dropped():
+	assert strip_chunks(["Summary <thi", "nk> still reasoning"]) == "Summary "
+	assert strip_chunks(["ends with <thi"]) == "ends with <thi"
+
+
+def test_stream_chat_yields_content_deltas():
+	lines = [
+		{"message": {"role": "assistant", "content": "<think>"}, "done": False},
+		{"message": {"role": "assistant", "content": "hm</think>Hello"}, "done": False},
+		{"message": {"role": "assistant", "content": " world"}, "done": False},
+		{"message": {"role": "assistant", "content": ""}, "done": True},
+	]
+
+	def handler(request):
+		assert json.loads(request.content)["stream"] is True
+		return httpx.Response(200, content=''.join(json.dumps(line) + '\n' for line in lines))
+
+	async def collect():
+		async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+			return [chunk async for chunk in stream_chat(client, "http://ollama/api/chat", {"stream": False})]
+
+	assert asyncio.run(collect()) == ["<think>", "hm</think>Hello", " world"]
@@ -0,0 +1,97 @@
+# test_normalization.py
+import pytest
+from ..funcs.normalization import NormalizationEngine, function_rule, regex_rule
+from ..funcs.transcription import apply_custom_fixes, normalization_engine, process_transcript_data
+
+
+def test_rules_run_in_order_and_count_hits():
+	engine = NormalizationEngine([
+		regex_rule('feet', r'(\d+) feet', r'\1ft'),
+		regex_rule('squawk', r'squawk (\d+)', r'SQ\1', keywords=('squawk',)),
+		function_rule('upper', str.upper),
+	])
+
+	assert engine.apply("climb 5000 feet, 300 feet") == "CLIMB 5000FT, 300FT"
+	assert engine.apply("squawk 7700") == "SQ7700"
+	assert engine.stats() == {"transcripts": 2, "rule_hits": {"feet": 2, "squawk": 1, "upper": 1}}
+
+
+def test_duplicate_rule_names_are_rejected():
+	with pytest.raises(ValueError):
+		NormalizationEngine([function_rule('strip', str.strip), function_rule('strip', str.lower)])
+
+
+def test_apply_custom_fixes_counts_rule_hits():
+	before = dict(normalization_engine.hits)
+	apply_custom_fixes("climb flight level three five zero")
+	assert normalization_engine.hits['number_words'] == before['number_words'] + 1
+	assert normalization_engine.hits['flight_level'] == before['flight_level'] + 1
+
+
+def test_trace_maps_output_tokens_to_source_spans():
+	engine = NormalizationEngine([
+		regex_rule('number', r'three five zero', '350'),
+		regex_rule('flight_level', r'flight level (\d+)', r'FL\1'),
+		regex_rule('greeting', r'^', 'hello ', flags=0),
+	])
+
+	text, trace = engine.apply_traced("climb flight level three five zero now")
+
+	assert text == "hello climb FL350 now"
+	assert trace == [("hello", -1, -1), ("climb", 0, 0), ("FL350", 1, 5), ("now", 6, 6)]
+
+
+def test_process_transcript_data_carries_timings_through_the_trace():
+	spoken = "speedbird one two climb flight level three five zero"
+	words = [{"text": text, "start": float(i), "end": i + 0.5, "duration": 0.5} for i, text in enumerate(spoken.split())]
+
+	data = process_transcript_data({"text": spoken, "words": words}, log=False)
+
+	assert data["text"] == "BAW12 climb FL350"
+	assert [(word["text"], word["start"], word["end"]) for word in data["words"]] == [
+		("BAW12", 0.0, 2.5),
+		("climb", 3.0, 3.5),
+		("FL350", 4.0, 8.5),
+	]
+
+
+def test_template_groups_keep_their_own_origins():
+	engine = NormalizationEngine([
+		regex_rule('squawk', r'squawk\s+(\d)\s*(\d)\s*(\d)\s*(\d)', r'squawk \1\2\3\4'),
+		regex_rule('named', r'heading (?P<degrees>\d+)', r'HDG\g<degrees>'),
+		regex_rule('swapped', r'(\d+) (left|right)', r'\2 \1'),
+	])
+
+	text, trace = engine.apply_traced("squawk 1 2 3 4 heading 270 then 3 left")
+
+	assert text == "squawk 1234 HDG270 then left 3"
+	assert trace == [("squawk", 0, 0), ("1234", 1, 4), ("HDG270", 5, 6), ("then", 7, 7), ("left", 8, 9), ("3", 8, 9)]
+
+
+def test_traced_and_untraced_runs_count_the_same_hits():
+	def make_engine():
+		return NormalizationEngine([
+			regex_rule('squawk', r'squawk\s+(\d)\s*(\d)\s*(\d)\s*(\d)', r'squawk \1\2\3\4'),
+			regex_rule('feet', r'(\d+) feet', r'\1ft'),
+			function_rule('upper', str.upper),
+		])
+
+	plain, traced = make_engine(), make_engine()
+	for text in ("squawk 1 2 3 4", "climb 5000 feet, 300 feet", "SQUAWK 1234"):
+		assert traced.apply_traced(text)[0] == plain.apply(text)
+
+	assert traced.stats() == plain.stats()
+	assert plain.stats()["rule_hits"] == {"squawk": 2, "feet": 2, "upper": 3}
+
+
+def test_process_transcript_data_keeps_squawk_timing():
+	spoken = "Squawk one two three four"
+	words = [{"text": text, "start": float(i), "end": i + 0.9, "duration": 0.9} for i, text in enumerate(spoken.split())]
+
+	data = process_transcript_data({"text": spoken, "words": words}, log=False)
+
+	assert data["text"] == "Squawk 1234"
+	assert [(word["text"], word["start"], word["end"]) for word in data["words"]] == [
+		("Squawk", 0.0, 0.9),
+		("1234", 1.0, 4.9),
+	]
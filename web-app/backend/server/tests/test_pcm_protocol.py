@@ -0,0 +1,50 @@
+# test_pcm_protocol.py
+import struct
+
+import pytest
+from ..funcs.pcm_protocol import PCM_HEADER, PcmProtocolError, PcmStreamState, pack_pcm_frame, parse_pcm_frame
+
+
+@pytest.mark.parametrize("encoding, sample_width", [("int16", 2), ("float32", 4)])
+def test_frame_round_trip(encoding, sample_width):
+	payload = bytes(range(8 * sample_width))
+	frame = parse_pcm_frame(pack_pcm_frame(42, 3, 8000, payload, encoding=encoding, channels=2, is_last=True))
+
+	assert (frame.session_id, frame.sequence, frame.sample_rate) == (42, 3, 8000)
+	assert (frame.encoding, frame.channels, frame.is_last) == (encoding, 2, True)
+	assert frame.payload == payload
+
+
+def test_header_layout():
+	message = pack_pcm_frame(1, 2, 16000, b"\x00\x01")
+	assert PCM_HEADER.size == 16
+	assert struct.unpack_from("<III", message, 4) == (1, 2, 16000)
+	assert message[16:] == b"\x00\x01"
+
+
+@pytest.mark.parametrize(
+	"message, session_id",
+	[
+		(b"\x01\x01", None),  # shorter than the header
+		(PCM_HEADER.pack(9, 1, 1, 0, 5, 0, 16000), 5),  # unknown version
+		(PCM_HEADER.pack(1, 7, 1, 0, 5, 0, 16000), 5),  # unknown encoding
+		(PCM_HEADER.pack(1, 1, 1, 0, 5, 0, 16000) + b"\x00", 5),  # half an int16 sample
+	],
+)
+def test_invalid_frames(message, session_id):
+	with pytest.raises(PcmProtocolError) as error:
+		parse_pcm_frame(message)
+	assert error.value.session_id == session_id
+
+
+def test_stream_state_checks_sequence_and_format():
+	state = PcmStreamState(parse_pcm_frame(pack_pcm_frame(7, 0, 16000, b"")))
+	state.advance(parse_pcm_frame(pack_pcm_frame(7, 0, 16000, b"\x00\x00")))
+	assert state.params == {"sample_rate": 16000, "encoding": "int16", "channels": 1}
+
+	with pytest.raises(PcmProtocolError, match="expected sequence 1"):
+		state.advance(parse_pcm_frame(pack_pcm_frame(7, 2, 16000, b"")))
+	with pytest.raises(PcmProtocolError, match="changed its audio format"):
+		state.advance(parse_pcm_frame(pack_pcm_frame(7, 1, 8000, b"")))
+	with pytest.raises(PcmProtocolError, match="must start at sequence 0"):
+		PcmStreamState(parse_pcm_frame(pack_pcm_frame(8, 3, 16000, b"")))
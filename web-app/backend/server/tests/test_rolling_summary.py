@@ -0,0 +1,39 @@
+# test_rolling_summary.py
+import json
+
+from ..funcs.rolling_summary import SummarySession, extract_report
+
+
+def reply(report):
+	return f"<think>\nupdating {{the}} report\n</think>\nCorrected 'won two' to 12.\n```\n{json.dumps(report)}\n```"
+
+
+def atc_report(n_status, n_actions):
+	return {
+		"situation_report": {"callsign": "SIA318", "event": "go-around", "location": "RWY 02L", "status": [f"status {i}" for i in range(n_status)]},
+		"actions_taken": [f"action {i}" for i in range(n_actions)],
+	}
+
+
+def test_extract_report():
+	report = atc_report(1, 1)
+	assert extract_report(reply(report)) == report
+	assert extract_report("no fences " + json.dumps(report) + " trailing") == report
+	assert extract_report("```\n{not json}\n```") is None
+
+
+def test_compaction_bounds_prompt_and_keeps_full_report():
+	session = SummarySession("atc", max_chars=300, keep_recent=2)
+	assert session.prompt_report() is None
+
+	assert session.apply(reply(atc_report(10, 4)))
+	assert len(session.prompt_report()) <= 300
+	live = json.loads(session.prompt_report())
+	assert live["situation_report"]["status"][-1] == "status 9"
+	assert len(live["actions_taken"]) >= 2
+	# archived entries are restored in order in the report given to the client
+	assert session.full_report() == atc_report(10, 4)
+
+	# a reply without a report leaves the session as it was
+	assert not session.apply("Sorry, I cannot help with that.")
+	assert session.full_report() == atc_report(10, 4)
@@ -0,0 +1,43 @@
+# test_summary_cache.py
+import os
+
+from ..funcs.prompt_registry import DEFAULT_PROMPT, PromptRegistry
+from ..funcs.summary_cache import SummaryCache
+
+
+def payload(system, user):
+	return {"model": "m", "options": {"temperature": 0.1}, "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}]}
+
+
+def test_cache_hits_on_normalized_payload_and_evicts_lru():
+	cache = SummaryCache(max_entries=2)
+	key = cache.make_key(payload("atc", "SIA318 climb  FL350\n"))
+	assert cache.get(key) is None
+	cache.put(key, {"message": {"content": "report"}})
+
+	assert cache.make_key(payload("atc", " SIA318 climb FL350")) == key
+	assert cache.make_key(payload("minutes", "SIA318 climb FL350")) != key
+	hit = cache.get(key)
+	assert hit == {"message": {"content": "report"}}
+	hit["report"] = {}
+	assert cache.get(key) == {"message": {"content": "report"}}
+
+	cache.put("b", {})
+	cache.put("c", {})
+	assert cache.get("b") == {} and cache.get(key) is None
+	assert cache.stats()["hits"] == 3 and cache.stats()["evictions"] == 1
+
+
+def test_prompt_registry_reloads_changed_files(tmp_path):
+	path = tmp_path / "prompt_atc"
+	path.write_text("first")
+	registry = PromptRegistry(str(tmp_path))
+	registry.load()
+	assert registry.get("atc") == "first"
+
+	path.write_text("second")
+	mtime = os.path.getmtime(path) + 1
+	os.utime(path, (mtime, mtime))
+	assert registry.get("atc") == "second"
+	assert registry.get("missing") == DEFAULT_PROMPT
+	assert registry.get("../models/prompt_atc") == DEFAULT_PROMPT
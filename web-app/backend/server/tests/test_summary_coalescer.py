@@ -0,0 +1,35 @@
+# test_summary_coalescer.py
+import asyncio
+
+from ..funcs.summary_coalescer import SummaryCoalescer, merge_transcriptions
+
+
+def test_merge_transcriptions():
+	assert merge_transcriptions("SIA318 climb", "SIA318 climb FL350") == "SIA318 climb FL350"
+	assert merge_transcriptions("SIA318 climb", "SIA318 climb") == "SIA318 climb"
+	assert merge_transcriptions("SIA318 climb", "BAW12 descend") == "SIA318 climb\nBAW12 descend"
+
+
+def test_burst_is_coalesced_into_one_run():
+	runs = []
+
+	async def run(key, request):
+		runs.append(request)
+		await asyncio.sleep(0.05)
+		return f"summary of {request}"
+
+	async def burst():
+		coalescer = SummaryCoalescer(run, merge_transcriptions, min_interval_sec=0.1)
+		first = asyncio.create_task(coalescer.submit("user", "a"))
+		await asyncio.sleep(0.01)
+		# these arrive while "a" runs and share the next run
+		later = [asyncio.create_task(coalescer.submit("user", text)) for text in ("b", "c")]
+		other = asyncio.create_task(coalescer.submit("other user", "x"))
+		return await first, await asyncio.gather(*later), await other, coalescer.stats()
+
+	first, later, other, stats = asyncio.run(burst())
+	assert first == "summary of a"
+	assert later == ["summary of b\nc", "summary of b\nc"]
+	assert other == "summary of x"
+	assert sorted(runs) == ["a", "b\nc", "x"]
+	assert stats["coalesced"] == 1